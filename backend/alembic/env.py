@@ -0,0 +1,59 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import pool
+
+from app.database import Base, SQLALCHEMY_DATABASE_URL, make_engine
+from app.migrations import include_name
+from app import models  # noqa: F401 - enregistre les tables sur Base.metadata
+
+config = context.config
+
+# Depuis la ligne de commande uniquement: ne pas écraser la config de logging de l'application
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or SQLALCHEMY_DATABASE_URL
+
+
+def run_migrations_offline() -> None:
+    """Génère le SQL des migrations sans connexion à la base"""
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Applique les migrations sur la connexion fournie ou sur un nouveau moteur"""
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+
+    connectable = make_engine(get_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        _run(connection)
+
+
+def _run(connection) -> None:
+    # render_as_batch: SQLite ne supporte pas la plupart des ALTER TABLE
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True,
+                      include_name=include_name)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
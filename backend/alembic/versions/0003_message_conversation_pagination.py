@@ -0,0 +1,52 @@
+"""message conversation pagination
+
+Rattache chaque message à sa conversation (messages.conversation_id) pour
+paginer une conversation par curseur sur l'index (conversation_id, created_at)
+au lieu de parcourir tout l'historique de l'utilisateur.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 16:02:11.418530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Les bases créées par create_all ont déjà la colonne
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("messages")}
+    if "conversation_id" not in columns:
+        op.add_column('messages', sa.Column('conversation_id', sa.Integer(), nullable=True))
+
+    # Rattacher les messages existants à la conversation de leur paire
+    op.execute(
+        """
+        UPDATE messages SET conversation_id = (
+            SELECT conversations.id FROM conversations
+            WHERE (conversations.user1_id = messages.sender_id AND conversations.user2_id = messages.receiver_id)
+               OR (conversations.user1_id = messages.receiver_id AND conversations.user2_id = messages.sender_id)
+            ORDER BY conversations.id
+            LIMIT 1
+        )
+        WHERE conversation_id IS NULL
+        """
+    )
+    op.create_index('ix_messages_conversation_id_created_at', 'messages', ['conversation_id', 'created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_conversation_id_created_at', table_name='messages', if_exists=True)
+    with op.batch_alter_table('messages', schema=None) as batch_op:
+        batch_op.drop_column('conversation_id')
@@ -0,0 +1,32 @@
+"""inbox unread counts index
+
+Index (receiver_id, is_read, conversation_id): le nombre de messages non lus
+par conversation de la boîte de réception est un agrégat groupé qui ne lit
+que les entrées d'index des messages non lus de l'utilisateur.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 16:41:37.902214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_messages_receiver_id_is_read_conversation_id', 'messages', ['receiver_id', 'is_read', 'conversation_id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_messages_receiver_id_is_read_conversation_id', table_name='messages', if_exists=True)
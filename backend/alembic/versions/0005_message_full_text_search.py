@@ -0,0 +1,82 @@
+"""message full text search
+
+Index plein texte FTS5 des messages privés (SQLite uniquement).
+messages_fts(content, participants): `participants` contient les jetons
+"u<sender_id> u<receiver_id>", ce qui restreint une recherche aux messages
+de l'utilisateur dans l'index lui-même (jamais de parcours de `messages`).
+L'index est tenu à jour par déclencheurs, y compris pour les insertions
+multi-lignes.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 18:05:42.160337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    # remove_diacritics: "paracetamol" trouve "paracétamol"
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content, participants, tokenize = 'unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ai AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content, participants)
+            VALUES (new.id, new.content, 'u' || new.sender_id || ' u' || new.receiver_id);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+            DELETE FROM messages_fts WHERE rowid = old.id;
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS messages_fts_au AFTER UPDATE OF content, sender_id, receiver_id ON messages BEGIN
+            UPDATE messages_fts
+            SET content = new.content, participants = 'u' || new.sender_id || ' u' || new.receiver_id
+            WHERE rowid = old.id;
+        END
+        """
+    )
+    # Indexer l'historique existant
+    op.execute(
+        """
+        INSERT INTO messages_fts (rowid, content, participants)
+        SELECT id, content, 'u' || sender_id || ' u' || receiver_id FROM messages
+        WHERE id NOT IN (SELECT rowid FROM messages_fts)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_au")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_ad")
+    op.execute("DROP TRIGGER IF EXISTS messages_fts_ai")
+    op.execute("DROP TABLE IF EXISTS messages_fts")
@@ -0,0 +1,67 @@
+"""broadcast notifications
+
+Annonces générales stockées une fois (broadcast_notifications) au lieu d'une
+notification par utilisateur actif. Par utilisateur: un repère de lecture
+(broadcast_read_marks) et les annonces lues ou supprimées individuellement
+(broadcast_receipts). La fusion avec les notifications personnelles se fait
+à la lecture.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 18:42:09.531877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('broadcast_notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('type', sa.String(length=50), nullable=True),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('author_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['author_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_broadcast_notifications_id'), 'broadcast_notifications', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_broadcast_notifications_created_at'), 'broadcast_notifications', ['created_at'], unique=False, if_not_exists=True)
+    op.create_table('broadcast_read_marks',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('last_read_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id'),
+    if_not_exists=True
+    )
+    op.create_table('broadcast_receipts',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('broadcast_id', sa.Integer(), nullable=False),
+    sa.Column('dismissed', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['broadcast_id'], ['broadcast_notifications.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'broadcast_id'),
+    if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('broadcast_receipts', if_exists=True)
+    op.drop_table('broadcast_read_marks', if_exists=True)
+    op.drop_index(op.f('ix_broadcast_notifications_created_at'), table_name='broadcast_notifications', if_exists=True)
+    op.drop_index(op.f('ix_broadcast_notifications_id'), table_name='broadcast_notifications', if_exists=True)
+    op.drop_table('broadcast_notifications', if_exists=True)
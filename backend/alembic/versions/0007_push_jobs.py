@@ -0,0 +1,49 @@
+"""push jobs
+
+File persistante des envois push: un lot (au plus 500 jetons) par ligne,
+réclamé par les workers de services/push.py, avec tentatives et délai
+exponentiel entre les tentatives.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 19:20:51.204118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('push_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tokens', sa.JSON(), nullable=False),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('data', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_push_jobs_id'), 'push_jobs', ['id'], unique=False, if_not_exists=True)
+    op.create_index('ix_push_jobs_status_next_attempt_at', 'push_jobs', ['status', 'next_attempt_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_push_jobs_status_next_attempt_at', table_name='push_jobs', if_exists=True)
+    op.drop_index(op.f('ix_push_jobs_id'), table_name='push_jobs', if_exists=True)
+    op.drop_table('push_jobs', if_exists=True)
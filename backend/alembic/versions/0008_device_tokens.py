@@ -0,0 +1,57 @@
+"""device tokens
+
+Un jeton push par appareil (device_tokens) au lieu d'un seul par
+utilisateur (users.device_token, conservé pour compatibilité). Les jetons
+existants sont repris; un jeton partagé par plusieurs comptes revient au
+plus récent.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 19:58:14.772903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('device_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=255), nullable=False),
+    sa.Column('platform', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_seen_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_device_tokens_id'), 'device_tokens', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_device_tokens_user_id'), 'device_tokens', ['user_id'], unique=False, if_not_exists=True)
+
+    op.execute(
+        """
+        INSERT INTO device_tokens (user_id, token, created_at, last_seen_at)
+        SELECT MAX(id), device_token, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM users
+        WHERE device_token IS NOT NULL AND device_token NOT IN (SELECT token FROM device_tokens)
+        GROUP BY device_token
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_device_tokens_user_id'), table_name='device_tokens', if_exists=True)
+    op.drop_index(op.f('ix_device_tokens_id'), table_name='device_tokens', if_exists=True)
+    op.drop_table('device_tokens', if_exists=True)
@@ -0,0 +1,41 @@
+"""notification aggregation
+
+Regroupement des notifications (likes, commentaires, abonnements): une
+ligne par (utilisateur, type, cible) avec le nombre d'acteurs, retrouvée par
+l'index (user_id, group_key, is_read).
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 20:37:26.880413
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Les bases créées par create_all ont déjà les colonnes
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("notifications")}
+    if "group_key" not in columns:
+        op.add_column('notifications', sa.Column('group_key', sa.String(length=100), nullable=True))
+    if "actor_count" not in columns:
+        op.add_column('notifications', sa.Column('actor_count', sa.Integer(), nullable=True))
+    op.create_index('ix_notifications_user_id_group_key_is_read', 'notifications', ['user_id', 'group_key', 'is_read'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notifications_user_id_group_key_is_read', table_name='notifications', if_exists=True)
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_column('actor_count')
+        batch_op.drop_column('group_key')
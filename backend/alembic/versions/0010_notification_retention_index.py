@@ -0,0 +1,31 @@
+"""notification retention index
+
+Index (is_read, created_at) pour la purge de rétention: chaque lot prend les
+plus anciennes notifications lues (ou non lues) sans parcourir la table.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 21:02:11.504218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_notifications_is_read_created_at', 'notifications', ['is_read', 'created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notifications_is_read_created_at', table_name='notifications', if_exists=True)
@@ -0,0 +1,63 @@
+"""image variants
+
+Images uploadées (image_assets) et variantes redimensionnées recopiées sur
+les publications, les événements et les avatars (services/images.py).
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 21:58:03.617290
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, Sequence[str], None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VARIANT_COLUMNS = (("users", "avatar_variants"), ("posts", "image_variants"), ("events", "image_variants"))
+# Recopie des variantes sur les entités qui référencent l'image
+URL_COLUMNS = (("users", "avatar_url"), ("posts", "image_url"), ("events", "image_url"))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_assets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(length=500), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('variants', sa.JSON(), nullable=True),
+    sa.Column('width', sa.Integer(), nullable=True),
+    sa.Column('height', sa.Integer(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('processed_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path'),
+    if_not_exists=True
+    )
+    op.create_index(op.f('ix_image_assets_id'), 'image_assets', ['id'], unique=False, if_not_exists=True)
+
+    # Les bases créées par create_all ont déjà les colonnes
+    inspector = sa.inspect(op.get_bind())
+    for table, column in VARIANT_COLUMNS:
+        if column not in {existing["name"] for existing in inspector.get_columns(table)}:
+            op.add_column(table, sa.Column(column, sa.JSON(), nullable=True))
+    for table, column in URL_COLUMNS:
+        op.create_index(op.f(f'ix_{table}_{column}'), table, [column], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in URL_COLUMNS:
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table, if_exists=True)
+    for table, column in VARIANT_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column(column)
+    op.drop_index(op.f('ix_image_assets_id'), table_name='image_assets', if_exists=True)
+    op.drop_table('image_assets', if_exists=True)
@@ -0,0 +1,49 @@
+"""unique unread notification group
+
+Index partiel unique (user_id, group_key) sur les notifications non lues:
+deux transactions concurrentes ne peuvent plus créer chacune une ligne pour
+le même groupe. Il remplace l'index (user_id, group_key, is_read). Les
+doublons existants sortent du groupe (group_key effacé) sauf le plus récent.
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 23:12:40.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, Sequence[str], None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+notifications = sa.table(
+    'notifications',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('group_key', sa.String),
+    sa.column('is_read', sa.Boolean),
+)
+UNREAD_GROUP = sa.and_(notifications.c.is_read == sa.false(), notifications.c.group_key.isnot(None))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    latest = sa.select(sa.func.max(notifications.c.id)).where(UNREAD_GROUP).group_by(
+        notifications.c.user_id, notifications.c.group_key
+    )
+    op.execute(notifications.update().where(UNREAD_GROUP, notifications.c.id.notin_(latest)).values(group_key=None))
+    op.create_index('uq_notifications_user_id_group_key_unread', 'notifications', ['user_id', 'group_key'],
+                    unique=True, sqlite_where=UNREAD_GROUP, postgresql_where=UNREAD_GROUP, if_not_exists=True)
+    op.drop_index('ix_notifications_user_id_group_key_is_read', table_name='notifications', if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_notifications_user_id_group_key_is_read', 'notifications', ['user_id', 'group_key', 'is_read'], unique=False, if_not_exists=True)
+    op.drop_index('uq_notifications_user_id_group_key_unread', table_name='notifications', if_exists=True)
@@ -0,0 +1,32 @@
+"""outbox aggregate index
+
+Index (aggregate_type, aggregate_id, status, id): le lot de l'outbox écarte
+en SQL les événements dont un prédécesseur du même agrégat attend une
+nouvelle tentative.
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19 23:41:07.932516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0014'
+down_revision: Union[str, Sequence[str], None] = '0013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_outbox_events_aggregate_status_id', 'outbox_events', ['aggregate_type', 'aggregate_id', 'status', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_outbox_events_aggregate_status_id', table_name='outbox_events', if_exists=True)
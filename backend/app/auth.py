@@ -3,9 +3,12 @@ from jose import jwt, JWTError
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from . import models, schemas
-from .database import get_db
+from .database import get_db, get_async_db
 
 # Configuration - À modifier en production avec des variables d'environnement
 SECRET_KEY = "sante-poro-secret-key-2024-change-in-production"
@@ -42,10 +45,7 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     return encoded_jwt
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> models.User:
+def decode_user_id(token: str) -> int:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -53,15 +53,42 @@ def get_current_user(
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
+        user_id = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
+        return int(user_id)
+    except (JWTError, ValueError):
         raise credentials_exception
 
+
+def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+) -> models.User:
+    user_id = decode_user_id(token)
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> models.User:
+    """Équivalent de get_current_user pour les routers asynchrones"""
+    user_id = decode_user_id(token)
+    user = await db.get(models.User, user_id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
@@ -72,3 +99,14 @@ def authenticate_user(db: Session, email: str, password: str) -> models.User:
     if not verify_password(password, user.password_hash):
         return None
     return user
+
+
+async def authenticate_user_async(db: AsyncSession, email: str, password: str) -> models.User:
+    result = await db.execute(select(models.User).filter(models.User.email == email))
+    user = result.scalars().first()
+    if not user or not user.password_hash:
+        return None
+    # bcrypt est volontairement lent: on ne bloque pas la boucle d'événements
+    if not await run_in_threadpool(verify_password, password, user.password_hash):
+        return None
+    return user
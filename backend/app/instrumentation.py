@@ -0,0 +1,175 @@
+"""
+Instrumentation SQL par requête HTTP et détection des boucles N+1.
+
+Chaque requête SQL exécutée pendant une requête HTTP est comptée (nombre,
+durée cumulée, « forme » normalisée de l'instruction). En fin de requête:
+- un en-tête `Server-Timing: db;dur=...;desc="N queries"` est ajouté;
+- les métriques `http_db_queries` / `http_db_seconds` sont alimentées par route;
+- en mode strict (tests), une route qui dépasse son budget de requêtes ou
+  répète la même forme d'instruction trop souvent lève QueryBudgetExceeded.
+"""
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# ============ CONFIGURATION ============
+# Budget par défaut (nombre total de requêtes SQL par requête HTTP)
+SQL_QUERY_BUDGET = int(os.getenv("SQL_QUERY_BUDGET", "20"))
+# Nombre maximal d'exécutions d'une même forme d'instruction (signature N+1)
+SQL_REPEAT_LIMIT = int(os.getenv("SQL_REPEAT_LIMIT", "5"))
+# En mode strict, un dépassement fait échouer la requête (activé par les tests)
+SQL_QUERY_BUDGET_ENFORCE = os.getenv("SQL_QUERY_BUDGET_ENFORCE", "").lower() in ("1", "true", "yes")
+
+# Budgets spécifiques: clé "MÉTHODE <chemin déclaré de la route>", ex. "GET /posts/{post_id}"
+ROUTE_QUERY_BUDGETS: Dict[str, int] = {}
+
+query_stats_var: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+db_queries_total = registry.counter("http_db_queries_total", "Requêtes SQL émises, par route")
+db_seconds = registry.summary("http_db_seconds", "Temps SQL cumulé par requête HTTP, par route")
+db_budget_violations = registry.counter(
+    "http_db_budget_violations_total", "Requêtes HTTP ayant dépassé leur budget SQL, par route"
+)
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Forme de l'instruction: espaces compactés, listes IN (?, ?, ...) réduites à (?)"""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Levée en mode strict quand une route dépasse son budget SQL"""
+
+
+class QueryStats:
+    """Compteurs SQL d'une requête HTTP"""
+
+    def __init__(self, scope: dict = None):
+        self.scope = scope
+        self.count = 0
+        self.total_seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total_seconds += duration
+        self.shapes[normalize_statement(statement)] += 1
+
+    def violations(self, budget: int, repeat_limit: int) -> list:
+        problems = []
+        if self.count > budget:
+            problems.append(f"{self.count} requêtes SQL (budget: {budget})")
+        for shape, repeats in self.shapes.most_common():
+            if repeats <= repeat_limit:
+                break
+            problems.append(f"N+1 probable: {repeats} exécutions de\n    {shape}")
+        return problems
+
+
+# ============ ÉCOUTEURS SQLALCHEMY ============
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if query_stats_var.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = query_stats_var.get()
+    if stats is None:
+        return
+    start_times = conn.info.get("query_start_time")
+    started = start_times.pop() if start_times else time.perf_counter()
+    stats.record(statement, time.perf_counter() - started)
+
+
+def install_query_instrumentation(target=Engine):
+    """Branche le comptage sur un moteur (par défaut: tous les moteurs du processus)"""
+    if not event.contains(target, "before_cursor_execute", _before_cursor_execute):
+        event.listen(target, "before_cursor_execute", _before_cursor_execute)
+        event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+
+# ============ MIDDLEWARE ASGI ============
+
+def route_label(scope) -> str:
+    """Libellé stable de la route ("GET /posts/{post_id}"), sans identifiants"""
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "inconnue"
+    return f"{scope.get('method', '')} {path}"
+
+
+def current_route() -> Optional[str]:
+    """Route de la requête HTTP en cours (None hors requête)"""
+    stats = query_stats_var.get()
+    if stats is None or stats.scope is None:
+        return None
+    return route_label(stats.scope)
+
+
+class QueryCountMiddleware:
+    """Compte les requêtes SQL de chaque requête HTTP et publie le résultat"""
+
+    def __init__(self, app, budget: int = None, repeat_limit: int = None,
+                 route_budgets: Dict[str, int] = None, enforce: bool = None):
+        # None = valeur du module, lue à chaque requête (modifiable par les tests)
+        self.app = app
+        self.budget = budget
+        self.repeat_limit = repeat_limit
+        self.route_budgets = route_budgets
+        self.enforce = enforce
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope)
+        token = query_stats_var.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                self.check(scope, stats)
+                headers = list(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    f'db;dur={stats.total_seconds * 1000:.1f};desc="{stats.count} queries"'.encode(),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats_var.reset(token)
+
+    def check(self, scope, stats: QueryStats):
+        label = route_label(scope)
+        db_queries_total.inc(stats.count, route=label)
+        db_seconds.observe(stats.total_seconds, route=label)
+
+        route_budgets = ROUTE_QUERY_BUDGETS if self.route_budgets is None else self.route_budgets
+        default_budget = SQL_QUERY_BUDGET if self.budget is None else self.budget
+        repeat_limit = SQL_REPEAT_LIMIT if self.repeat_limit is None else self.repeat_limit
+        problems = stats.violations(route_budgets.get(label, default_budget), repeat_limit)
+        if not problems:
+            return
+        db_budget_violations.inc(route=label)
+        report = f"{label}: " + "; ".join(problems)
+        enforce = SQL_QUERY_BUDGET_ENFORCE if self.enforce is None else self.enforce
+        if enforce:
+            raise QueryBudgetExceeded(report)
+        logger.warning("Budget SQL dépassé — %s", report)
@@ -1,21 +1,83 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, JSONResponse
 from contextlib import asynccontextmanager
-from .database import engine, Base
-import websockets
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from .database import engine, async_engine, read_engine, async_read_engine
+from .instrumentation import install_query_instrumentation, QueryCountMiddleware
+from .metrics import registry
+from .auth import decode_user_id
+from .services.realtime import hub, CLOSE_POLICY_VIOLATION
+from .services.chat import message_writer, is_id
+from .services.coalescing import signal_coalescer
+from .services.push import push_dispatcher
+from .services.unread import unread_counter
+from .services.retention import notification_retention
+from .services.outbox import outbox_dispatcher
+from .services.images import image_pipeline
+from .services import activity  # noqa: F401 (enregistre les consommateurs de l'outbox)
 import asyncio
 import json
+import logging
+import os
 from fastapi import WebSocket, WebSocketDisconnect
 
 # Import des routers
 from .routers import auth, users, posts, follows, polls, health_articles, emergency, protocols, admin, events, upload, notifications
 
+logger = logging.getLogger(__name__)
+
+# Les migrations peuvent être confiées à une étape de déploiement dédiée
+# (`alembic upgrade head`) pour accélérer le démarrage des workers
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+# ============ ÉTAT DE DÉMARRAGE ============
+# /health (vivacité): le processus répond.
+# /ready (disponibilité): schéma à jour, base joignable et préchauffage terminé.
+startup_state = {"migrated": False, "warmed_up": False}
+
+
+async def warm_up():
+    """Initialise en tâche de fond les intégrations lourdes (Firebase)"""
+    from .services.notifications import initialize_firebase
+    try:
+        await run_in_threadpool(initialize_firebase)
+    except Exception as e:
+        logger.error(f"Préchauffage incomplet: {e}")
+    startup_state["warmed_up"] = True
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Créer les tables au démarrage
-    Base.metadata.create_all(bind=engine)
+    # Mettre le schéma à jour (migrations Alembic) au démarrage
+    if MIGRATE_ON_STARTUP:
+        from .migrations import upgrade_database
+        await run_in_threadpool(upgrade_database, engine)
+    startup_state["migrated"] = True
+    warm_up_task = asyncio.create_task(warm_up())
+    await hub.start()
+    message_writer.start()
+    signal_coalescer.start()
+    push_dispatcher.start()
+    unread_counter.start()
+    notification_retention.start()
+    outbox_dispatcher.start()
     yield
+    warm_up_task.cancel()
+    # Écrire les messages en file avant de fermer les connexions
+    await message_writer.stop()
+    await signal_coalescer.stop()
+    await push_dispatcher.stop()
+    await notification_retention.stop()
+    await outbox_dispatcher.stop()
+    await image_pipeline.stop()
+    await hub.stop()
+    await async_engine.dispose()
+    if async_read_engine is not None:
+        await async_read_engine.dispose()
+    if read_engine is not None:
+        read_engine.dispose()
 
 
 app = FastAPI(
@@ -36,6 +98,10 @@ app.add_middleware(
 )
 # ============ CORS FIX END ============
 
+# Comptage des requêtes SQL par requête HTTP (Server-Timing + métriques)
+install_query_instrumentation()
+app.add_middleware(QueryCountMiddleware)
+
 # Inclure les routes API
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
@@ -62,50 +128,143 @@ def root():
 
 @app.get("/health")
 def health_check():
+    """Vivacité: ne touche à aucune dépendance"""
     return {"status": "ok"}
 
-# WebSocket connections storage
-active_connections = {}
+
+@app.get("/ready")
+async def readiness_check():
+    """Disponibilité: le worker peut recevoir du trafic"""
+    from .services.notifications import firebase_available
+    checks = {
+        "migrations": startup_state["migrated"],
+        "warm_up": startup_state["warmed_up"],
+        "firebase": firebase_available(),
+    }
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        checks["database"] = True
+    except Exception as e:
+        logger.error(f"Base de données injoignable: {e}")
+        checks["database"] = False
+
+    ready = checks["migrations"] and checks["warm_up"] and checks["database"]
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "checks": checks},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Métriques au format texte Prometheus"""
+    return registry.render()
+
+# ============ WEBSOCKET ============
 
 # WebSocket endpoint for real-time messaging
-@app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int):
+# `since`: identifiant du dernier message reçu par le client (rattrapage à la reconnexion)
+# Délai laissé au client pour envoyer {"type": "auth", "token": ...} sans `?token=`
+WS_AUTH_TIMEOUT = float(os.getenv("WS_AUTH_TIMEOUT", "10"))
+
+
+def token_matches(token, user_id: int) -> bool:
+    """Le jeton JWT est valide et appartient à `user_id`"""
+    if not isinstance(token, str):
+        return False
+    try:
+        return decode_user_id(token) == user_id
+    except HTTPException:
+        return False
+
+
+async def authenticate_websocket(websocket: WebSocket, user_id: int, token: str = None):
+    """Jeton en paramètre `token` (refus avant la poignée de main) ou dans le premier frame.
+    Renvoie None si la connexion est refusée, sinon si la socket a déjà été acceptée."""
+    if token is not None:
+        if not token_matches(token, user_id):
+            await websocket.close(code=CLOSE_POLICY_VIOLATION)
+            return None
+        return False
+
     await websocket.accept()
-    active_connections[user_id] = websocket
+    try:
+        frame = json.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT))
+        token = frame.get("token") if isinstance(frame, dict) and frame.get("type") == "auth" else None
+    except (asyncio.TimeoutError, ValueError):
+        token = None
+    except (WebSocketDisconnect, RuntimeError):
+        return None
+    if not token_matches(token, user_id):
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="authentification requise")
+        return None
+    return True
+
+
+@app.websocket("/ws/{user_id}")
+async def websocket_endpoint(websocket: WebSocket, user_id: int, since: int = None, token: str = None):
+    accepted = await authenticate_websocket(websocket, user_id, token)
+    if accepted is None:
+        return
+    connection = await hub.connect(websocket, user_id, accepted=accepted)
 
     try:
+        # Compteur de notifications non lues, puis messages manqués
+        hub.send(connection, {"type": "unread_count", "count": await unread_counter.current(user_id)})
+        await message_writer.deliver_pending(connection, since)
+
         while True:
             data = await websocket.receive_text()
-            message_data = json.loads(data)
+            try:
+                message_data = json.loads(data)
+                frame_type = message_data["type"]
+            except (ValueError, KeyError, TypeError):
+                # Frame illisible: signalé au client, la connexion reste ouverte
+                hub.send(connection, {"type": "error", "detail": "Frame invalide"})
+                continue
 
             # Handle different message types
-            if message_data["type"] == "message":
-                # Broadcast message to recipient
-                recipient_id = message_data["recipient_id"]
-                if recipient_id in active_connections:
-                    await active_connections[recipient_id].send_text(json.dumps({
-                        "type": "new_message",
-                        "data": message_data["data"]
-                    }))
-
-            elif message_data["type"] == "typing":
-                # Broadcast typing status
-                recipient_id = message_data["recipient_id"]
-                if recipient_id in active_connections:
-                    await active_connections[recipient_id].send_text(json.dumps({
-                        "type": "typing_status",
-                        "sender_id": user_id,
-                        "is_typing": message_data["is_typing"]
-                    }))
-
-            elif message_data["type"] == "read_receipt":
-                # Send read receipt
-                sender_id = message_data["sender_id"]
-                if sender_id in active_connections:
-                    await active_connections[sender_id].send_text(json.dumps({
-                        "type": "message_read",
-                        "message_id": message_data["message_id"]
-                    }))
-
-    except WebSocketDisconnect:
-        del active_connections[user_id]
\ No newline at end of file
+            if frame_type == "pong":
+                hub.handle_pong(connection)
+
+            elif frame_type == "message":
+                # Acquitté tout de suite; écrit par lots puis publié au destinataire
+                data = message_data.get("data")
+                data = data if isinstance(data, dict) else {}
+                client_id = data.get("client_id")
+                try:
+                    queued = message_writer.submit(user_id, message_data.get("recipient_id"), data.get("content"),
+                                                   client_id)
+                except ValueError as e:
+                    hub.send(connection, {"type": "message_error", "client_id": client_id, "detail": str(e)})
+                    continue
+                if queued:
+                    hub.send(connection, {"type": "message_ack", "client_id": client_id})
+                else:
+                    hub.send(connection, {"type": "message_error", "client_id": client_id,
+                                          "detail": "Serveur surchargé, réessayez"})
+
+            elif frame_type == "typing":
+                # Saisie en cours: regroupée par paire (expéditeur, destinataire)
+                recipient_id = message_data.get("recipient_id")
+                if not is_id(recipient_id):
+                    hub.send(connection, {"type": "error", "detail": "Destinataire invalide"})
+                    continue
+                await signal_coalescer.typing(user_id, recipient_id, bool(message_data.get("is_typing")))
+
+            elif frame_type == "read_receipt":
+                # Accusé de lecture: seul le plus grand identifiant lu est envoyé, à cadence fixe
+                sender_id, message_id = message_data.get("sender_id"), message_data.get("message_id")
+                if not is_id(sender_id) or not is_id(message_id):
+                    hub.send(connection, {"type": "error", "detail": "Accusé de lecture invalide"})
+                    continue
+                signal_coalescer.read_receipt(user_id, sender_id, message_id)
+
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: socket fermée par le hub (éviction) pendant la réception
+        pass
+    finally:
+        await hub.disconnect(connection)
+        if not hub.is_connected(user_id):
+            await signal_coalescer.disconnect(user_id)
@@ -0,0 +1,124 @@
+"""
+Registre de métriques en mémoire, exposé au format texte Prometheus sur /metrics.
+
+Volontairement minimal (pas de dépendance externe): compteurs, jauges et
+sommes/compteurs d'observations, chacun avec des labels optionnels.
+"""
+import threading
+from typing import Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    escaped = (f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in key)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metric:
+    def __init__(self, name: str, help_text: str, kind: str):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, "counter")
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, "gauge")
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Summary(Metric):
+    """Somme et nombre d'observations (suffisant pour calculer une moyenne)"""
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, "summary")
+        self._counts: Dict[LabelKey, int] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def count(self, **labels) -> int:
+        return self._counts.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            result = []
+            for key, total in self._values.items():
+                result.append((f"{self.name}_sum", key, total))
+                result.append((f"{self.name}_count", key, self._counts[key]))
+            return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text)
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = "") -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def summary(self, name: str, help_text: str = "") -> Summary:
+        return self._get_or_create(Summary, name, help_text)
+
+    def render(self) -> str:
+        """Format d'exposition texte Prometheus"""
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
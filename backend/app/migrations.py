@@ -0,0 +1,33 @@
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy.engine import Engine
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ALEMBIC_INI = os.path.join(BACKEND_DIR, "alembic.ini")
+
+# Tables gérées hors des modèles (index FTS5 et ses tables internes)
+UNMANAGED_TABLE_PREFIXES = ("messages_fts",)
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """Filtre de l'autogénération: ignore les tables qui n'ont pas de modèle"""
+    if type_ == "table":
+        return not name.startswith(UNMANAGED_TABLE_PREFIXES)
+    return True
+
+
+def get_alembic_config(connection=None) -> Config:
+    """Configuration Alembic utilisable depuis l'application ou les tests"""
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(BACKEND_DIR, "alembic"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade_database(engine: Engine, revision: str = "head"):
+    """Applique les migrations Alembic jusqu'à la révision demandée"""
+    with engine.begin() as connection:
+        command.upgrade(get_alembic_config(connection), revision)
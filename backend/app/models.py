@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Index, and_, false
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -20,7 +20,7 @@ class User(Base):
     # Informations spécifiques aux agents de santé
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100), nullable=False)
-    district = Column(String(50), nullable=False)  # Dikodougou, Ferkessédougou, Korhogo, Sinématiali
+    district = Column(String(50), index=True, nullable=False)  # Dikodougou, Ferkessédougou, Korhogo, Sinématiali
     health_center = Column(String(200), nullable=True)  # Centre de santé
     professional_id = Column(String(100), nullable=True)  # Matricule professionnel (sans unique pour l'instant)
 
@@ -32,7 +32,9 @@ class User(Base):
     is_admin = Column(Boolean, default=False)  # Accès au panel d'administration
 
     bio = Column(Text, nullable=True)
-    avatar_url = Column(String(500), nullable=True)
+    avatar_url = Column(String(500), nullable=True, index=True)
+    # Variantes redimensionnées de l'avatar (services/images.py), remplies après l'upload
+    avatar_variants = Column(JSON, nullable=True)
     device_token = Column(String(255), nullable=True)  # OneSignal device token
 
     is_active = Column(Boolean, default=True)
@@ -52,7 +54,8 @@ class Post(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
-    image_url = Column(String(500), nullable=True)
+    image_url = Column(String(500), nullable=True, index=True)
+    image_variants = Column(JSON, nullable=True)
 
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -63,6 +66,12 @@ class Post(Base):
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     likes = relationship("Like", back_populates="post", cascade="all, delete-orphan")
 
+    # Index composites: posts d'un auteur et fil d'actualité triés par date
+    __table_args__ = (
+        Index("ix_posts_author_id_created_at", "author_id", "created_at"),
+        Index("ix_posts_created_at", "created_at"),
+    )
+
 
 class Comment(Base):
     __tablename__ = "comments"
@@ -78,6 +87,10 @@ class Comment(Base):
     post = relationship("Post", back_populates="comments")
     author = relationship("User", back_populates="comments")
 
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at"),
+    )
+
 
 class Like(Base):
     __tablename__ = "likes"
@@ -92,7 +105,10 @@ class Like(Base):
     user = relationship("User", back_populates="likes")
 
     # Contrainte unique pour éviter les doubles likes
-    __table_args__ = ({"sqlite_autoincrement": True},)
+    __table_args__ = (
+        Index("ix_likes_post_id_user_id", "post_id", "user_id"),
+        {"sqlite_autoincrement": True},
+    )
 
 
 class Follow(Base):
@@ -109,6 +125,8 @@ class Follow(Base):
 
     # Contrainte unique pour éviter les doubles follows
     __table_args__ = (
+        Index("ix_follows_follower_id_following_id", "follower_id", "following_id"),
+        Index("ix_follows_following_id_follower_id", "following_id", "follower_id"),
         {"sqlite_autoincrement": True},
     )
 
@@ -138,6 +156,10 @@ class PollOption(Base):
     # Relations
     poll = relationship("Poll", back_populates="options")
 
+    __table_args__ = (
+        Index("ix_poll_options_poll_id", "poll_id"),
+    )
+
 
 class PollVote(Base):
     __tablename__ = "poll_votes"
@@ -153,6 +175,7 @@ class PollVote(Base):
 
     # Contrainte unique pour éviter les doubles votes
     __table_args__ = (
+        Index("ix_poll_votes_poll_id_user_id", "poll_id", "user_id"),
         {"sqlite_autoincrement": True},
     )
 
@@ -174,6 +197,10 @@ class HealthArticle(Base):
     likes = relationship("HealthArticleLike", back_populates="article", cascade="all, delete-orphan")
     bookmarks = relationship("HealthArticleBookmark", back_populates="article", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_health_articles_category_created_at", "category", "created_at"),
+    )
+
 
 class HealthArticleLike(Base):
     __tablename__ = "health_article_likes"
@@ -186,7 +213,10 @@ class HealthArticleLike(Base):
     # Relations
     article = relationship("HealthArticle", back_populates="likes")
 
-    __table_args__ = ({"sqlite_autoincrement": True},)
+    __table_args__ = (
+        Index("ix_health_article_likes_article_id_user_id", "article_id", "user_id"),
+        {"sqlite_autoincrement": True},
+    )
 
 
 class HealthArticleBookmark(Base):
@@ -200,7 +230,11 @@ class HealthArticleBookmark(Base):
     # Relations
     article = relationship("HealthArticle", back_populates="bookmarks")
 
-    __table_args__ = ({"sqlite_autoincrement": True},)
+    __table_args__ = (
+        Index("ix_health_article_bookmarks_article_id_user_id", "article_id", "user_id"),
+        Index("ix_health_article_bookmarks_user_id", "user_id"),
+        {"sqlite_autoincrement": True},
+    )
 
 
 # ============ Static Content Models ============
@@ -218,6 +252,10 @@ class EmergencyContact(Base):
     description = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_emergency_contacts_district_type", "district", "type"),
+    )
+
 
 class HealthProtocol(Base):
     """Protocoles de santé - documents保存 par les agents"""
@@ -235,6 +273,11 @@ class HealthProtocol(Base):
     # Relations
     author = relationship("User")
 
+    __table_args__ = (
+        Index("ix_health_protocols_author_id", "author_id"),
+        Index("ix_health_protocols_is_public_category", "is_public", "category"),
+    )
+
 
 class Event(Base):
     """Événements (formations, réunions, séminaires, ateliers)"""
@@ -250,7 +293,8 @@ class Event(Base):
     district = Column(String(50), nullable=False)
     organizer = Column(String(200), nullable=False)
     max_participants = Column(Integer, nullable=True)
-    image_url = Column(String(500), nullable=True)
+    image_url = Column(String(500), nullable=True, index=True)
+    image_variants = Column(JSON, nullable=True)
     author_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -259,6 +303,12 @@ class Event(Base):
     author = relationship("User")
     registrations = relationship("EventRegistration", back_populates="event", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_events_district_date", "district", "date"),
+        Index("ix_events_category_date", "category", "date"),
+        Index("ix_events_date", "date"),
+    )
+
 
 class EventRegistration(Base):
     """Inscriptions aux événements"""
@@ -275,6 +325,7 @@ class EventRegistration(Base):
 
     # Contrainte unique pour éviter les doubles inscriptions
     __table_args__ = (
+        Index("ix_event_registrations_event_id_user_id", "event_id", "user_id"),
         {"sqlite_autoincrement": True},
     )
 
@@ -287,6 +338,9 @@ class Message(Base):
     content = Column(Text, nullable=False)
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     receiver_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # Conversation de la paire (sender, receiver). Sans clé étrangère:
+    # conversations.last_message_id référence déjà messages (cycle)
+    conversation_id = Column(Integer, nullable=True)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -294,6 +348,15 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id])
     receiver = relationship("User", foreign_keys=[receiver_id])
 
+    __table_args__ = (
+        Index("ix_messages_sender_id_receiver_id_created_at", "sender_id", "receiver_id", "created_at"),
+        Index("ix_messages_receiver_id_created_at", "receiver_id", "created_at"),
+        # Pagination par curseur d'une conversation, du plus récent au plus ancien
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+        # Compteurs de non-lus de la boîte de réception
+        Index("ix_messages_receiver_id_is_read_conversation_id", "receiver_id", "is_read", "conversation_id"),
+    )
+
 
 class Conversation(Base):
     """Conversations entre utilisateurs"""
@@ -309,6 +372,153 @@ class Conversation(Base):
     user1 = relationship("User", foreign_keys=[user1_id])
     user2 = relationship("User", foreign_keys=[user2_id])
     last_message = relationship("Message", foreign_keys=[last_message_id])
-    messages = relationship("Message", 
-                          primaryjoin="or_(Conversation.user1_id == Message.sender_id, Conversation.user2_id == Message.sender_id)",
-                          order_by="Message.created_at.desc()")
\ No newline at end of file
+    messages = relationship("Message",
+                          primaryjoin="Conversation.id == foreign(Message.conversation_id)",
+                          order_by="Message.created_at.desc()",
+                          viewonly=True)
+
+    __table_args__ = (
+        Index("ix_conversations_user1_id_user2_id", "user1_id", "user2_id"),
+        Index("ix_conversations_user2_id_updated_at", "user2_id", "updated_at"),
+    )
+
+
+class Notification(Base):
+    """Notifications des utilisateurs"""
+    __tablename__ = "notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(String(50), default="info")  # info, success, warning, error, message, event, follow, like, comment, system
+    data = Column(JSON, default=dict)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Regroupement ("like:post:42"): une ligne par type et cible, mise à jour à chaque nouvel acteur
+    group_key = Column(String(100), nullable=True)
+    actor_count = Column(Integer, default=1)
+
+    # Relations
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_notifications_user_id_is_read_created_at", "user_id", "is_read", "created_at"),
+        # Une seule notification non lue par groupe (index partiel unique)
+        Index("uq_notifications_user_id_group_key_unread", "user_id", "group_key", unique=True,
+              sqlite_where=and_(is_read == false(), group_key.isnot(None)),
+              postgresql_where=and_(is_read == false(), group_key.isnot(None))),
+        # Purge de rétention (services/retention.py)
+        Index("ix_notifications_is_read_created_at", "is_read", "created_at"),
+    )
+
+
+class BroadcastNotification(Base):
+    """Annonce adressée à tous les utilisateurs: une seule ligne, fusionnée à la lecture"""
+    __tablename__ = "broadcast_notifications"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+    type = Column(String(50), default="info")
+    data = Column(JSON, default=dict)
+    author_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    # Relations
+    author = relationship("User")
+
+
+class BroadcastReadMark(Base):
+    """Dernière annonce lue par un utilisateur: toutes les annonces antérieures sont lues"""
+    __tablename__ = "broadcast_read_marks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_read_id = Column(Integer, nullable=False, default=0)
+
+
+class BroadcastReceipt(Base):
+    """Annonce lue individuellement (au-delà du repère) ou supprimée par un utilisateur"""
+    __tablename__ = "broadcast_receipts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    broadcast_id = Column(Integer, ForeignKey("broadcast_notifications.id"), primary_key=True)
+    dismissed = Column(Boolean, default=False, nullable=False)
+
+
+class PushJob(Base):
+    """Lot d'envoi push en attente (au plus un multicast FCM de 500 jetons)"""
+    __tablename__ = "push_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tokens = Column(JSON, nullable=False)
+    title = Column(String(200), nullable=False)
+    body = Column(Text, nullable=False)
+    data = Column(JSON, default=dict)
+    status = Column(String(20), nullable=False, default="pending")  # pending, sending, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    # pending: prochaine tentative; sending: fin du bail du worker qui traite le lot
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_push_jobs_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+
+class DeviceToken(Base):
+    """Jeton push d'un appareil (plusieurs par utilisateur: téléphone, tablette, web)"""
+    __tablename__ = "device_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token = Column(String(255), nullable=False, unique=True)
+    platform = Column(String(20), nullable=True)  # android, ios, web
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relations
+    user = relationship("User")
+
+
+class OutboxEvent(Base):
+    """Événement d'une action sociale, écrit dans la même transaction que l'action (outbox)"""
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Agrégat concerné ("post", 42): les événements d'un même agrégat sont livrés dans l'ordre
+    aggregate_type = Column(String(50), nullable=False)
+    aggregate_id = Column(Integer, nullable=False)
+    event_type = Column(String(50), nullable=False)  # post.liked, post.commented, user.followed...
+    payload = Column(JSON, default=dict)
+    status = Column(String(20), nullable=False, default="pending")  # pending, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Consommateurs ayant déjà traité l'événement (pas de nouvelle livraison après un échec partiel)
+    delivered = Column(JSON, default=list)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    dispatched_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_outbox_events_status_id", "status", "id"),
+        # Événement antérieur en attente du même agrégat (ordre de livraison)
+        Index("ix_outbox_events_aggregate_status_id", "aggregate_type", "aggregate_id", "status", "id"),
+    )
+
+
+class ImageAsset(Base):
+    """Image uploadée et ses variantes (miniature, moyenne, pleine) en WebP et JPEG"""
+    __tablename__ = "image_assets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String(500), nullable=False, unique=True)  # chemin relatif de l'original ("/posts/<nom>")
+    status = Column(String(20), nullable=False, default="pending")  # pending, ready, failed
+    # {"thumbnail": {"webp": ..., "jpeg": ..., "width": ..., "height": ...}, "medium": {...}, "full": {...}}
+    variants = Column(JSON, nullable=True)
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, func, type_coerce
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_db, slow_query_log
 from ..auth import get_current_user
 
 router = APIRouter(prefix="/admin", tags=["Administration"])
@@ -18,6 +19,13 @@ def require_admin(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 
+def count_by(db: Session, column, ids: list) -> dict:
+    """Nombre de lignes par valeur de `column` pour les identifiants donnés (une requête)"""
+    if not ids:
+        return {}
+    return dict(db.query(column, func.count()).filter(column.in_(ids)).group_by(column).all())
+
+
 # ============ HEALTH ARTICLES ADMIN ============
 
 @router.get("/health-articles/", response_model=List[schemas.HealthArticleResponse])
@@ -29,7 +37,7 @@ def get_all_articles_admin(
     current_user: models.User = Depends(require_admin)
 ):
     """Liste complète des articles pour admin (avec stats)"""
-    query = db.query(models.HealthArticle)
+    query = db.query(models.HealthArticle).options(joinedload(models.HealthArticle.author))
 
     if category:
         query = query.filter(models.HealthArticle.category == category)
@@ -38,6 +46,10 @@ def get_all_articles_admin(
         models.HealthArticle.created_at.desc()
     ).offset(skip).limit(limit).all()
 
+    article_ids = [article.id for article in articles]
+    likes_counts = count_by(db, models.HealthArticleLike.article_id, article_ids)
+    bookmarks_counts = count_by(db, models.HealthArticleBookmark.article_id, article_ids)
+
     result = []
     for article in articles:
         result.append({
@@ -49,8 +61,8 @@ def get_all_articles_admin(
             "author_id": article.author_id,
             "author_name": f"{article.author.first_name} {article.author.last_name}" if article.author else "Inconnu",
             "read_time": article.read_time,
-            "likes_count": len(article.likes),
-            "bookmarks_count": len(article.bookmarks),
+            "likes_count": likes_counts.get(article.id, 0),
+            "bookmarks_count": bookmarks_counts.get(article.id, 0),
             "created_at": article.created_at
         })
 
@@ -280,11 +292,14 @@ def get_polls_admin(
     current_user: models.User = Depends(require_admin)
 ):
     """Liste des sondages pour admin (avec stats détaillées)"""
-    polls = db.query(models.Poll).order_by(models.Poll.created_at.desc()).all()
+    polls = db.query(models.Poll).options(
+        joinedload(models.Poll.author), selectinload(models.Poll.options)
+    ).order_by(models.Poll.created_at.desc()).all()
 
     result = []
     for poll in polls:
-        total_votes = sum(len(option.votes) for option in poll.options)
+        # `votes` est le compteur de l'option, tenu à jour à chaque vote
+        total_votes = sum(option.votes or 0 for option in poll.options)
         result.append({
             "id": poll.id,
             "question": poll.question,
@@ -296,7 +311,7 @@ def get_polls_admin(
             "options": [{
                 "id": option.id,
                 "text": option.text,
-                "votes": len(option.votes)
+                "votes": option.votes or 0
             } for option in poll.options]
         })
 
@@ -371,6 +386,10 @@ def get_users_admin(
     """Liste des utilisateurs pour admin"""
     users = db.query(models.User).order_by(models.User.created_at.desc()).offset(skip).limit(limit).all()
 
+    user_ids = [user.id for user in users]
+    posts_counts = count_by(db, models.Post.author_id, user_ids)
+    followers_counts = count_by(db, models.Follow.following_id, user_ids)
+
     return [{
         "id": user.id,
         "unique_id": user.unique_id,
@@ -383,8 +402,8 @@ def get_users_admin(
         "role": user.role,
         "is_admin": user.is_admin,
         "is_active": user.is_active,
-        "posts_count": len(user.posts),
-        "followers_count": len(user.followers),
+        "posts_count": posts_counts.get(user.id, 0),
+        "followers_count": followers_counts.get(user.id, 0),
         "created_at": user.created_at
     } for user in users]
 
@@ -441,7 +460,6 @@ def get_admin_stats(
 ):
     """Statistiques globales pour le dashboard admin"""
     from datetime import datetime, timedelta
-    from sqlalchemy import func, cast, Date
 
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)
@@ -456,32 +474,22 @@ def get_admin_stats(
     total_emergency_contacts = db.query(models.EmergencyContact).count()
     total_conversations = db.query(models.Conversation).count()
 
-    # Activité récente par jour
-    activity_query = (
-        db.query(
-            cast(func.date(models.Post.created_at), Date).label('date'),
-            func.count(models.Post.id).label('count')
-        )
+    # Activité récente par jour (une seule requête groupée)
+    # date() renvoie un texte sur SQLite, un objet date sur PostgreSQL: lu comme Date dans les deux cas
+    post_day = type_coerce(func.date(models.Post.created_at), Date)
+    counts_by_day = dict(
+        db.query(post_day, func.count(models.Post.id))
         .filter(models.Post.created_at >= start_date)
-        .group_by(cast(func.date(models.Post.created_at), Date))
-        .order_by(cast(func.date(models.Post.created_at), Date))
+        .group_by(post_day)
+        .all()
     )
 
     activity = []
     current_date = start_date
     while current_date <= end_date:
-        date_str = current_date.strftime('%Y-%m-%d')
-        count = 0
-
-        # Trouver le count pour cette date dans les résultats
-        for row in activity_query:
-            if row.date.strftime('%Y-%m-%d') == date_str:
-                count = row.count
-                break
-
         activity.append({
-            "date": date_str,
-            "count": count
+            "date": current_date.strftime('%Y-%m-%d'),
+            "count": counts_by_day.get(current_date.date(), 0)
         })
 
         current_date += timedelta(days=1)
@@ -500,6 +508,17 @@ def get_admin_stats(
         "activity": activity
     }
 
+# ============ SLOW QUERIES ============
+
+@router.get("/slow-queries/", response_model=List[dict])
+def get_slow_queries(
+    limit: int = 20,
+    current_user: models.User = Depends(require_admin)
+):
+    """Requêtes SQL lentes, des plus coûteuses (temps cumulé) aux moins coûteuses"""
+    return slow_query_log.top_offenders(limit)
+
+
 # ============ EVENTS ADMIN ============
 
 @router.get("/events/", response_model=List[dict])
@@ -512,7 +531,7 @@ def get_all_events_admin(
     current_user: models.User = Depends(require_admin)
 ):
     """Liste complète des événements pour admin (avec stats)"""
-    query = db.query(models.Event)
+    query = db.query(models.Event).options(joinedload(models.Event.author))
 
     if category:
         query = query.filter(models.Event.category == category)
@@ -523,12 +542,12 @@ def get_all_events_admin(
         models.Event.date.asc()
     ).offset(skip).limit(limit).all()
 
+    # Compter les inscriptions
+    registered_counts = count_by(db, models.EventRegistration.event_id, [event.id for event in events])
+
     result = []
     for event in events:
-        # Compter les inscriptions
-        registered_count = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id
-        ).count()
+        registered_count = registered_counts.get(event.id, 0)
 
         result.append({
             "id": event.id,
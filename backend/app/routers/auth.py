@@ -1,43 +1,45 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 import random
 import string
 from .. import models, schemas
-from ..database import get_db
+from ..database import get_async_db
 from ..auth import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
     get_password_hash,
-    get_current_user,
+    get_current_user_async,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
 
 router = APIRouter(prefix="/auth", tags=["Authentification"])
 
 
-def generate_unique_id(db: Session) -> str:
+async def generate_unique_id(db: AsyncSession) -> str:
     """Génère un identifiant unique SP-XXXXX"""
     while True:
         # Générer un numéro aléatoire à 5 chiffres
         number = ''.join(random.choices(string.digits, k=5))
         unique_id = f"SP-{number}"
         # Vérifier que cet ID n'existe pas déjà
-        existing = db.query(models.User).filter(
-            models.User.unique_id == unique_id
-        ).first()
+        existing = (await db.execute(
+            select(models.User.id).filter(models.User.unique_id == unique_id)
+        )).first()
         if not existing:
             return unique_id
 
 
 @router.post("/register", response_model=schemas.TokenResponse)
-def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Inscription d'un nouvel agent de santé"""
     # Vérifier si l'email existe déjà
-    existing_user = db.query(models.User).filter(
-        models.User.email == user_data.email
-    ).first()
+    existing_user = (await db.execute(
+        select(models.User.id).filter(models.User.email == user_data.email)
+    )).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -45,9 +47,9 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         )
 
     # Vérifier si le username existe déjà
-    existing_username = db.query(models.User).filter(
-        models.User.username == user_data.username
-    ).first()
+    existing_username = (await db.execute(
+        select(models.User.id).filter(models.User.username == user_data.username)
+    )).first()
     if existing_username:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,6 +58,7 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
 
     # Créer l'utilisateur
     user = models.User(
+        unique_id=await generate_unique_id(db),
         email=user_data.email,
         username=user_data.username,
         first_name=user_data.first_name,
@@ -64,11 +67,10 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         health_center=user_data.health_center,
         role=user_data.role,
         professional_id=user_data.professional_id,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await run_in_threadpool(get_password_hash, user_data.password),
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
 
     # Générer le token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -84,12 +86,12 @@ def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=schemas.TokenResponse)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Connexion d'un agent de santé"""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -110,36 +112,34 @@ def login(
 
 
 @router.get("/me", response_model=schemas.UserWithStats)
-def get_current_user_info(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+async def get_current_user_info(
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Récupérer les informations de l'utilisateur connecté avec statistiques"""
-    from sqlalchemy import func
-
     user_data = schemas.UserWithStats.model_validate(current_user)
 
     # Compter les posts
-    user_data.posts_count = db.query(func.count(models.Post.id)).filter(
-        models.Post.author_id == current_user.id
-    ).scalar() or 0
+    user_data.posts_count = (await db.execute(
+        select(func.count(models.Post.id)).filter(models.Post.author_id == current_user.id)
+    )).scalar() or 0
 
     # Compter les followers
-    user_data.followers_count = db.query(func.count(models.Follow.id)).filter(
-        models.Follow.following_id == current_user.id
-    ).scalar() or 0
+    user_data.followers_count = (await db.execute(
+        select(func.count(models.Follow.id)).filter(models.Follow.following_id == current_user.id)
+    )).scalar() or 0
 
     # Compter les following
-    user_data.following_count = db.query(func.count(models.Follow.id)).filter(
-        models.Follow.follower_id == current_user.id
-    ).scalar() or 0
+    user_data.following_count = (await db.execute(
+        select(func.count(models.Follow.id)).filter(models.Follow.follower_id == current_user.id)
+    )).scalar() or 0
 
     return user_data
 
 
 # ============ QUICK-REGISTER ERROR HANDLING START ============
 @router.post("/quick-register", response_model=schemas.TokenResponse)
-def quick_register(user_data: schemas.QuickRegisterRequest, db: Session = Depends(get_db)):
+async def quick_register(user_data: schemas.QuickRegisterRequest, db: AsyncSession = Depends(get_async_db)):
     """Inscription rapide sans mot de passe pour les agents de santé"""
     try:
         # Validation des champs requis
@@ -155,7 +155,7 @@ def quick_register(user_data: schemas.QuickRegisterRequest, db: Session = Depend
             )
 
         # Générer un identifiant unique
-        unique_id = generate_unique_id(db)
+        unique_id = await generate_unique_id(db)
 
         # Créer l'utilisateur
         user = models.User(
@@ -172,8 +172,7 @@ def quick_register(user_data: schemas.QuickRegisterRequest, db: Session = Depend
             department=user_data.department,
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
+        await db.commit()
 
         # Générer le token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -214,16 +213,16 @@ def quick_register(user_data: schemas.QuickRegisterRequest, db: Session = Depend
 
 
 @router.post("/logout")
-def logout(current_user: models.User = Depends(get_current_user)):
+async def logout(current_user: models.User = Depends(get_current_user_async)):
     """Déconnexion (côté client uniquement pour JWT)"""
     return {"message": "Déconnexion réussie"}
 
 
 @router.post("/change-password")
-def change_password(
+async def change_password(
     data: schemas.ChangePasswordRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Changer le mot de passe"""
     # Vérifier si l'utilisateur a un mot de passe
@@ -234,15 +233,15 @@ def change_password(
         )
 
     # Vérifier l'ancien mot de passe
-    if not verify_password(data.old_password, current_user.password_hash):
+    if not await run_in_threadpool(verify_password, data.old_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ancien mot de passe incorrect"
         )
 
     # Mettre à jour le mot de passe
-    current_user.password_hash = get_password_hash(data.new_password)
-    db.commit()
+    current_user.password_hash = await run_in_threadpool(get_password_hash, data.new_password)
+    await db.commit()
 
     return {"message": "Mot de passe modifié avec succès"}
 
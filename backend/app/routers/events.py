@@ -1,122 +1,485 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, update, insert, tuple_, text, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import List
 from datetime import datetime
+import re
 from .. import models, schemas
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db, use_primary_db
+from ..auth import get_current_user_async
+from ..services.outbox import record_activity
+from ..services.images import variants_for, settle_variants
 
 router = APIRouter(prefix="/events", tags=["Events"])
 
 
+def event_to_dict(event: models.Event, registered_count: int, is_registered: bool, author_name: str = None) -> dict:
+    if author_name is None:
+        author_name = f"{event.author.first_name} {event.author.last_name}" if event.author else "Inconnu"
+    return {
+        "id": event.id,
+        "title": event.title,
+        "description": event.description,
+        "category": event.category,
+        "date": event.date,
+        "time": event.time,
+        "location": event.location,
+        "district": event.district,
+        "organizer": event.organizer,
+        "max_participants": event.max_participants,
+        "image_url": event.image_url,
+        "image_variants": event.image_variants,
+        "author_id": event.author_id,
+        "author_name": author_name,
+        "registered_count": registered_count,
+        "is_registered": is_registered,
+        "created_at": event.created_at,
+        "updated_at": event.updated_at
+    }
+
+
+async def get_registration_stats(db: AsyncSession, event_ids: List[int], user_id: int):
+    """Nombre d'inscrits par événement et événements auxquels l'utilisateur est inscrit"""
+    if not event_ids:
+        return {}, set()
+
+    # Compter les inscriptions
+    counts = dict((await db.execute(
+        select(models.EventRegistration.event_id, func.count(models.EventRegistration.id)).filter(
+            models.EventRegistration.event_id.in_(event_ids)
+        ).group_by(models.EventRegistration.event_id)
+    )).all())
+
+    # Vérifier si l'utilisateur est inscrit
+    registered = set((await db.execute(
+        select(models.EventRegistration.event_id).filter(
+            models.EventRegistration.event_id.in_(event_ids),
+            models.EventRegistration.user_id == user_id
+        )
+    )).scalars().all())
+    return counts, registered
+
+
+async def get_event_or_404(db: AsyncSession, event_id: int) -> models.Event:
+    event = (await db.execute(
+        select(models.Event).options(joinedload(models.Event.author)).filter(models.Event.id == event_id)
+    )).scalars().first()
+    if not event:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Événement non trouvé"
+        )
+    return event
+
+
+# ============ MESSAGES ============
+# Déclarées avant les routes /{event_id}, qui masqueraient GET /conversations
+
+# Taille maximale d'une page de messages
+MESSAGES_PAGE_MAX = 100
+
+# Participants et dernier message chargés en une fois (pas de lazy loading en async)
+CONVERSATION_LOAD_OPTIONS = (
+    joinedload(models.Conversation.user1),
+    joinedload(models.Conversation.user2),
+    joinedload(models.Conversation.last_message).joinedload(models.Message.sender),
+    joinedload(models.Conversation.last_message).joinedload(models.Message.receiver),
+)
+
+
+@router.get("/conversations", response_model=List[schemas.ConversationResponse])
+async def get_conversations(
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Boîte de réception: conversations, participants, dernier message et non-lus (2 requêtes)"""
+    conversations = (await db.execute(
+        select(models.Conversation).options(*CONVERSATION_LOAD_OPTIONS).filter(
+            (models.Conversation.user1_id == current_user.id) |
+            (models.Conversation.user2_id == current_user.id)
+        ).order_by(models.Conversation.updated_at.desc()).offset(skip).limit(limit)
+    )).scalars().unique().all()
+
+    # Messages non lus par conversation (agrégat groupé sur l'index des non-lus)
+    unread_counts = dict((await db.execute(
+        select(models.Message.conversation_id, func.count(models.Message.id)).filter(
+            models.Message.receiver_id == current_user.id,
+            models.Message.is_read == False,
+            models.Message.conversation_id.in_([conv.id for conv in conversations])
+        ).group_by(models.Message.conversation_id)
+    )).all()) if conversations else {}
+
+    return [{
+        "id": conv.id,
+        "user1_id": conv.user1_id,
+        "user2_id": conv.user2_id,
+        "user1": conv.user1,
+        "user2": conv.user2,
+        "last_message": conv.last_message,
+        "unread_count": unread_counts.get(conv.id, 0),
+        "updated_at": conv.updated_at
+    } for conv in conversations]
+
+
+# Marque les messages comme lus: doit s'exécuter sur le primaire
+@router.get(
+    "/conversations/{conversation_id}",
+    response_model=schemas.ConversationWithMessages,
+    dependencies=[Depends(use_primary_db)]
+)
+async def get_conversation(
+    conversation_id: int,
+    before: int = None,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Détails d'une conversation avec ses messages, du plus récent au plus ancien.
+
+    Pagination par curseur: passer `before=<next_cursor>` pour la page précédente.
+    """
+    conversation = (await db.execute(
+        select(models.Conversation).options(*CONVERSATION_LOAD_OPTIONS).filter(
+            models.Conversation.id == conversation_id
+        )
+    )).scalars().first()
+    if not conversation:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Conversation non trouvée"
+        )
+
+    # Vérifier que l'utilisateur fait partie de la conversation
+    if conversation.user1_id != current_user.id and conversation.user2_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Vous n'avez pas accès à cette conversation"
+        )
+
+    limit = max(1, min(limit, MESSAGES_PAGE_MAX))
+
+    # Obtenir une page de messages de cette conversation (index conversation_id, created_at)
+    query = select(models.Message).options(
+        joinedload(models.Message.sender), joinedload(models.Message.receiver)
+    ).filter(
+        models.Message.conversation_id == conversation_id
+    )
+    if before is not None:
+        # Curseur (created_at, id) du message `before`, résolu dans la même requête
+        cursor_created_at = select(models.Message.created_at).filter(
+            models.Message.id == before
+        ).scalar_subquery()
+        query = query.filter(
+            tuple_(models.Message.created_at, models.Message.id) < tuple_(cursor_created_at, before)
+        )
+    messages = (await db.execute(
+        query.order_by(models.Message.created_at.desc(), models.Message.id.desc()).limit(limit + 1)
+    )).scalars().all()
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    # Marquer comme lus, en une seule requête, les messages reçus jusqu'au plus récent affiché
+    if messages:
+        await db.execute(
+            update(models.Message).where(
+                models.Message.conversation_id == conversation_id,
+                models.Message.receiver_id == current_user.id,
+                models.Message.is_read == False,
+                models.Message.id <= messages[0].id
+            ).values(is_read=True)
+        )
+        await db.commit()
+
+    return {
+        "id": conversation.id,
+        "user1_id": conversation.user1_id,
+        "user2_id": conversation.user2_id,
+        "user1": conversation.user1,
+        "user2": conversation.user2,
+        "last_message": conversation.last_message,
+        "updated_at": conversation.updated_at,
+        "messages": messages,
+        "next_cursor": messages[-1].id if has_more else None
+    }
+
+
+def conversation_between(user_id: int, other_ids: List[int]):
+    """Filtre: conversations entre `user_id` et l'un des `other_ids` (paire stockée dans un ordre quelconque)"""
+    return (
+        ((models.Conversation.user1_id == user_id) & models.Conversation.user2_id.in_(other_ids)) |
+        ((models.Conversation.user2_id == user_id) & models.Conversation.user1_id.in_(other_ids))
+    )
+
+
+@router.post("/messages", response_model=schemas.MessageResponse)
+async def send_message(
+    message_data: schemas.MessageCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Envoyer un message (une seule transaction)"""
+    # Vérifier que le destinataire existe
+    receiver = await db.get(models.User, message_data.receiver_id)
+    if not receiver:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Destinataire non trouvé"
+        )
+
+    # Créer ou récupérer la conversation
+    conversation = (await db.execute(
+        select(models.Conversation).filter(conversation_between(current_user.id, [message_data.receiver_id]))
+    )).scalars().first()
+
+    if not conversation:
+        conversation = models.Conversation(
+            user1_id=min(current_user.id, message_data.receiver_id),
+            user2_id=max(current_user.id, message_data.receiver_id)
+        )
+        db.add(conversation)
+        await db.flush()
+
+    # Créer le message
+    message = models.Message(
+        content=message_data.content,
+        sender_id=current_user.id,
+        receiver_id=message_data.receiver_id,
+        conversation_id=conversation.id
+    )
+    db.add(message)
+    await db.flush()
+
+    # Mettre à jour le dernier message de la conversation, puis valider le tout
+    conversation.last_message_id = message.id
+    conversation.updated_at = datetime.utcnow()
+    await db.commit()
+
+    return {
+        "id": message.id,
+        "content": message.content,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "is_read": message.is_read,
+        "created_at": message.created_at,
+        "sender": current_user,
+        "receiver": receiver
+    }
+
+
+# Rôles autorisés à diffuser un message à plusieurs agents
+BROADCAST_ROLES = {"superviseur", "medecin_chef"}
+# Nombre maximal de destinataires d'une diffusion
+MESSAGE_BATCH_MAX = 5000
+
+
+@router.post("/messages/batch", response_model=schemas.MessageBatchResponse)
+async def send_message_batch(
+    batch: schemas.MessageBatchCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Diffuser un message à plusieurs destinataires (superviseurs de district, administrateurs).
+
+    Destinataires: `receiver_ids` et/ou tous les agents actifs d'un `district`.
+    Conversations manquantes et messages sont insérés en requêtes multi-lignes,
+    dans une seule transaction.
+    """
+    if not current_user.is_admin and current_user.role not in BROADCAST_ROLES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Diffusion réservée aux superviseurs de district"
+        )
+    if not batch.receiver_ids and not batch.district:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Indiquez des destinataires ou un district"
+        )
+
+    # Destinataires existants et actifs (hors expéditeur)
+    recipients = select(models.User.id).filter(
+        models.User.is_active == True,
+        models.User.id != current_user.id
+    )
+    if batch.district:
+        recipients = recipients.filter(models.User.district == batch.district)
+    if batch.receiver_ids:
+        recipients = recipients.filter(models.User.id.in_(set(batch.receiver_ids)))
+    receiver_ids = sorted((await db.execute(recipients)).scalars().all())
+    if not receiver_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Aucun destinataire trouvé"
+        )
+    if len(receiver_ids) > MESSAGE_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Trop de destinataires (maximum {MESSAGE_BATCH_MAX})"
+        )
+
+    # Conversations existantes, puis création des manquantes en une insertion
+    conversation_ids = {}
+    for conv_id, user1_id, user2_id in (await db.execute(
+        select(models.Conversation.id, models.Conversation.user1_id, models.Conversation.user2_id).filter(
+            conversation_between(current_user.id, receiver_ids)
+        )
+    )).all():
+        conversation_ids.setdefault(user2_id if user1_id == current_user.id else user1_id, conv_id)
+
+    missing = [receiver_id for receiver_id in receiver_ids if receiver_id not in conversation_ids]
+    if missing:
+        created = await db.execute(
+            insert(models.Conversation).returning(
+                models.Conversation.id, models.Conversation.user1_id, models.Conversation.user2_id
+            ),
+            [{"user1_id": min(current_user.id, receiver_id), "user2_id": max(current_user.id, receiver_id)}
+             for receiver_id in missing]
+        )
+        for conv_id, user1_id, user2_id in created.all():
+            conversation_ids[user2_id if user1_id == current_user.id else user1_id] = conv_id
+
+    # Messages: une insertion multi-lignes
+    now = datetime.utcnow()
+    inserted = await db.execute(
+        insert(models.Message).returning(models.Message.id, models.Message.conversation_id),
+        [{
+            "content": batch.content,
+            "sender_id": current_user.id,
+            "receiver_id": receiver_id,
+            "conversation_id": conversation_ids[receiver_id],
+            "is_read": False,
+            "created_at": now,
+        } for receiver_id in receiver_ids]
+    )
+
+    # Dernier message de chaque conversation (mise à jour groupée par clé primaire)
+    await db.execute(update(models.Conversation), [
+        {"id": conv_id, "last_message_id": message_id, "updated_at": now}
+        for message_id, conv_id in inserted.all()
+    ])
+    await db.commit()
+
+    return {"sent_count": len(receiver_ids), "receiver_ids": receiver_ids}
+
+
+# Taille maximale d'une page de résultats de recherche
+MESSAGE_SEARCH_MAX = 50
+# Longueur des extraits (en jetons) et balises des termes trouvés
+SNIPPET_TOKENS = 12
+HIGHLIGHT_OPEN, HIGHLIGHT_CLOSE = "<mark>", "</mark>"
+
+_SEARCH_TERM = re.compile(r"\w+", re.UNICODE)
+
+MESSAGE_SEARCH_SQL = text(f"""
+    SELECT messages.id, messages.conversation_id, messages.sender_id, messages.receiver_id, messages.created_at,
+           snippet(messages_fts, 0, '{HIGHLIGHT_OPEN}', '{HIGHLIGHT_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet
+    FROM messages_fts JOIN messages ON messages.id = messages_fts.rowid
+    WHERE messages_fts MATCH :match
+    ORDER BY bm25(messages_fts)
+    LIMIT :limit OFFSET :skip
+""")
+
+
+def fts_match_expression(q: str, user_id: int) -> str:
+    """Requête FTS5 limitée aux messages de l'utilisateur; les termes sont cités (pas d'injection de syntaxe)"""
+    terms = _SEARCH_TERM.findall(q)
+    if not terms:
+        return None
+    # Dernier terme en préfixe: recherche pendant la saisie
+    quoted = [f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*']
+    return f'participants : "u{user_id}" AND content : ({" ".join(quoted)})'
+
+
+@router.get("/messages/search", response_model=List[schemas.MessageSearchResult])
+async def search_messages(
+    q: str,
+    skip: int = 0,
+    limit: int = 20,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Recherche plein texte dans les messages envoyés ou reçus par l'utilisateur, par pertinence"""
+    match = fts_match_expression(q, current_user.id)
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Requête de recherche vide"
+        )
+    limit = max(1, min(limit, MESSAGE_SEARCH_MAX))
+
+    if (await db.connection()).dialect.name == "sqlite":
+        rows = (await db.execute(MESSAGE_SEARCH_SQL, {"match": match, "limit": limit, "skip": skip})).mappings().all()
+        return [dict(row) for row in rows]
+
+    # Autres bases (sans FTS5): recherche limitée aux messages de l'utilisateur, du plus récent au plus ancien
+    query = select(models.Message).filter(
+        or_(models.Message.sender_id == current_user.id, models.Message.receiver_id == current_user.id)
+    )
+    for term in _SEARCH_TERM.findall(q):
+        query = query.filter(models.Message.content.ilike(f"%{term}%"))
+    messages = (await db.execute(
+        query.order_by(models.Message.created_at.desc()).offset(skip).limit(limit)
+    )).scalars().all()
+    return [{
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "sender_id": message.sender_id,
+        "receiver_id": message.receiver_id,
+        "snippet": message.content[:200],
+        "created_at": message.created_at
+    } for message in messages]
+
 # ============ EVENTS ============
 
 @router.get("/", response_model=List[schemas.EventResponse])
-def get_events(
+async def get_events(
     category: str = None,
     district: str = None,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Liste des événements"""
-    query = db.query(models.Event)
+    query = select(models.Event).options(joinedload(models.Event.author))
 
     if category:
         query = query.filter(models.Event.category == category)
     if district:
         query = query.filter(models.Event.district == district)
 
-    events = query.order_by(models.Event.date.asc()).offset(skip).limit(limit).all()
+    events = (await db.execute(
+        query.order_by(models.Event.date.asc()).offset(skip).limit(limit)
+    )).scalars().all()
 
-    result = []
-    for event in events:
-        # Vérifier si l'utilisateur est inscrit
-        is_registered = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id,
-            models.EventRegistration.user_id == current_user.id
-        ).first() is not None
-
-        # Compter les inscriptions
-        registered_count = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event.id
-        ).count()
-
-        result.append({
-            "id": event.id,
-            "title": event.title,
-            "description": event.description,
-            "category": event.category,
-            "date": event.date,
-            "time": event.time,
-            "location": event.location,
-            "district": event.district,
-            "organizer": event.organizer,
-            "max_participants": event.max_participants,
-            "image_url": event.image_url,
-            "author_id": event.author_id,
-            "author_name": f"{event.author.first_name} {event.author.last_name}" if event.author else "Inconnu",
-            "registered_count": registered_count,
-            "is_registered": is_registered,
-            "created_at": event.created_at,
-            "updated_at": event.updated_at
-        })
-
-    return result
+    counts, registered = await get_registration_stats(db, [e.id for e in events], current_user.id)
+    return [
+        event_to_dict(event, counts.get(event.id, 0), event.id in registered)
+        for event in events
+    ]
 
 
 @router.get("/{event_id}", response_model=schemas.EventResponse)
-def get_event(
+async def get_event(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Détails d'un événement"""
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Événement non trouvé"
-        )
+    event = await get_event_or_404(db, event_id)
 
-    # Vérifier si l'utilisateur est inscrit
-    is_registered = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event.id,
-        models.EventRegistration.user_id == current_user.id
-    ).first() is not None
-
-    # Compter les inscriptions
-    registered_count = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event.id
-    ).count()
-
-    return {
-        "id": event.id,
-        "title": event.title,
-        "description": event.description,
-        "category": event.category,
-        "date": event.date,
-        "time": event.time,
-        "location": event.location,
-        "district": event.district,
-        "organizer": event.organizer,
-        "max_participants": event.max_participants,
-        "image_url": event.image_url,
-        "author_id": event.author_id,
-        "author_name": f"{event.author.first_name} {event.author.last_name}" if event.author else "Inconnu",
-        "registered_count": registered_count,
-        "is_registered": is_registered,
-        "created_at": event.created_at,
-        "updated_at": event.updated_at
-    }
+    counts, registered = await get_registration_stats(db, [event.id], current_user.id)
+    return event_to_dict(event, counts.get(event.id, 0), event.id in registered)
 
 
 @router.post("/", response_model=schemas.EventResponse)
-def create_event(
+async def create_event(
     event_data: schemas.EventCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Créer un événement"""
     event = models.Event(
@@ -130,47 +493,25 @@ def create_event(
         organizer=event_data.organizer,
         max_participants=event_data.max_participants,
         image_url=event_data.image_url,
+        image_variants=await variants_for(db, event_data.image_url),
         author_id=current_user.id
     )
     db.add(event)
-    db.commit()
-    db.refresh(event)
+    await db.commit()
+    await settle_variants(db, event)
 
-    return {
-        "id": event.id,
-        "title": event.title,
-        "description": event.description,
-        "category": event.category,
-        "date": event.date,
-        "time": event.time,
-        "location": event.location,
-        "district": event.district,
-        "organizer": event.organizer,
-        "max_participants": event.max_participants,
-        "image_url": event.image_url,
-        "author_id": event.author_id,
-        "author_name": f"{current_user.first_name} {current_user.last_name}",
-        "registered_count": 0,
-        "is_registered": False,
-        "created_at": event.created_at,
-        "updated_at": event.updated_at
-    }
+    return event_to_dict(event, 0, False, author_name=f"{current_user.first_name} {current_user.last_name}")
 
 
 @router.put("/{event_id}", response_model=schemas.EventResponse)
-def update_event(
+async def update_event(
     event_id: int,
     event_data: schemas.EventUpdate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Modifier un événement"""
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Événement non trouvé"
-        )
+    event = await get_event_or_404(db, event_id)
 
     # Vérifier que l'utilisateur est l'auteur ou admin
     if event.author_id != current_user.id and not current_user.is_admin:
@@ -197,57 +538,28 @@ def update_event(
         event.organizer = event_data.organizer
     if event_data.max_participants is not None:
         event.max_participants = event_data.max_participants
-    if event_data.image_url is not None:
+    image_changed = event_data.image_url is not None and event_data.image_url != event.image_url
+    if image_changed:
         event.image_url = event_data.image_url
+        event.image_variants = await variants_for(db, event_data.image_url)
 
-    db.commit()
-    db.refresh(event)
-
-    # Vérifier si l'utilisateur est inscrit
-    is_registered = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event.id,
-        models.EventRegistration.user_id == current_user.id
-    ).first() is not None
-
-    # Compter les inscriptions
-    registered_count = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event.id
-    ).count()
+    await db.commit()
+    if image_changed:
+        await settle_variants(db, event)
+    await db.refresh(event, ["updated_at"])
 
-    return {
-        "id": event.id,
-        "title": event.title,
-        "description": event.description,
-        "category": event.category,
-        "date": event.date,
-        "time": event.time,
-        "location": event.location,
-        "district": event.district,
-        "organizer": event.organizer,
-        "max_participants": event.max_participants,
-        "image_url": event.image_url,
-        "author_id": event.author_id,
-        "author_name": f"{event.author.first_name} {event.author.last_name}" if event.author else "Inconnu",
-        "registered_count": registered_count,
-        "is_registered": is_registered,
-        "created_at": event.created_at,
-        "updated_at": event.updated_at
-    }
+    counts, registered = await get_registration_stats(db, [event.id], current_user.id)
+    return event_to_dict(event, counts.get(event.id, 0), event.id in registered)
 
 
 @router.delete("/{event_id}")
-def delete_event(
+async def delete_event(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Supprimer un événement"""
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
-    if not event:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Événement non trouvé"
-        )
+    event = await get_event_or_404(db, event_id)
 
     # Vérifier que l'utilisateur est l'auteur ou admin
     if event.author_id != current_user.id and not current_user.is_admin:
@@ -256,21 +568,21 @@ def delete_event(
             detail="Vous n'avez pas la permission de supprimer cet événement"
         )
 
-    db.delete(event)
-    db.commit()
+    await db.delete(event)
+    await db.commit()
     return {"message": "Événement supprimé avec succès"}
 
 
 # ============ INSCRIPTIONS ============
 
 @router.post("/{event_id}/register", response_model=schemas.EventRegistrationResponse)
-def register_to_event(
+async def register_to_event(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """S'inscrire à un événement"""
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    event = await db.get(models.Event, event_id)
     if not event:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -278,10 +590,12 @@ def register_to_event(
         )
 
     # Vérifier si déjà inscrit
-    existing_registration = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event_id,
-        models.EventRegistration.user_id == current_user.id
-    ).first()
+    existing_registration = (await db.execute(
+        select(models.EventRegistration.id).filter(
+            models.EventRegistration.event_id == event_id,
+            models.EventRegistration.user_id == current_user.id
+        )
+    )).first()
     if existing_registration:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -290,9 +604,11 @@ def register_to_event(
 
     # Vérifier la capacité maximale
     if event.max_participants:
-        registered_count = db.query(models.EventRegistration).filter(
-            models.EventRegistration.event_id == event_id
-        ).count()
+        registered_count = (await db.execute(
+            select(func.count(models.EventRegistration.id)).filter(
+                models.EventRegistration.event_id == event_id
+            )
+        )).scalar()
         if registered_count >= event.max_participants:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -305,42 +621,44 @@ def register_to_event(
         user_id=current_user.id
     )
     db.add(registration)
-    db.commit()
-    db.refresh(registration)
+    record_activity(db, "event.registered", "event", event_id, event.author_id, current_user)
+    await db.commit()
 
     return registration
 
 
 @router.delete("/{event_id}/unregister")
-def unregister_from_event(
+async def unregister_from_event(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Annuler son inscription à un événement"""
-    registration = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event_id,
-        models.EventRegistration.user_id == current_user.id
-    ).first()
+    registration = (await db.execute(
+        select(models.EventRegistration).filter(
+            models.EventRegistration.event_id == event_id,
+            models.EventRegistration.user_id == current_user.id
+        )
+    )).scalars().first()
     if not registration:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Inscription non trouvée"
         )
 
-    db.delete(registration)
-    db.commit()
+    await db.delete(registration)
+    await db.commit()
     return {"message": "Inscription annulée avec succès"}
 
 
 @router.get("/{event_id}/registrations", response_model=List[schemas.EventRegistrationResponse])
-def get_event_registrations(
+async def get_event_registrations(
     event_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Liste des inscriptions à un événement (admin ou auteur uniquement)"""
-    event = db.query(models.Event).filter(models.Event.id == event_id).first()
+    event = await db.get(models.Event, event_id)
     if not event:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -354,144 +672,10 @@ def get_event_registrations(
             detail="Vous n'avez pas la permission de voir les inscriptions"
         )
 
-    registrations = db.query(models.EventRegistration).filter(
-        models.EventRegistration.event_id == event_id
-    ).all()
-
-    return registrations
-
-
-# ============ MESSAGES ============
-
-@router.get("/conversations", response_model=List[schemas.ConversationResponse])
-def get_conversations(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    """Liste des conversations de l'utilisateur"""
-    conversations = db.query(models.Conversation).filter(
-        (models.Conversation.user1_id == current_user.id) |
-        (models.Conversation.user2_id == current_user.id)
-    ).order_by(models.Conversation.updated_at.desc()).all()
-
-    result = []
-    for conv in conversations:
-        # Déterminer l'autre utilisateur
-        other_user = conv.user1 if conv.user2_id == current_user.id else conv.user2
-
-        # Obtenir le dernier message
-        last_message = conv.last_message
-
-        result.append({
-            "id": conv.id,
-            "user1_id": conv.user1_id,
-            "user2_id": conv.user2_id,
-            "user1": conv.user1,
-            "user2": conv.user2,
-            "last_message": last_message,
-            "updated_at": conv.updated_at
-        })
-
-    return result
-
-
-@router.get("/conversations/{conversation_id}", response_model=schemas.ConversationWithMessages)
-def get_conversation(
-    conversation_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    """Détails d'une conversation avec tous les messages"""
-    conversation = db.query(models.Conversation).filter(models.Conversation.id == conversation_id).first()
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversation non trouvée"
-        )
-
-    # Vérifier que l'utilisateur fait partie de la conversation
-    if conversation.user1_id != current_user.id and conversation.user2_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Vous n'avez pas accès à cette conversation"
-        )
-
-    # Obtenir les messages
-    messages = db.query(models.Message).filter(
-        (models.Message.sender_id == current_user.id) |
-        (models.Message.receiver_id == current_user.id)
-    ).order_by(models.Message.created_at.asc()).all()
-
-    # Marquer les messages comme lus
-    for message in messages:
-        if message.receiver_id == current_user.id and not message.is_read:
-            message.is_read = True
-    db.commit()
-
-    return {
-        "id": conversation.id,
-        "user1_id": conversation.user1_id,
-        "user2_id": conversation.user2_id,
-        "user1": conversation.user1,
-        "user2": conversation.user2,
-        "last_message": conversation.last_message,
-        "updated_at": conversation.updated_at,
-        "messages": messages
-    }
-
-
-@router.post("/messages", response_model=schemas.MessageResponse)
-def send_message(
-    message_data: schemas.MessageCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    """Envoyer un message"""
-    # Vérifier que le destinataire existe
-    receiver = db.query(models.User).filter(models.User.id == message_data.receiver_id).first()
-    if not receiver:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Destinataire non trouvé"
-        )
-
-    # Créer ou récupérer la conversation
-    conversation = db.query(models.Conversation).filter(
-        ((models.Conversation.user1_id == current_user.id) & (models.Conversation.user2_id == message_data.receiver_id)) |
-        ((models.Conversation.user1_id == message_data.receiver_id) & (models.Conversation.user2_id == current_user.id))
-    ).first()
-
-    if not conversation:
-        conversation = models.Conversation(
-            user1_id=min(current_user.id, message_data.receiver_id),
-            user2_id=max(current_user.id, message_data.receiver_id)
+    registrations = (await db.execute(
+        select(models.EventRegistration).filter(
+            models.EventRegistration.event_id == event_id
         )
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+    )).scalars().all()
 
-    # Créer le message
-    message = models.Message(
-        content=message_data.content,
-        sender_id=current_user.id,
-        receiver_id=message_data.receiver_id
-    )
-    db.add(message)
-    db.commit()
-    db.refresh(message)
-
-    # Mettre à jour le dernier message de la conversation
-    conversation.last_message_id = message.id
-    conversation.updated_at = datetime.utcnow()
-    db.commit()
-
-    return {
-        "id": message.id,
-        "content": message.content,
-        "sender_id": message.sender_id,
-        "receiver_id": message.receiver_id,
-        "is_read": message.is_read,
-        "created_at": message.created_at,
-        "sender": current_user,
-        "receiver": receiver
-    }
\ No newline at end of file
+    return registrations
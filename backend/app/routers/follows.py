@@ -1,18 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from .. import models, schemas
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db
+from ..auth import get_current_user_async
+from ..services.outbox import record_activity
 
 router = APIRouter(prefix="/follows", tags=["Suivis"])
 
 
+async def get_user_or_404(db: AsyncSession, user_id: int) -> models.User:
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Utilisateur non trouvé"
+        )
+    return user
+
+
+async def list_followers(db: AsyncSession, user_id: int, skip: int, limit: int) -> List[models.User]:
+    result = await db.execute(
+        select(models.User).join(
+            models.Follow, models.Follow.follower_id == models.User.id
+        ).filter(
+            models.Follow.following_id == user_id
+        ).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+
+async def list_following(db: AsyncSession, user_id: int, skip: int, limit: int) -> List[models.User]:
+    result = await db.execute(
+        select(models.User).join(
+            models.Follow, models.Follow.following_id == models.User.id
+        ).filter(
+            models.Follow.follower_id == user_id
+        ).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+
 @router.post("/{user_id}", response_model=schemas.FollowResponse)
-def follow_user(
+async def follow_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Suivre un agent de santé"""
     if user_id == current_user.id:
@@ -21,18 +55,15 @@ def follow_user(
             detail="Vous ne pouvez pas vous suivre vous-même"
         )
 
-    user_to_follow = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user_to_follow:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Utilisateur non trouvé"
-        )
+    user_to_follow = await get_user_or_404(db, user_id)
 
     # Vérifier si déjà suivi
-    existing_follow = db.query(models.Follow).filter(
-        models.Follow.follower_id == current_user.id,
-        models.Follow.following_id == user_id
-    ).first()
+    existing_follow = (await db.execute(
+        select(models.Follow.id).filter(
+            models.Follow.follower_id == current_user.id,
+            models.Follow.following_id == user_id
+        )
+    )).first()
 
     if existing_follow:
         raise HTTPException(
@@ -40,25 +71,27 @@ def follow_user(
             detail="Vous suivez déjà cet utilisateur"
         )
 
-    follow = models.Follow(follower_id=current_user.id, following_id=user_id)
+    follow = models.Follow(follower=current_user, following=user_to_follow)
     db.add(follow)
-    db.commit()
-    db.refresh(follow)
+    record_activity(db, "user.followed", "user", user_id, user_id, current_user)
+    await db.commit()
 
     return schemas.FollowResponse.model_validate(follow)
 
 
 @router.delete("/{user_id}")
-def unfollow_user(
+async def unfollow_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Ne plus suivre un agent de santé"""
-    follow = db.query(models.Follow).filter(
-        models.Follow.follower_id == current_user.id,
-        models.Follow.following_id == user_id
-    ).first()
+    follow = (await db.execute(
+        select(models.Follow).filter(
+            models.Follow.follower_id == current_user.id,
+            models.Follow.following_id == user_id
+        )
+    )).scalars().first()
 
     if not follow:
         raise HTTPException(
@@ -66,90 +99,54 @@ def unfollow_user(
             detail="Vous ne suivez pas cet utilisateur"
         )
 
-    db.delete(follow)
-    db.commit()
+    await db.delete(follow)
+    await db.commit()
     return {"message": "Vous ne suivez plus cet utilisateur"}
 
 
 @router.get("/followers", response_model=List[schemas.UserResponse])
-def get_my_followers(
+async def get_my_followers(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Liste de mes followers"""
-    follows = db.query(models.Follow).filter(
-        models.Follow.following_id == current_user.id
-    ).offset(skip).limit(limit).all()
-
-    follower_ids = [f.follower_id for f in follows]
-    users = db.query(models.User).filter(models.User.id.in_(follower_ids)).all()
-    return users
+    return await list_followers(db, current_user.id, skip, limit)
 
 
 @router.get("/following", response_model=List[schemas.UserResponse])
-def get_my_following(
+async def get_my_following(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Liste des utilisateurs que je suis"""
-    follows = db.query(models.Follow).filter(
-        models.Follow.follower_id == current_user.id
-    ).offset(skip).limit(limit).all()
-
-    following_ids = [f.following_id for f in follows]
-    users = db.query(models.User).filter(models.User.id.in_(following_ids)).all()
-    return users
+    return await list_following(db, current_user.id, skip, limit)
 
 
 @router.get("/followers/{user_id}", response_model=List[schemas.UserResponse])
-def get_user_followers(
+async def get_user_followers(
     user_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Followers d'un utilisateur"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Utilisateur non trouvé"
-        )
-
-    follows = db.query(models.Follow).filter(
-        models.Follow.following_id == user_id
-    ).offset(skip).limit(limit).all()
-
-    follower_ids = [f.follower_id for f in follows]
-    users = db.query(models.User).filter(models.User.id.in_(follower_ids)).all()
-    return users
+    await get_user_or_404(db, user_id)
+    return await list_followers(db, user_id, skip, limit)
 
 
 @router.get("/following/{user_id}", response_model=List[schemas.UserResponse])
-def get_user_following(
+async def get_user_following(
     user_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Utilisateurs suivis par un utilisateur"""
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Utilisateur non trouvé"
-        )
-
-    follows = db.query(models.Follow).filter(
-        models.Follow.follower_id == user_id
-    ).offset(skip).limit(limit).all()
-
-    following_ids = [f.following_id for f in follows]
-    users = db.query(models.User).filter(models.User.id.in_(following_ids)).all()
-    return users
+    await get_user_or_404(db, user_id)
+    return await list_following(db, user_id, skip, limit)
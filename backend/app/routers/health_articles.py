@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 from typing import List
 from .. import models, schemas
 from ..database import get_db
@@ -8,6 +9,41 @@ from ..auth import get_current_user
 router = APIRouter(prefix="/health-articles", tags=["Articles de santé"])
 
 
+def build_article_responses(db: Session, articles: List[models.HealthArticle], current_user_id: int,
+                            bookmarked_ids: set = None):
+    """Ajoute compteur de likes et état "sauvegardé" à une liste d'articles (requêtes groupées)"""
+    article_ids = [article.id for article in articles]
+    if not article_ids:
+        return []
+
+    likes_counts = dict(db.query(
+        models.HealthArticleLike.article_id, func.count(models.HealthArticleLike.id)
+    ).filter(
+        models.HealthArticleLike.article_id.in_(article_ids)
+    ).group_by(models.HealthArticleLike.article_id).all())
+
+    # Vérifier si l'utilisateur a sauvegardé
+    if bookmarked_ids is None:
+        bookmarked_ids = {article_id for (article_id,) in db.query(models.HealthArticleBookmark.article_id).filter(
+            models.HealthArticleBookmark.article_id.in_(article_ids),
+            models.HealthArticleBookmark.user_id == current_user_id
+        ).all()}
+
+    return [{
+        "id": article.id,
+        "title": article.title,
+        "summary": article.summary,
+        "content": article.content,
+        "category": article.category,
+        "author_id": article.author_id,
+        "author_name": f"{article.author.first_name} {article.author.last_name}" if article.author else "Inconnu",
+        "read_time": article.read_time,
+        "likes_count": likes_counts.get(article.id, 0),
+        "is_bookmarked": article.id in bookmarked_ids,
+        "created_at": article.created_at
+    } for article in articles]
+
+
 @router.get("/", response_model=List[schemas.HealthArticleResponse])
 def get_articles(
     category: str = None,
@@ -17,7 +53,7 @@ def get_articles(
     current_user: models.User = Depends(get_current_user)
 ):
     """Liste de tous les articles de santé"""
-    query = db.query(models.HealthArticle)
+    query = db.query(models.HealthArticle).options(joinedload(models.HealthArticle.author))
 
     if category:
         query = query.filter(models.HealthArticle.category == category)
@@ -26,35 +62,7 @@ def get_articles(
         models.HealthArticle.created_at.desc()
     ).offset(skip).limit(limit).all()
 
-    result = []
-    for article in articles:
-        # Vérifier si l'utilisateur a liké
-        has_liked = db.query(models.HealthArticleLike).filter(
-            models.HealthArticleLike.article_id == article.id,
-            models.HealthArticleLike.user_id == current_user.id
-        ).first() is not None
-
-        # Vérifier si l'utilisateur a sauvegardé
-        has_bookmarked = db.query(models.HealthArticleBookmark).filter(
-            models.HealthArticleBookmark.article_id == article.id,
-            models.HealthArticleBookmark.user_id == current_user.id
-        ).first() is not None
-
-        result.append({
-            "id": article.id,
-            "title": article.title,
-            "summary": article.summary,
-            "content": article.content,
-            "category": article.category,
-            "author_id": article.author_id,
-            "author_name": f"{article.author.first_name} {article.author.last_name}" if article.author else "Inconnu",
-            "read_time": article.read_time,
-            "likes_count": len(article.likes),
-            "is_bookmarked": has_bookmarked,
-            "created_at": article.created_at
-        })
-
-    return result
+    return build_article_responses(db, articles, current_user.id)
 
 
 @router.get("/{article_id}", response_model=schemas.HealthArticleResponse)
@@ -64,7 +72,7 @@ def get_article(
     current_user: models.User = Depends(get_current_user)
 ):
     """Détails d'un article"""
-    article = db.query(models.HealthArticle).filter(
+    article = db.query(models.HealthArticle).options(joinedload(models.HealthArticle.author)).filter(
         models.HealthArticle.id == article_id
     ).first()
 
@@ -74,31 +82,7 @@ def get_article(
             detail="Article non trouvé"
         )
 
-    # Vérifier si l'utilisateur a liké
-    has_liked = db.query(models.HealthArticleLike).filter(
-        models.HealthArticleLike.article_id == article.id,
-        models.HealthArticleLike.user_id == current_user.id
-    ).first() is not None
-
-    # Vérifier si l'utilisateur a sauvegardé
-    has_bookmarked = db.query(models.HealthArticleBookmark).filter(
-        models.HealthArticleBookmark.article_id == article.id,
-        models.HealthArticleBookmark.user_id == current_user.id
-    ).first() is not None
-
-    return {
-        "id": article.id,
-        "title": article.title,
-        "summary": article.summary,
-        "content": article.content,
-        "category": article.category,
-        "author_id": article.author_id,
-        "author_name": f"{article.author.first_name} {article.author.last_name}" if article.author else "Inconnu",
-        "read_time": article.read_time,
-        "likes_count": len(article.likes),
-        "is_bookmarked": has_bookmarked,
-        "created_at": article.created_at
-    }
+    return build_article_responses(db, [article], current_user.id)[0]
 
 
 @router.post("/", response_model=schemas.HealthArticleResponse)
@@ -219,26 +203,12 @@ def get_bookmarked_articles(
     current_user: models.User = Depends(get_current_user)
 ):
     """Récupérer les articles sauvegardés"""
-    bookmarks = db.query(models.HealthArticleBookmark).filter(
+    articles = db.query(models.HealthArticle).options(
+        joinedload(models.HealthArticle.author)
+    ).join(
+        models.HealthArticleBookmark, models.HealthArticleBookmark.article_id == models.HealthArticle.id
+    ).filter(
         models.HealthArticleBookmark.user_id == current_user.id
-    ).all()
-
-    result = []
-    for bookmark in bookmarks:
-        article = bookmark.article
-        if article:
-            result.append({
-                "id": article.id,
-                "title": article.title,
-                "summary": article.summary,
-                "content": article.content,
-                "category": article.category,
-                "author_id": article.author_id,
-                "author_name": f"{article.author.first_name} {article.author.last_name}" if article.author else "Inconnu",
-                "read_time": article.read_time,
-                "likes_count": len(article.likes),
-                "is_bookmarked": True,
-                "created_at": article.created_at
-            })
-
-    return result
+    ).order_by(models.HealthArticleBookmark.id).all()
+
+    return build_article_responses(db, articles, current_user.id, {article.id for article in articles})
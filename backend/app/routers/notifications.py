@@ -1,53 +1,50 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
+import logging
 from .. import models, schemas
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db
+from ..auth import get_current_user_async
 from ..services.notifications import NotificationService, NotificationTypes
 
+logger = logging.getLogger(__name__)
+
+# NotificationService reste synchrone: ses méthodes sont exécutées via
+# AsyncSession.run_sync. Les envois push sont mis en file (services/push.py).
+
 router = APIRouter(prefix="/notifications", tags=["Notifications"])
 
 @router.get("/", response_model=List[schemas.NotificationResponse])
-def get_notifications(
+async def get_notifications(
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Récupérer les notifications de l'utilisateur"""
-    notifications = NotificationService.get_user_notifications(
-        db, current_user.id, skip, limit
+    return await db.run_sync(
+        NotificationService.get_user_notifications, current_user.id, skip, limit
     )
 
-    return [{
-        "id": notif.id,
-        "title": notif.title,
-        "message": notif.message,
-        "type": notif.type,
-        "data": notif.data,
-        "is_read": notif.is_read,
-        "created_at": notif.created_at
-    } for notif in notifications]
-
 @router.get("/unread-count", response_model=Dict[str, int])
-def get_unread_notifications_count(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def get_unread_notifications_count(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Compter les notifications non lues"""
-    count = NotificationService.get_unread_notifications_count(db, current_user.id)
+    count = await db.run_sync(NotificationService.get_unread_notifications_count, current_user.id)
     return {"unread_count": count}
 
 @router.post("/mark-read/{notification_id}", response_model=Dict[str, str])
-def mark_notification_as_read(
+async def mark_notification_as_read(
     notification_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    broadcast: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Marquer une notification comme lue"""
-    success = NotificationService.mark_notification_as_read(
-        db, notification_id, current_user.id
+    success = await db.run_sync(
+        NotificationService.mark_notification_as_read, notification_id, current_user.id, broadcast
     )
 
     if not success:
@@ -59,23 +56,24 @@ def mark_notification_as_read(
     return {"message": "Notification marquée comme lue"}
 
 @router.post("/mark-all-read", response_model=Dict[str, str])
-def mark_all_notifications_as_read(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def mark_all_notifications_as_read(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Marquer toutes les notifications comme lues"""
-    count = NotificationService.mark_all_notifications_as_read(db, current_user.id)
+    count = await db.run_sync(NotificationService.mark_all_notifications_as_read, current_user.id)
     return {"message": f"{count} notifications marquées comme lues"}
 
 @router.delete("/{notification_id}", response_model=Dict[str, str])
-def delete_notification(
+async def delete_notification(
     notification_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    broadcast: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Supprimer une notification"""
-    success = NotificationService.delete_notification(
-        db, notification_id, current_user.id
+    success = await db.run_sync(
+        NotificationService.delete_notification, notification_id, current_user.id, broadcast
     )
 
     if not success:
@@ -86,13 +84,46 @@ def delete_notification(
 
     return {"message": "Notification supprimée avec succès"}
 
+# ============ APPAREILS ============
+
+@router.post("/devices", response_model=schemas.DeviceTokenResponse)
+async def register_device(
+    device: schemas.DeviceTokenRegister,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Enregistrer le jeton push de l'appareil courant (à rappeler à chaque ouverture de l'application)"""
+    return await db.run_sync(
+        NotificationService.register_device_token,
+        current_user.id,
+        device.token,
+        device.platform.value if device.platform else None
+    )
+
+@router.delete("/devices/{token}", response_model=Dict[str, str])
+async def unregister_device(
+    token: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    """Retirer le jeton push d'un appareil (déconnexion)"""
+    success = await db.run_sync(NotificationService.unregister_device_token, current_user.id, token)
+
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Appareil non trouvé"
+        )
+
+    return {"message": "Appareil retiré"}
+
 # ============ ADMIN NOTIFICATIONS ============
 
 @router.post("/admin/send/", response_model=Dict[str, str])
-def send_admin_notification(
+async def send_admin_notification(
     notification_data: schemas.NotificationCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Envoyer une notification à un utilisateur spécifique (admin seulement)"""
     if not current_user.is_admin:
@@ -101,8 +132,8 @@ def send_admin_notification(
             detail="Accès réservé aux administrateurs"
         )
 
-    notification = NotificationService.create_notification(
-        db,
+    notification = await db.run_sync(
+        NotificationService.create_notification,
         notification_data.user_id,
         notification_data.title,
         notification_data.message,
@@ -110,8 +141,9 @@ def send_admin_notification(
         notification_data.data
     )
 
-    # Envoyer également une notification push si possible
-    NotificationService.send_push_notification(
+    # Envoyer également une notification push (file d'envoi en tâche de fond)
+    await db.run_sync(
+        NotificationService.send_push_notification,
         notification_data.user_id,
         notification_data.title,
         notification_data.message,
@@ -121,10 +153,10 @@ def send_admin_notification(
     return {"message": "Notification envoyée avec succès"}
 
 @router.post("/admin/send-bulk/", response_model=Dict[str, str])
-def send_bulk_notifications(
+async def send_bulk_notifications(
     notification_data: schemas.BulkNotificationCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Envoyer des notifications à plusieurs utilisateurs (admin seulement)"""
     if not current_user.is_admin:
@@ -133,8 +165,8 @@ def send_bulk_notifications(
             detail="Accès réservé aux administrateurs"
         )
 
-    notifications = NotificationService.create_bulk_notifications(
-        db,
+    count = await db.run_sync(
+        NotificationService.create_bulk_notifications,
         notification_data.user_ids,
         notification_data.title,
         notification_data.message,
@@ -142,21 +174,22 @@ def send_bulk_notifications(
         notification_data.data
     )
 
-    # Envoyer également des notifications push
-    NotificationService.send_bulk_push_notifications(
+    # Envoyer également des notifications push (file d'envoi en tâche de fond)
+    await db.run_sync(
+        NotificationService.send_bulk_push_notifications,
         notification_data.user_ids,
         notification_data.title,
         notification_data.message,
         notification_data.data
     )
 
-    return {"message": f"{len(notifications)} notifications envoyées avec succès"}
+    return {"message": f"{count} notifications envoyées avec succès"}
 
 @router.post("/admin/send-all/", response_model=Dict[str, str])
-def send_notification_to_all_users(
+async def send_notification_to_all_users(
     notification_data: schemas.NotificationCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Envoyer une notification à tous les utilisateurs (admin seulement)"""
     if not current_user.is_admin:
@@ -165,30 +198,37 @@ def send_notification_to_all_users(
             detail="Accès réservé aux administrateurs"
         )
 
-    notifications = NotificationService.create_notification_for_all_users(
-        db,
+    # Une seule annonce, fusionnée à la lecture avec les notifications de chacun
+    await db.run_sync(
+        NotificationService.create_broadcast_notification,
         notification_data.title,
         notification_data.message,
         notification_data.type,
-        notification_data.data
+        notification_data.data,
+        current_user.id
     )
 
-    # Envoyer également des notifications push à tous les utilisateurs
-    # TODO: En production, récupérer tous les tokens de device et envoyer via Firebase
-    logger.info(f"Broadcast notification to all users: {notification_data.title}")
+    # Envoyer également des notifications push à tous les utilisateurs (lots de 500 jetons)
+    await db.run_sync(
+        NotificationService.send_bulk_push_notifications,
+        None,
+        notification_data.title,
+        notification_data.message,
+        notification_data.data
+    )
 
-    return {"message": f"{len(notifications)} notifications envoyées à tous les utilisateurs"}
+    return {"message": "Annonce diffusée à tous les utilisateurs"}
 
 # ============ SYSTEM NOTIFICATIONS ============
 
 @router.post("/system/test/", response_model=Dict[str, str])
-def send_test_notification(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+async def send_test_notification(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Envoyer une notification de test à l'utilisateur actuel"""
-    notification = NotificationService.create_notification(
-        db,
+    notification = await db.run_sync(
+        NotificationService.create_notification,
         current_user.id,
         "Notification de test",
         "Ceci est une notification de test pour vérifier le système de notifications.",
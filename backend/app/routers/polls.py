@@ -1,17 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
 from .. import models, schemas
 from ..database import get_db
 from ..auth import get_current_user
+from ..services.outbox import record_activity
 
 router = APIRouter(prefix="/polls", tags=["Sondages"])
 
 
+def poll_to_dict(poll: models.Poll, has_voted: bool) -> dict:
+    """Sérialise un sondage dont les options et l'auteur sont déjà chargés"""
+    options = [{"id": opt.id, "text": opt.text, "votes": opt.votes} for opt in poll.options]
+    return {
+        "id": poll.id,
+        "question": poll.question,
+        "options": options,
+        "total_votes": sum(opt["votes"] or 0 for opt in options),
+        "has_voted": has_voted,
+        "author_id": poll.author_id,
+        "author_name": f"{poll.author.first_name} {poll.author.last_name}" if poll.author else "Inconnu",
+        "created_at": poll.created_at
+    }
+
+
 def calculate_total_votes(db: Session, poll_id: int) -> int:
-    return db.query(models.PollOption).filter(
+    return db.query(func.sum(models.PollOption.votes)).filter(
         models.PollOption.poll_id == poll_id
-    ).sum(models.PollOption.votes) or 0
+    ).scalar() or 0
 
 
 @router.get("/", response_model=List[schemas.PollResponse])
@@ -22,38 +39,19 @@ def get_polls(
     current_user: models.User = Depends(get_current_user)
 ):
     """Liste de tous les sondages"""
-    polls = db.query(models.Poll).order_by(
+    polls = db.query(models.Poll).options(
+        joinedload(models.Poll.author), selectinload(models.Poll.options)
+    ).order_by(
         models.Poll.created_at.desc()
     ).offset(skip).limit(limit).all()
 
-    result = []
-    for poll in polls:
-        # Vérifier si l'utilisateur a déjà voted
-        has_voted = db.query(models.PollVote).filter(
-            models.PollVote.poll_id == poll.id,
-            models.PollVote.user_id == current_user.id
-        ).first() is not None
-
-        options = []
-        for opt in poll.options:
-            options.append({
-                "id": opt.id,
-                "text": opt.text,
-                "votes": opt.votes
-            })
-
-        result.append({
-            "id": poll.id,
-            "question": poll.question,
-            "options": options,
-            "total_votes": calculate_total_votes(db, poll.id),
-            "has_voted": has_voted,
-            "author_id": poll.author_id,
-            "author_name": f"{poll.author.first_name} {poll.author.last_name}" if poll.author else "Inconnu",
-            "created_at": poll.created_at
-        })
+    # Sondages auxquels l'utilisateur a déjà voté (une seule requête)
+    voted_ids = {poll_id for (poll_id,) in db.query(models.PollVote.poll_id).filter(
+        models.PollVote.poll_id.in_([poll.id for poll in polls]),
+        models.PollVote.user_id == current_user.id
+    ).all()} if polls else set()
 
-    return result
+    return [poll_to_dict(poll, poll.id in voted_ids) for poll in polls]
 
 
 @router.post("/", response_model=schemas.PollResponse)
@@ -148,6 +146,7 @@ def vote_poll(
 
     # Incrémenter le compteur de l'option
     option.votes += 1
+    record_activity(db, "poll.voted", "poll", poll_id, poll.author_id, current_user)
 
     db.commit()
     db.refresh(poll)
@@ -1,136 +1,164 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 from typing import List
 from .. import models, schemas
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db
+from ..auth import get_current_user_async
+from ..services.outbox import record_activity
+from ..services.images import variants_for, settle_variants
 
 router = APIRouter(prefix="/posts", tags=["Publications"])
 
 
-def get_post_with_details(db: Session, post_id: int, current_user_id: int = None):
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
-        return None
+async def build_post_responses(db: AsyncSession, posts: List[models.Post], current_user_id: int = None):
+    """Ajoute compteurs et état "liké" à une liste de posts (requêtes groupées)"""
+    post_ids = [post.id for post in posts]
+    if not post_ids:
+        return []
+
+    # Compter les likes et comments
+    likes_counts = dict((await db.execute(
+        select(models.Like.post_id, func.count(models.Like.id)).filter(
+            models.Like.post_id.in_(post_ids)
+        ).group_by(models.Like.post_id)
+    )).all())
+    comments_counts = dict((await db.execute(
+        select(models.Comment.post_id, func.count(models.Comment.id)).filter(
+            models.Comment.post_id.in_(post_ids)
+        ).group_by(models.Comment.post_id)
+    )).all())
 
     # Vérifier si l'utilisateur actuel a liké
-    is_liked = False
+    liked_ids = set()
     if current_user_id:
-        like = db.query(models.Like).filter(
-            models.Like.post_id == post_id,
-            models.Like.user_id == current_user_id
-        ).first()
-        is_liked = like is not None
+        liked_ids = set((await db.execute(
+            select(models.Like.post_id).filter(
+                models.Like.post_id.in_(post_ids),
+                models.Like.user_id == current_user_id
+            )
+        )).scalars().all())
 
-    # Compter les likes et comments
-    likes_count = db.query(models.Like).filter(models.Like.post_id == post_id).count()
-    comments_count = db.query(models.Comment).filter(models.Comment.post_id == post_id).count()
+    result = []
+    for post in posts:
+        post_data = schemas.PostResponse.model_validate(post)
+        post_data.likes_count = likes_counts.get(post.id, 0)
+        post_data.comments_count = comments_counts.get(post.id, 0)
+        post_data.is_liked_by_me = post.id in liked_ids
+        result.append(post_data)
+    return result
 
-    post_data = schemas.PostResponse.model_validate(post)
-    post_data.likes_count = likes_count
-    post_data.comments_count = comments_count
-    post_data.is_liked_by_me = is_liked
-    return post_data
+
+async def get_post_with_details(db: AsyncSession, post_id: int, current_user_id: int = None):
+    post = (await db.execute(
+        select(models.Post).options(joinedload(models.Post.author)).filter(models.Post.id == post_id)
+    )).scalars().first()
+    if not post:
+        return None
+    return (await build_post_responses(db, [post], current_user_id))[0]
+
+
+async def get_post_or_404(db: AsyncSession, post_id: int) -> models.Post:
+    post = await db.get(models.Post, post_id)
+    if not post:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Post non trouvé"
+        )
+    return post
 
 
 @router.get("/", response_model=List[schemas.PostResponse])
-def get_posts(
+async def get_posts(
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Récupérer le fil d'actualité (tous les posts)"""
-    posts = db.query(models.Post).order_by(
-        models.Post.created_at.desc()
-    ).offset(skip).limit(limit).all()
+    posts = (await db.execute(
+        select(models.Post).options(joinedload(models.Post.author)).order_by(
+            models.Post.created_at.desc()
+        ).offset(skip).limit(limit)
+    )).scalars().all()
 
-    result = []
-    for post in posts:
-        post_data = get_post_with_details(db, post.id, current_user.id)
-        result.append(post_data)
-    return result
+    return await build_post_responses(db, posts, current_user.id)
 
 
 @router.get("/user/{user_id}/", response_model=List[schemas.PostResponse])
-def get_user_posts(
+async def get_user_posts(
     user_id: int,
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Posts d'un utilisateur spécifique"""
-    posts = db.query(models.Post).filter(
-        models.Post.author_id == user_id
-    ).order_by(models.Post.created_at.desc()).offset(skip).limit(limit).all()
+    posts = (await db.execute(
+        select(models.Post).options(joinedload(models.Post.author)).filter(
+            models.Post.author_id == user_id
+        ).order_by(models.Post.created_at.desc()).offset(skip).limit(limit)
+    )).scalars().all()
 
-    result = []
-    for post in posts:
-        post_data = get_post_with_details(db, post.id, current_user.id)
-        result.append(post_data)
-    return result
+    return await build_post_responses(db, posts, current_user.id)
 
 
 @router.get("/{post_id}", response_model=schemas.PostWithComments)
-def get_post_details(
+async def get_post_details(
     post_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Détails d'un post avec tous les commentaires"""
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
+    post_data = await get_post_with_details(db, post_id, current_user.id)
+    if not post_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Post non trouvé"
         )
 
-    post_data = get_post_with_details(db, post_id, current_user.id)
-
     # Récupérer les commentaires
-    comments = db.query(models.Comment).filter(
-        models.Comment.post_id == post_id
-    ).order_by(models.Comment.created_at.asc()).all()
-
-    post_data.comments = [
-        schemas.CommentResponse.model_validate(c) for c in comments
-    ]
-    return post_data
+    comments = (await db.execute(
+        select(models.Comment).options(joinedload(models.Comment.author)).filter(
+            models.Comment.post_id == post_id
+        ).order_by(models.Comment.created_at.asc())
+    )).scalars().all()
+
+    return schemas.PostWithComments(
+        **dict(post_data),
+        comments=[schemas.CommentResponse.model_validate(c) for c in comments]
+    )
 
 
 @router.post("/", response_model=schemas.PostResponse)
-def create_post(
+async def create_post(
     post_data: schemas.PostCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Créer une nouvelle publication"""
     post = models.Post(
         content=post_data.content,
         image_url=post_data.image_url,
-        author_id=current_user.id
+        image_variants=await variants_for(db, post_data.image_url),
+        author=current_user
     )
     db.add(post)
-    db.commit()
-    db.refresh(post)
+    await db.commit()
+    await settle_variants(db, post)
 
-    return get_post_with_details(db, post.id, current_user.id)
+    return (await build_post_responses(db, [post], current_user.id))[0]
 
 
 @router.delete("/{post_id}")
-def delete_post(
+async def delete_post(
     post_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Supprimer une de ses publications"""
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post non trouvé"
-        )
+    post = await get_post_or_404(db, post_id)
 
     if post.author_id != current_user.id:
         raise HTTPException(
@@ -138,27 +166,22 @@ def delete_post(
             detail="Vous ne pouvez pas supprimer ce post"
         )
 
-    db.delete(post)
-    db.commit()
+    await db.delete(post)
+    await db.commit()
     return {"message": "Post supprimé avec succès"}
 
 
 # ============ PUT Post ============
 
 @router.put("/{post_id}", response_model=schemas.PostResponse)
-def update_post(
+async def update_post(
     post_id: int,
     post_data: schemas.PostCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Modifier une de ses publications"""
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post non trouvé"
-        )
+    post = await get_post_or_404(db, post_id)
 
     if post.author_id != current_user.id:
         raise HTTPException(
@@ -167,34 +190,35 @@ def update_post(
         )
 
     post.content = post_data.content
-    post.image_url = post_data.image_url
-    db.commit()
-    db.refresh(post)
+    image_changed = post_data.image_url != post.image_url
+    if image_changed:
+        post.image_url = post_data.image_url
+        post.image_variants = await variants_for(db, post_data.image_url)
+    await db.commit()
+    if image_changed:
+        await settle_variants(db, post)
 
-    return get_post_with_details(db, post.id, current_user.id)
+    return await get_post_with_details(db, post.id, current_user.id)
 
 
 # ============ Likes ============
 
 @router.post("/{post_id}/like", response_model=schemas.LikeResponse)
-def like_post(
+async def like_post(
     post_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Liker un post"""
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post non trouvé"
-        )
+    post = await get_post_or_404(db, post_id)
 
     # Vérifier si déjà liké
-    existing_like = db.query(models.Like).filter(
-        models.Like.post_id == post_id,
-        models.Like.user_id == current_user.id
-    ).first()
+    existing_like = (await db.execute(
+        select(models.Like.id).filter(
+            models.Like.post_id == post_id,
+            models.Like.user_id == current_user.id
+        )
+    )).first()
 
     if existing_like:
         raise HTTPException(
@@ -204,22 +228,24 @@ def like_post(
 
     like = models.Like(post_id=post_id, user_id=current_user.id)
     db.add(like)
-    db.commit()
-    db.refresh(like)
+    record_activity(db, "post.liked", "post", post_id, post.author_id, current_user)
+    await db.commit()
     return schemas.LikeResponse.model_validate(like)
 
 
 @router.delete("/{post_id}/like")
-def unlike_post(
+async def unlike_post(
     post_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Retirer son like d'un post"""
-    like = db.query(models.Like).filter(
-        models.Like.post_id == post_id,
-        models.Like.user_id == current_user.id
-    ).first()
+    like = (await db.execute(
+        select(models.Like).filter(
+            models.Like.post_id == post_id,
+            models.Like.user_id == current_user.id
+        )
+    )).scalars().first()
 
     if not like:
         raise HTTPException(
@@ -227,58 +253,60 @@ def unlike_post(
             detail="Like non trouvé"
         )
 
-    db.delete(like)
-    db.commit()
+    await db.delete(like)
+    await db.commit()
     return {"message": "Like retiré"}
 
 
 # ============ Comments ============
 
+async def get_comment_or_404(db: AsyncSession, post_id: int, comment_id: int) -> models.Comment:
+    comment = (await db.execute(
+        select(models.Comment).options(joinedload(models.Comment.author)).filter(
+            models.Comment.id == comment_id,
+            models.Comment.post_id == post_id
+        )
+    )).scalars().first()
+
+    if not comment:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Commentaire non trouvé"
+        )
+    return comment
+
+
 @router.post("/{post_id}/comments", response_model=schemas.CommentResponse)
-def create_comment(
+async def create_comment(
     post_id: int,
     comment_data: schemas.CommentCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Commenter un post"""
-    post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if not post:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Post non trouvé"
-        )
+    post = await get_post_or_404(db, post_id)
 
     comment = models.Comment(
         content=comment_data.content,
         post_id=post_id,
-        author_id=current_user.id
+        author=current_user
     )
     db.add(comment)
-    db.commit()
-    db.refresh(comment)
+    record_activity(db, "post.commented", "post", post_id, post.author_id, current_user)
+    await db.commit()
 
     return schemas.CommentResponse.model_validate(comment)
 
 
 @router.delete("/{post_id}/comments/{comment_id}")
-def delete_comment(
+async def delete_comment(
     post_id: int,
     comment_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Supprimer un de ses commentaires"""
-    comment = db.query(models.Comment).filter(
-        models.Comment.id == comment_id,
-        models.Comment.post_id == post_id
-    ).first()
-
-    if not comment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Commentaire non trouvé"
-        )
+    comment = await get_comment_or_404(db, post_id, comment_id)
 
     if comment.author_id != current_user.id:
         raise HTTPException(
@@ -286,32 +314,23 @@ def delete_comment(
             detail="Vous ne pouvez pas supprimer ce commentaire"
         )
 
-    db.delete(comment)
-    db.commit()
+    await db.delete(comment)
+    await db.commit()
     return {"message": "Commentaire supprimé"}
 
 
 # ============ PUT Comment ============
 
 @router.put("/{post_id}/comments/{comment_id}", response_model=schemas.CommentResponse)
-def update_comment(
+async def update_comment(
     post_id: int,
     comment_id: int,
     comment_data: schemas.CommentCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     """Modifier un de ses commentaires"""
-    comment = db.query(models.Comment).filter(
-        models.Comment.id == comment_id,
-        models.Comment.post_id == post_id
-    ).first()
-
-    if not comment:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Commentaire non trouvé"
-        )
+    comment = await get_comment_or_404(db, post_id, comment_id)
 
     if comment.author_id != current_user.id:
         raise HTTPException(
@@ -320,7 +339,6 @@ def update_comment(
         )
 
     comment.content = comment_data.content
-    db.commit()
-    db.refresh(comment)
+    await db.commit()
 
     return schemas.CommentResponse.model_validate(comment)
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import List
 from .. import models, schemas
 from ..database import get_db
@@ -17,7 +17,7 @@ def get_my_protocols(
     current_user: models.User = Depends(get_current_user)
 ):
     """Récupérer mes protocoles de santé (personnels ou publics)"""
-    query = db.query(models.HealthProtocol).filter(
+    query = db.query(models.HealthProtocol).options(joinedload(models.HealthProtocol.author)).filter(
         (models.HealthProtocol.author_id == current_user.id) |
         (models.HealthProtocol.is_public == True)
     )
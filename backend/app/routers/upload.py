@@ -1,14 +1,18 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, status, Depends
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+import aiofiles
+import aiofiles.os
+import hashlib
 import uuid
 import os
 from datetime import datetime
-from typing import Optional
+from typing import AsyncGenerator, Callable, NamedTuple, Optional
 from .. import models
 from ..database import get_db
 from ..auth import get_current_user
-
-router = APIRouter(prefix="/upload", tags=["Upload"])
+from ..services.images import image_pipeline
 
 # Configuration du dossier de stockage
 UPLOAD_DIR = "uploads"
@@ -17,6 +21,60 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # Extensions autorisées
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+# Taille des morceaux lus et écrits: jamais le fichier entier en mémoire
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Marge du corps multipart (délimiteurs, en-têtes des parties) au-delà de MAX_FILE_SIZE
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# Corps de requête trop grand (constante de statut renommée selon les versions de Starlette)
+HTTP_413_CONTENT_TOO_LARGE = 413
+
+
+def too_large(status_code: int = status.HTTP_400_BAD_REQUEST) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=f"Fichier trop volumineux. Taille maximale: {MAX_FILE_SIZE // 1024 // 1024} MB"
+    )
+
+
+class SizeLimitedRequest(Request):
+    """Requête dont le corps est compté pendant la lecture: l'analyse du formulaire s'arrête dès la limite"""
+
+    async def stream(self) -> AsyncGenerator[bytes, None]:
+        received = 0
+        async for chunk in super().stream():
+            received += len(chunk)
+            if received > MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD:
+                raise too_large(HTTP_413_CONTENT_TOO_LARGE)
+            yield chunk
+
+
+class UploadRoute(APIRoute):
+    """Routes d'upload: refus sur Content-Length avant toute lecture, puis corps borné pendant la lecture.
+
+    FastAPI lit tout le formulaire (UploadFile) avant d'appeler la route: sans
+    ces contrôles, un envoi trop gros serait entièrement reçu avant le refus.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            content_length = request.headers.get("content-length")
+            if content_length and content_length.isdigit() and \
+                    int(content_length) > MAX_FILE_SIZE + UPLOAD_FORM_OVERHEAD:
+                raise too_large(HTTP_413_CONTENT_TOO_LARGE)
+            return await handler(SizeLimitedRequest(request.scope, request.receive))
+
+        return limited_handler
+
+
+router = APIRouter(prefix="/upload", tags=["Upload"], route_class=UploadRoute)
+
+
+class StoredFile(NamedTuple):
+    path: str  # chemin relatif pour l'API ("/posts/<nom>")
+    size: int
+    sha256: str
 
 
 def get_file_extension(filename: str) -> str:
@@ -25,49 +83,72 @@ def get_file_extension(filename: str) -> str:
 
 
 def validate_file(file: UploadFile):
-    """Valide le fichier uploadé"""
+    """Valide le fichier uploadé (extension; la taille est contrôlée pendant l'écriture)"""
     # Vérifier l'extension
-    extension = get_file_extension(file.filename)
+    extension = get_file_extension(file.filename or "")
     if extension not in ALLOWED_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Extension non autorisée. Extensions autorisées: {', '.join(ALLOWED_EXTENSIONS)}"
         )
 
-    # Vérifier la taille
-    file.file.seek(0, os.SEEK_END)
-    size = file.file.tell()
-    file.file.seek(0)
-    
-    if size > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Fichier trop volumineux. Taille maximale: {MAX_FILE_SIZE // 1024 // 1024} MB"
-        )
-    
-    # Remettre le curseur au début pour la lecture
-    file.file.seek(0)
 
+async def store_file(file: UploadFile, folder: str = "images") -> StoredFile:
+    """Écrit le fichier par morceaux, avec contrôle de taille et empreinte SHA-256 au fil de l'eau.
 
-async def save_file(file: UploadFile, folder: str = "images") -> str:
-    """Sauvegarde le fichier et retourne le chemin relatif"""
+    L'écriture se fait dans un fichier temporaire du dossier cible, renommé
+    atomiquement une fois complet: un fichier visible est toujours entier.
+    """
     # Générer un nom de fichier unique
     extension = get_file_extension(file.filename)
     filename = f"{uuid.uuid4().hex}{extension}"
-    
+
     # Créer le dossier si nécessaire
     folder_path = os.path.join(UPLOAD_DIR, folder)
-    os.makedirs(folder_path, exist_ok=True)
-    
-    # Sauvegarder le fichier
+    await aiofiles.os.makedirs(folder_path, exist_ok=True)
+
     file_path = os.path.join(folder_path, filename)
-    with open(file_path, "wb") as buffer:
-        # Lire le contenu du fichier
-        content = await file.read()
-        buffer.write(content)
-    
-    # Retourner le chemin relatif pour l'API
-    return f"/{folder}/{filename}"
+    temp_path = os.path.join(folder_path, f".{filename}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_FILE_SIZE:
+                    raise too_large()
+                digest.update(chunk)
+                await buffer.write(chunk)
+        await aiofiles.os.replace(temp_path, file_path)
+    except BaseException:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+
+    # Chemin relatif pour l'API
+    return StoredFile(f"/{folder}/{filename}", size, digest.hexdigest())
+
+
+async def save_file(file: UploadFile, folder: str = "images") -> str:
+    """Sauvegarde le fichier et retourne le chemin relatif"""
+    return (await store_file(file, folder)).path
+
+
+def register_image(db: Session, stored: StoredFile, avatar_owner: Optional[models.User] = None):
+    """Déclare l'image (et l'avatar de `avatar_owner`) puis valide; Session synchrone: à appeler via le threadpool"""
+    if avatar_owner is not None:
+        # Variantes remplies à la fin du traitement
+        avatar_owner.avatar_url = stored.path
+        avatar_owner.avatar_variants = None
+    image_pipeline.register(db, stored.path)
+    db.commit()
+    if avatar_owner is not None:
+        db.refresh(avatar_owner)
+
+
+def process_variants(stored: StoredFile):
+    """Variantes (miniature, moyenne, pleine) produites en tâche de fond; l'image doit être déclarée et commitée"""
+    image_pipeline.submit(stored.path, os.path.join(UPLOAD_DIR, stored.path.lstrip("/")))
 
 
 @router.post("/image", status_code=status.HTTP_201_CREATED)
@@ -86,17 +167,23 @@ async def upload_image(
         validate_file(file)
         
         # Sauvegarder le fichier
-        image_path = await save_file(file, "posts")
+        stored = await store_file(file, "posts")
         
-        # Créer une entrée dans la base de données (optionnel)
-        # Vous pouvez créer un modèle Image si nécessaire
+        # Déclarer l'image; les variantes seront recopiées sur la publication
+        await run_in_threadpool(register_image, db, stored)
+        process_variants(stored)
         
         return {
             "filename": file.filename,
-            "image_url": image_path,
+            "image_url": stored.path,
+            "size": stored.size,
+            "sha256": stored.sha256,
+            "variants_status": "pending",
             "message": "Image uploadée avec succès"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -120,19 +207,23 @@ async def upload_avatar(
         validate_file(file)
         
         # Sauvegarder le fichier
-        avatar_path = await save_file(file, "avatars")
+        stored = await store_file(file, "avatars")
         
         # Mettre à jour l'avatar de l'utilisateur
-        current_user.avatar_url = avatar_path
-        db.commit()
-        db.refresh(current_user)
+        await run_in_threadpool(register_image, db, stored, current_user)
+        process_variants(stored)
         
         return {
             "filename": file.filename,
-            "avatar_url": avatar_path,
+            "avatar_url": stored.path,
+            "size": stored.size,
+            "sha256": stored.sha256,
+            "variants_status": "pending",
             "message": "Avatar mis à jour avec succès"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -156,14 +247,22 @@ async def upload_event_image(
         validate_file(file)
         
         # Sauvegarder le fichier
-        image_path = await save_file(file, "events")
+        stored = await store_file(file, "events")
+        
+        await run_in_threadpool(register_image, db, stored)
+        process_variants(stored)
         
         return {
             "filename": file.filename,
-            "image_url": image_path,
+            "image_url": stored.path,
+            "size": stored.size,
+            "sha256": stored.sha256,
+            "variants_status": "pending",
             "message": "Image d'événement uploadée avec succès"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
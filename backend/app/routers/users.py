@@ -4,6 +4,7 @@ from typing import List
 from .. import models, schemas
 from ..database import get_db
 from ..auth import get_current_user
+from ..services.images import ready_variants_query, settle_variants_sync
 
 router = APIRouter(prefix="/users", tags=["Utilisateurs"])
 
@@ -76,9 +77,17 @@ def update_current_user(
 ):
     """Modifier son propre profil"""
     update_data = user_update.model_dump(exclude_unset=True)
+    if "avatar_url" in update_data and update_data["avatar_url"] != current_user.avatar_url:
+        # Variantes déjà produites pour cette image (sinon remplies à la fin du traitement)
+        update_data["avatar_variants"] = db.execute(
+            ready_variants_query(update_data["avatar_url"])
+        ).scalar() if update_data["avatar_url"] else None
     for field, value in update_data.items():
         setattr(current_user, field, value)
     db.commit()
+    if "avatar_variants" in update_data:
+        # Image traitée entre la lecture ci-dessus et le commit
+        settle_variants_sync(db, current_user, "avatar_url", "avatar_variants")
     db.refresh(current_user)
     return schemas.UserResponse.model_validate(current_user)
 
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from enum import Enum
 
 # ============ User Schemas ============
@@ -36,6 +36,8 @@ class UserResponse(UserBase):
     unique_id: str  # Identifiant unique SP-XXXXX
     bio: Optional[str] = None
     avatar_url: Optional[str] = None
+    # {"thumbnail"|"medium"|"full": {"webp", "jpeg", "width", "height"}}, absent tant que l'image est en traitement
+    avatar_variants: Optional[Dict[str, Dict[str, Any]]] = None
     professional_id: Optional[str] = None
     device_token: Optional[str] = None  # OneSignal device token
     is_active: bool
@@ -95,6 +97,7 @@ class PostCreate(PostBase):
 class PostResponse(PostBase):
     id: int
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, Any]]] = None
     author_id: int
     author: UserResponse
     created_at: datetime
@@ -138,6 +141,10 @@ class LikeResponse(BaseModel):
     user_id: int
     created_at: datetime
 
+    model_config = {
+        "from_attributes": True
+    }
+
 
 # ============ Follow Schemas ============
 
@@ -149,6 +156,10 @@ class FollowResponse(BaseModel):
     follower: UserResponse
     following: UserResponse
 
+    model_config = {
+        "from_attributes": True
+    }
+
 
 class FollowRequest(BaseModel):
     user_id: int
@@ -361,6 +372,7 @@ class EventResponse(BaseModel):
     organizer: str
     max_participants: Optional[int] = None
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, Any]]] = None
     author_id: int
     author_name: str
     registered_count: int = 0
@@ -391,6 +403,17 @@ class MessageCreate(BaseModel):
     receiver_id: int
 
 
+class MessageBatchCreate(BaseModel):
+    content: str
+    receiver_ids: List[int] = []
+    district: Optional[str] = None
+
+
+class MessageBatchResponse(BaseModel):
+    sent_count: int
+    receiver_ids: List[int]
+
+
 class MessageResponse(BaseModel):
     id: int
     content: str
@@ -406,6 +429,15 @@ class MessageResponse(BaseModel):
     }
 
 
+class MessageSearchResult(BaseModel):
+    id: int
+    conversation_id: Optional[int] = None
+    sender_id: int
+    receiver_id: int
+    snippet: str
+    created_at: datetime
+
+
 class ConversationResponse(BaseModel):
     id: int
     user1_id: int
@@ -413,6 +445,7 @@ class ConversationResponse(BaseModel):
     user1: UserResponse
     user2: UserResponse
     last_message: Optional[MessageResponse] = None
+    unread_count: int = 0
     updated_at: datetime
 
     model_config = {
@@ -422,9 +455,34 @@ class ConversationResponse(BaseModel):
 
 class ConversationWithMessages(ConversationResponse):
     messages: List[MessageResponse] = []
+    # Curseur de la page suivante (messages plus anciens), None en fin d'historique
+    next_cursor: Optional[int] = None
 
 # ============ Notification Schemas ============
 
+class DevicePlatform(str, Enum):
+    android = "android"
+    ios = "ios"
+    web = "web"
+
+
+class DeviceTokenRegister(BaseModel):
+    token: str = Field(..., min_length=1, max_length=255)
+    platform: Optional[DevicePlatform] = None
+
+
+class DeviceTokenResponse(BaseModel):
+    id: int
+    token: str
+    platform: Optional[str] = None
+    created_at: datetime
+    last_seen_at: datetime
+
+    model_config = {
+        "from_attributes": True
+    }
+
+
 class NotificationType(str, Enum):
     info = "info"
     success = "success"
@@ -461,6 +519,9 @@ class NotificationResponse(BaseModel):
     type: str
     data: Dict[str, Any] = {}
     is_read: bool
+    # Annonce générale: marquer comme lue / supprimer avec ?broadcast=true
+    is_broadcast: bool = False
+    actor_count: int = 1
     created_at: datetime
 
     model_config = {
@@ -0,0 +1,53 @@
+"""
+Consommateurs de l'outbox des actions sociales (services/outbox.py).
+
+Chaque événement porte l'agrégat visé (publication, utilisateur, événement,
+sondage) et un payload {"owner_id", "actor_id", "actor_name"}: le
+propriétaire de l'agrégat est notifié (notification regroupée par type et
+cible) et reçoit un frame "activity" sur ses connexions WebSocket.
+"""
+from sqlalchemy.orm import Session
+
+from .notifications import NotificationService
+from .outbox import outbox_dispatcher
+from .realtime import hub
+
+# Événement -> type de notification regroupée
+ACTIVITY_NOTIFICATIONS = {
+    "post.liked": "like",
+    "post.commented": "comment",
+    "user.followed": "follow",
+    "event.registered": "registration",
+    "poll.voted": "vote",
+}
+
+
+@outbox_dispatcher.consumer("notifications", events=ACTIVITY_NOTIFICATIONS)
+def notify_owner(db: Session, event: dict):
+    payload = event["payload"]
+    if payload.get("owner_id") is None:
+        return
+    NotificationService.create_aggregated_notification(
+        db,
+        payload["owner_id"],
+        ACTIVITY_NOTIFICATIONS[event["event_type"]],
+        event["aggregate_type"],
+        event["aggregate_id"],
+        payload["actor_id"],
+        payload["actor_name"]
+    )
+
+
+@outbox_dispatcher.consumer("realtime", events=ACTIVITY_NOTIFICATIONS)
+async def publish_activity(event: dict):
+    payload = event["payload"]
+    if payload.get("owner_id") is None or payload["owner_id"] == payload.get("actor_id"):
+        return
+    await hub.publish(payload["owner_id"], {
+        "type": "activity",
+        "event": event["event_type"],
+        "target_type": event["aggregate_type"],
+        "target_id": event["aggregate_id"],
+        "actor_id": payload["actor_id"],
+        "actor_name": payload["actor_name"],
+    })
@@ -0,0 +1,144 @@
+"""
+Diffusion temps réel entre workers (pub/sub).
+
+Le hub WebSocket (services/realtime.py) ne connaît que les connexions de son
+propre processus. Chaque trame destinée à un utilisateur est publiée sur le
+canal de cet utilisateur; chaque worker est abonné aux canaux des utilisateurs
+qui y sont connectés et livre localement ce qu'il reçoit.
+
+Backends:
+- InProcessBroker: un seul processus (développement, tests, worker unique).
+- RedisBroker: tout serveur parlant le protocole Redis (Redis, Valkey...),
+  activé par REALTIME_BROKER_URL=redis://hote:6379/0 (dépendance `redis`).
+"""
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional, Set
+
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+REALTIME_BROKER_URL = os.getenv("REALTIME_BROKER_URL", "")
+REALTIME_CHANNEL_PREFIX = os.getenv("REALTIME_CHANNEL_PREFIX", "sante_poro:ws")
+
+Handler = Callable[[int, dict], Awaitable[None]]
+
+broker_published = registry.counter("realtime_broker_published_total", "Trames publiées sur le broker")
+broker_received = registry.counter("realtime_broker_received_total", "Trames reçues du broker")
+
+
+class Broker(ABC):
+    """Interface commune: abonnement par utilisateur, publication, livraison via `handler`"""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+        self.subscriptions: Set[int] = set()
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def close(self):
+        self.subscriptions.clear()
+
+    async def subscribe(self, user_id: int):
+        self.subscriptions.add(user_id)
+
+    async def unsubscribe(self, user_id: int):
+        self.subscriptions.discard(user_id)
+
+    @abstractmethod
+    async def publish(self, user_id: int, payload: dict):
+        """Diffuse la trame aux connexions de l'utilisateur, sur tous les workers"""
+
+    async def _deliver(self, user_id: int, payload: dict):
+        broker_received.inc()
+        if self.handler is not None and user_id in self.subscriptions:
+            await self.handler(user_id, payload)
+
+
+class InProcessBroker(Broker):
+    """Livraison directe dans le processus courant"""
+
+    async def publish(self, user_id: int, payload: dict):
+        broker_published.inc()
+        await self._deliver(user_id, payload)
+
+
+class RedisBroker(Broker):
+    """Pub/sub sur un serveur Redis: un canal par utilisateur"""
+
+    def __init__(self, url: str, channel_prefix: str = REALTIME_CHANNEL_PREFIX):
+        super().__init__()
+        self.url = url
+        self.channel_prefix = channel_prefix
+        self._client = None
+        self._pubsub = None
+        self._reader = None
+
+    def channel(self, user_id: int) -> str:
+        return f"{self.channel_prefix}:user:{user_id}"
+
+    def user_id(self, channel) -> int:
+        if isinstance(channel, bytes):
+            channel = channel.decode()
+        return int(channel.rsplit(":", 1)[1])
+
+    async def start(self, handler: Handler):
+        # Import paresseux: dépendance optionnelle
+        import redis.asyncio as redis
+
+        await super().start(handler)
+        self._client = redis.from_url(self.url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await super().close()
+
+    async def subscribe(self, user_id: int):
+        if user_id not in self.subscriptions:
+            await super().subscribe(user_id)
+            await self._pubsub.subscribe(self.channel(user_id))
+
+    async def unsubscribe(self, user_id: int):
+        if user_id in self.subscriptions:
+            await super().unsubscribe(user_id)
+            await self._pubsub.unsubscribe(self.channel(user_id))
+
+    async def publish(self, user_id: int, payload: dict):
+        broker_published.inc()
+        await self._client.publish(self.channel(user_id), json.dumps(payload, default=str))
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                await self._deliver(self.user_id(message["channel"]), json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lecture du broker temps réel interrompue: {e}")
+                await asyncio.sleep(1.0)
+
+
+def make_broker(url: str = None) -> Broker:
+    """Broker selon REALTIME_BROKER_URL (aucune connexion avant `start`)"""
+    url = REALTIME_BROKER_URL if url is None else url
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBroker(url)
+    return InProcessBroker()
@@ -0,0 +1,273 @@
+"""
+Persistance des messages envoyés par WebSocket (écriture différée).
+
+- Le frame {"type": "message"} est acquitté immédiatement à l'expéditeur
+  ({"type": "message_ack"}) puis placé dans une file bornée.
+- Une tâche unique vide la file toutes les CHAT_FLUSH_INTERVAL_MS
+  millisecondes: conversations manquantes, messages et `last_message_id`
+  sont écrits en requêtes multi-lignes, dans une seule transaction.
+- Après validation, le message (avec son identifiant) est publié au
+  destinataire, et l'expéditeur reçoit {"type": "message_saved"}.
+- Un lot refusé par la base est réécrit message par message: seuls les
+  messages fautifs sont perdus, et leur expéditeur reçoit
+  {"type": "message_error"}.
+- À la (re)connexion, les messages en attente sont livrés: ceux postérieurs
+  à `since` (dernier identifiant reçu par le client), sinon les non-lus.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import select, insert, update, tuple_
+
+from .. import models
+from ..database import AsyncSessionLocal
+from ..metrics import registry
+from .realtime import Connection, ConnectionHub, hub
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+CHAT_FLUSH_INTERVAL_MS = float(os.getenv("CHAT_FLUSH_INTERVAL_MS", "5"))
+CHAT_WRITE_BATCH_MAX = int(os.getenv("CHAT_WRITE_BATCH_MAX", "500"))
+# Nombre maximal de messages livrés à la reconnexion
+CHAT_PENDING_DELIVERY_MAX = int(os.getenv("CHAT_PENDING_DELIVERY_MAX", "200"))
+
+chat_queue_depth = registry.gauge("chat_write_queue_depth", "Messages WebSocket en attente d'écriture")
+chat_persisted = registry.counter("chat_messages_persisted_total", "Messages WebSocket enregistrés")
+chat_batch_size = registry.summary("chat_write_batch_size", "Messages écrits par transaction")
+chat_write_failures = registry.counter("chat_write_failures_total", "Messages WebSocket perdus (échec d'écriture)")
+
+
+def message_frame(message) -> dict:
+    """Frame "new_message" d'un message enregistré (ligne ORM ou résultat RETURNING)"""
+    return {
+        "type": "new_message",
+        "data": {
+            "id": message.id,
+            "conversation_id": message.conversation_id,
+            "sender_id": message.sender_id,
+            "receiver_id": message.receiver_id,
+            "content": message.content,
+            "created_at": message.created_at,
+        },
+    }
+
+
+class PendingMessage:
+    """Message acquitté, pas encore écrit"""
+
+    __slots__ = ("sender_id", "receiver_id", "content", "client_id", "created_at")
+
+    def __init__(self, sender_id: int, receiver_id: int, content: str, client_id=None):
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+        self.content = content
+        self.client_id = client_id
+        self.created_at = datetime.utcnow()
+
+
+class MessageWriteBehind:
+    """File bornée de messages WebSocket, écrite par lots"""
+
+    def __init__(self, session_factory=None, realtime_hub: ConnectionHub = None, queue_size: int = None,
+                 flush_interval_ms: float = None, batch_max: int = None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.hub = realtime_hub or hub
+        self.queue_size = queue_size or CHAT_WRITE_QUEUE_SIZE
+        self.flush_interval = (CHAT_FLUSH_INTERVAL_MS if flush_interval_ms is None else flush_interval_ms) / 1000
+        self.batch_max = batch_max or CHAT_WRITE_BATCH_MAX
+        self.queue: Optional[asyncio.Queue] = None
+        self._task = None
+
+    # ============ CYCLE DE VIE ============
+
+    def start(self):
+        """Démarre la tâche d'écriture (idempotent) dans la boucle courante"""
+        if self._task is None:
+            self.queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Écrit les messages restants puis arrête la tâche"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"{self.queue.qsize()} messages non écrits à l'arrêt")
+        self._task.cancel()
+        self._task = None
+
+    def submit(self, sender_id: int, receiver_id: int, content: str, client_id=None) -> bool:
+        """Met le message en file sans attendre; False si la file est pleine, ValueError si le message est invalide"""
+        if not is_id(receiver_id):
+            raise ValueError("Destinataire invalide")
+        if not isinstance(content, str) or not content.strip():
+            raise ValueError("Message vide")
+        self.start()
+        try:
+            self.queue.put_nowait(PendingMessage(sender_id, receiver_id, content, client_id))
+        except asyncio.QueueFull:
+            return False
+        chat_queue_depth.inc()
+        return True
+
+    # ============ ÉCRITURE PAR LOTS ============
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Laisser les messages s'accumuler quelques millisecondes
+            await asyncio.sleep(self.flush_interval)
+            while len(batch) < self.batch_max and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.flush(batch)
+            except Exception as e:
+                chat_write_failures.inc(len(batch))
+                logger.error(f"Écriture de {len(batch)} messages impossible: {e}")
+            finally:
+                chat_queue_depth.dec(len(batch))
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def flush(self, batch: List[PendingMessage]):
+        """Écrit un lot en une transaction, puis publie les messages enregistrés"""
+        failed = []
+        try:
+            saved, rejected = await self._write(batch)
+        except Exception as e:
+            # Une ligne fautive annule la transaction: réécriture message par message
+            logger.warning(f"Lot de {len(batch)} messages refusé ({e}): écriture message par message")
+            saved, rejected = [], []
+            for message in batch:
+                try:
+                    message_saved, message_rejected = await self._write([message])
+                except Exception as e:
+                    logger.error(f"Message de {message.sender_id} à {message.receiver_id} non enregistré: {e}")
+                    failed.append(message)
+                    continue
+                saved.extend(message_saved)
+                rejected.extend(message_rejected)
+
+        chat_persisted.inc(len(saved))
+        chat_batch_size.observe(len(saved))
+        if failed:
+            chat_write_failures.inc(len(failed))
+        for message, row in saved:
+            await self.hub.publish(row.receiver_id, message_frame(row))
+            await self.hub.publish(row.sender_id, {
+                "type": "message_saved", "client_id": message.client_id, "message_id": row.id,
+                "conversation_id": row.conversation_id,
+            })
+        for messages, detail in ((rejected, "Destinataire non trouvé"), (failed, "Message non enregistré")):
+            for message in messages:
+                await self.hub.publish(message.sender_id, {
+                    "type": "message_error", "client_id": message.client_id, "detail": detail,
+                })
+
+    async def _write(self, batch: List[PendingMessage]) -> tuple:
+        """Une transaction pour le lot; renvoie ([(message, ligne enregistrée)], [messages refusés])"""
+        async with self.session_factory() as db:
+            # Destinataires inexistants: le lot entier échouerait sur la clé étrangère
+            known_ids = set((await db.execute(
+                select(models.User.id).filter(models.User.id.in_({m.receiver_id for m in batch}))
+            )).scalars().all())
+            rejected = [m for m in batch if m.receiver_id not in known_ids]
+            batch = [m for m in batch if m.receiver_id in known_ids]
+            if not batch:
+                return [], rejected
+
+            conversation_ids = await self._conversation_ids(db, batch)
+            # Lignes RETURNING dans l'ordre des paramètres (multi-lignes là où la base le permet)
+            rows = (await db.execute(
+                insert(models.Message).returning(
+                    models.Message.id, models.Message.conversation_id, models.Message.sender_id,
+                    models.Message.receiver_id, models.Message.content, models.Message.created_at,
+                    sort_by_parameter_order=True
+                ),
+                [{
+                    "content": m.content,
+                    "sender_id": m.sender_id,
+                    "receiver_id": m.receiver_id,
+                    "conversation_id": conversation_ids[pair(m.sender_id, m.receiver_id)],
+                    "is_read": False,
+                    "created_at": m.created_at,
+                } for m in batch]
+            )).all()
+
+            # Dernier message de chaque conversation du lot (mise à jour groupée par clé primaire)
+            last_messages = {}
+            for row in rows:
+                if row.conversation_id not in last_messages or row.id > last_messages[row.conversation_id].id:
+                    last_messages[row.conversation_id] = row
+            await db.execute(update(models.Conversation), [
+                {"id": conv_id, "last_message_id": row.id, "updated_at": row.created_at}
+                for conv_id, row in last_messages.items()
+            ])
+            await db.commit()
+        return list(zip(batch, rows)), rejected
+
+    async def _conversation_ids(self, db, batch: List[PendingMessage]) -> dict:
+        """Conversation de chaque paire du lot; les manquantes sont créées en une insertion"""
+        pairs = {pair(m.sender_id, m.receiver_id) for m in batch}
+        conversation_ids = {}
+        # Paire stockée dans un ordre quelconque: chercher les deux
+        for conv_id, user1_id, user2_id in (await db.execute(
+            select(models.Conversation.id, models.Conversation.user1_id, models.Conversation.user2_id).filter(
+                tuple_(models.Conversation.user1_id, models.Conversation.user2_id).in_(
+                    list(pairs) + [(b, a) for a, b in pairs]
+                )
+            )
+        )).all():
+            conversation_ids.setdefault(pair(user1_id, user2_id), conv_id)
+
+        missing = [p for p in pairs if p not in conversation_ids]
+        if missing:
+            created = await db.execute(
+                insert(models.Conversation).returning(
+                    models.Conversation.id, models.Conversation.user1_id, models.Conversation.user2_id
+                ),
+                [{"user1_id": user1_id, "user2_id": user2_id} for user1_id, user2_id in missing]
+            )
+            for conv_id, user1_id, user2_id in created.all():
+                conversation_ids[pair(user1_id, user2_id)] = conv_id
+        return conversation_ids
+
+    # ============ LIVRAISON À LA RECONNEXION ============
+
+    async def deliver_pending(self, connection: Connection, since: int = None) -> int:
+        """Envoie à une connexion les messages reçus après `since` (sinon les non-lus).
+
+        Au-delà de CHAT_PENDING_DELIVERY_MAX, ce sont les plus récents qui sont
+        livrés (dans l'ordre chronologique); les plus anciens restent
+        accessibles par la pagination de la conversation.
+        """
+        query = select(models.Message).filter(models.Message.receiver_id == connection.user_id)
+        if since is not None:
+            query = query.filter(models.Message.id > since)
+        else:
+            query = query.filter(models.Message.is_read == False)
+        async with self.session_factory() as db:
+            messages = (await db.execute(
+                query.order_by(models.Message.id.desc()).limit(CHAT_PENDING_DELIVERY_MAX)
+            )).scalars().all()
+        for message in reversed(messages):
+            self.hub.send(connection, message_frame(message))
+        return len(messages)
+
+
+def is_id(value) -> bool:
+    """Identifiant d'utilisateur reçu d'un client (entier strictement positif, pas un booléen)"""
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def pair(user_a: int, user_b: int) -> tuple:
+    """Clé d'une conversation: (plus petit identifiant, plus grand)"""
+    return min(user_a, user_b), max(user_a, user_b)
+
+
+message_writer = MessageWriteBehind()
@@ -0,0 +1,149 @@
+"""
+Regroupement des signaux WebSocket éphémères (saisie en cours, accusés de lecture).
+
+Un client envoie un frame "typing" à chaque frappe et un "read_receipt" par
+message affiché; les relayer un pour un multiplie le trafic vers le
+destinataire (liaisons mobiles facturées au volume).
+
+- Saisie: état par paire (expéditeur, destinataire). Un changement d'état
+  part immédiatement s'il n'y a pas eu d'envoi depuis REALTIME_COALESCE_MS;
+  sinon seul le dernier état est envoyé au prochain tick. Un "is_typing: true"
+  inchangé n'est répété que toutes les TYPING_REFRESH_SECONDS secondes.
+  Sans frame "typing" pendant ce délai (client coupé sans "is_typing: false"),
+  ou à la déconnexion de l'expéditeur, "is_typing: false" est envoyé et la
+  paire est oubliée.
+- Accusés de lecture: seul le plus grand identifiant lu par conversation
+  (lecteur, expéditeur) est conservé et envoyé au tick suivant; il vaut
+  accusé pour tous les messages antérieurs.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from ..metrics import registry
+from .realtime import ConnectionHub, hub
+
+logger = logging.getLogger(__name__)
+
+REALTIME_COALESCE_MS = float(os.getenv("REALTIME_COALESCE_MS", "250"))
+TYPING_REFRESH_SECONDS = float(os.getenv("TYPING_REFRESH_SECONDS", "3"))
+
+signals_received = registry.counter("ws_signals_received_total", "Signaux éphémères reçus, par type")
+signals_sent = registry.counter("ws_signals_sent_total", "Signaux éphémères relayés après regroupement, par type")
+
+
+class TypingState:
+    __slots__ = ("sent", "sent_at", "pending", "seen_at")
+
+    def __init__(self):
+        self.sent: Optional[bool] = None
+        self.sent_at = 0.0
+        self.pending: Optional[bool] = None
+        # Dernier frame "typing" reçu de l'expéditeur
+        self.seen_at = time.monotonic()
+
+
+class SignalCoalescer:
+    """Filtre et regroupe les frames "typing" et "read_receipt" avant publication"""
+
+    def __init__(self, realtime_hub: ConnectionHub = None, interval_ms: float = None,
+                 typing_refresh: float = None):
+        self.hub = realtime_hub or hub
+        self.interval = (REALTIME_COALESCE_MS if interval_ms is None else interval_ms) / 1000
+        self.typing_refresh = TYPING_REFRESH_SECONDS if typing_refresh is None else typing_refresh
+        self._typing: Dict[Tuple[int, int], TypingState] = {}
+        self._receipts: Dict[Tuple[int, int], int] = {}
+        self._task = None
+
+    # ============ CYCLE DE VIE ============
+
+    def start(self):
+        """Démarre le tick périodique (idempotent) dans la boucle courante"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Envoi des signaux regroupés impossible: {e}")
+
+    # ============ SIGNAUX ============
+
+    async def typing(self, sender_id: int, recipient_id: int, is_typing: bool):
+        self.start()
+        signals_received.inc(type="typing")
+        state = self._typing.setdefault((sender_id, recipient_id), TypingState())
+        state.seen_at = time.monotonic()
+        elapsed = time.monotonic() - state.sent_at
+        if is_typing != state.sent and elapsed >= self.interval:
+            # Front montant (ou fin de saisie) après un silence: envoi immédiat
+            state.pending = None
+            await self._send_typing(sender_id, recipient_id, state, is_typing)
+        elif is_typing and is_typing == state.sent and elapsed >= self.typing_refresh:
+            # Saisie prolongée: rafraîchir l'indicateur du destinataire
+            await self._send_typing(sender_id, recipient_id, state, is_typing)
+        else:
+            state.pending = is_typing
+
+    def read_receipt(self, reader_id: int, sender_id: int, message_id: int):
+        self.start()
+        signals_received.inc(type="read_receipt")
+        key = (reader_id, sender_id)
+        if message_id > self._receipts.get(key, 0):
+            self._receipts[key] = message_id
+
+    async def flush(self):
+        """Envoie les derniers états de saisie en attente et les accusés de lecture accumulés"""
+        now = time.monotonic()
+        for (sender_id, recipient_id), state in list(self._typing.items()):
+            if state.pending is not None and state.pending != state.sent:
+                await self._send_typing(sender_id, recipient_id, state, state.pending)
+            state.pending = None
+            if state.sent and now - state.seen_at >= self.typing_refresh:
+                # Saisie non rafraîchie: l'expéditeur a disparu sans "is_typing: false"
+                await self._send_typing(sender_id, recipient_id, state, False)
+            if not state.sent:
+                # Paire inactive: rien à retenir
+                del self._typing[(sender_id, recipient_id)]
+
+        receipts, self._receipts = self._receipts, {}
+        for (reader_id, sender_id), message_id in receipts.items():
+            signals_sent.inc(type="read_receipt")
+            await self.hub.publish(sender_id, {
+                "type": "message_read",
+                "reader_id": reader_id,
+                "message_id": message_id,
+            })
+
+    async def disconnect(self, sender_id: int):
+        """Dernière connexion de l'expéditeur fermée: fin de ses saisies en cours"""
+        for (typing_sender_id, recipient_id), state in list(self._typing.items()):
+            if typing_sender_id != sender_id:
+                continue
+            del self._typing[(typing_sender_id, recipient_id)]
+            if state.sent:
+                await self._send_typing(sender_id, recipient_id, state, False)
+
+    async def _send_typing(self, sender_id: int, recipient_id: int, state: TypingState, is_typing: bool):
+        state.sent = is_typing
+        state.sent_at = time.monotonic()
+        signals_sent.inc(type="typing")
+        await self.hub.publish(recipient_id, {
+            "type": "typing_status",
+            "sender_id": sender_id,
+            "is_typing": is_typing,
+        })
+
+
+signal_coalescer = SignalCoalescer()
@@ -0,0 +1,210 @@
+"""
+Variantes des images uploadées (miniature, moyenne, pleine), en WebP et JPEG.
+
+- Les routes d'upload enregistrent l'original, déclarent l'image
+  (`register`, statut "pending") puis `submit`: la réponse part tout de
+  suite, les variantes arrivent ensuite.
+- Le rendu s'exécute dans un pool de processus (IMAGE_WORKERS; 0: threadpool).
+  L'image est décodée une seule fois (décodage réduit pour les JPEG plus
+  grands que la variante pleine), l'orientation EXIF est appliquée puis les
+  métadonnées sont supprimées (position GPS des photos de terrain), et
+  chaque variante est réduite depuis la précédente.
+- Une fois prêtes, les URL des variantes sont enregistrées dans
+  image_assets et recopiées sur les publications, événements et avatars qui
+  référencent l'original; une publication ou un événement créé ensuite les
+  reprend à sa création (`variants_for`), puis relit l'image après son commit
+  (`settle_variants`) si le traitement s'est terminé entre les deux.
+"""
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..database import SessionLocal
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# (nom, plus grand côté en pixels), de la plus grande à la plus petite
+IMAGE_VARIANTS = (("full", 2048), ("medium", 960), ("thumbnail", 320))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "82"))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+
+images_processed = registry.counter("images_processed_total", "Images traitées par le pipeline de variantes, par résultat")
+image_processing_seconds = registry.summary("image_processing_seconds", "Durée de production des variantes d'une image")
+
+
+def _save(image, path: str, format: str, **options):
+    """Écriture dans un fichier temporaire puis renommage: une variante visible est toujours complète"""
+    temp_path = f"{path}.part"
+    image.save(temp_path, format, **options)
+    os.replace(temp_path, path)
+
+
+def render_variants(source: str, url_prefix: str) -> Dict:
+    """Produit les variantes de `source` à côté de l'original (exécuté dans un processus du pool)"""
+    from PIL import Image, ImageOps
+
+    folder_path = os.path.dirname(source)
+    stem = os.path.splitext(os.path.basename(source))[0]
+    largest = IMAGE_VARIANTS[0][1]
+
+    with Image.open(source) as original:
+        # JPEG: décodage directement à l'échelle utile (1/2, 1/4, 1/8)
+        original.draft("RGB", (largest, largest))
+        # Orientation appliquée aux pixels; l'image produite ne porte plus d'EXIF
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    width, height = image.size
+
+    variants = {}
+    for name, size in IMAGE_VARIANTS:
+        if max(image.size) > size:
+            image = image.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+        webp_name, jpeg_name = f"{stem}_{name}.webp", f"{stem}_{name}.jpg"
+        _save(image, os.path.join(folder_path, webp_name), "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+        flat = image
+        if has_alpha:
+            # JPEG sans transparence: fond blanc
+            flat = Image.new("RGB", image.size, (255, 255, 255))
+            flat.paste(image, mask=image.getchannel("A"))
+        _save(flat, os.path.join(folder_path, jpeg_name), "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True,
+              progressive=True)
+        variants[name] = {
+            "webp": f"{url_prefix}/{webp_name}",
+            "jpeg": f"{url_prefix}/{jpeg_name}",
+            "width": image.size[0],
+            "height": image.size[1],
+        }
+    return {"width": width, "height": height, "variants": variants}
+
+
+def ready_variants_query(url: str, for_update: bool = False):
+    query = select(models.ImageAsset.variants).filter(
+        models.ImageAsset.path == url,
+        models.ImageAsset.status == "ready"
+    )
+    # FOR UPDATE (PostgreSQL): attend la fin d'un `_record` en cours sur cette image
+    return query.with_for_update() if for_update else query
+
+
+async def variants_for(db: AsyncSession, url: Optional[str], for_update: bool = False) -> Optional[Dict]:
+    """Variantes prêtes de l'image `url` (None si elle n'est pas encore traitée)"""
+    if not url:
+        return None
+    return (await db.execute(ready_variants_query(url, for_update))).scalar()
+
+
+async def settle_variants(db: AsyncSession, row, url_column: str = "image_url",
+                          variants_column: str = "image_variants"):
+    """Après le commit de `row`: reprend les variantes d'une image traitée pendant son écriture.
+
+    `_record` ne recopie les variantes que sur les lignes déjà validées: une
+    ligne écrite avec `variants_for` à "pending" puis validée après lui serait
+    oubliée. Sur SQLite, les deux transactions d'écriture ne se chevauchent pas.
+    """
+    url = getattr(row, url_column)
+    if not url or getattr(row, variants_column) is not None:
+        return
+    variants = await variants_for(db, url, for_update=True)
+    if variants is not None:
+        setattr(row, variants_column, variants)
+    await db.commit()
+
+
+def settle_variants_sync(db: Session, row, url_column: str, variants_column: str):
+    """`settle_variants` pour une Session synchrone"""
+    url = getattr(row, url_column)
+    if not url or getattr(row, variants_column) is not None:
+        return
+    variants = db.execute(ready_variants_query(url, for_update=True)).scalar()
+    if variants is not None:
+        setattr(row, variants_column, variants)
+    db.commit()
+
+
+class ImagePipeline:
+    """Déclare les images uploadées et produit leurs variantes en tâche de fond"""
+
+    def __init__(self, session_factory=None, workers: int = None):
+        self.session_factory = session_factory or SessionLocal
+        self.workers = IMAGE_WORKERS if workers is None else workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks = set()
+
+    def register(self, db, path: str):
+        """Déclare l'image dans la transaction de l'appelant (commit à sa charge)"""
+        db.add(models.ImageAsset(path=path, status="pending"))
+
+    def submit(self, path: str, source: str):
+        """Lance la production des variantes sans l'attendre"""
+        task = asyncio.create_task(self.process(path, source))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def process(self, path: str, source: str):
+        url_prefix = os.path.dirname(path)
+        started = time.monotonic()
+        try:
+            if self.workers:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, render_variants, source,
+                                                                          url_prefix)
+            else:
+                result = await run_in_threadpool(render_variants, source, url_prefix)
+        except Exception as e:
+            logger.error(f"Variantes de {path} impossibles: {e}")
+            images_processed.inc(result="failed")
+            await run_in_threadpool(self._record, path, None, str(e))
+            return
+        image_processing_seconds.observe(time.monotonic() - started)
+        images_processed.inc(result="ready")
+        await run_in_threadpool(self._record, path, result, None)
+
+    def _record(self, path: str, result: Optional[Dict], error: Optional[str]):
+        with self.session_factory() as db:
+            db.execute(update(models.ImageAsset).where(models.ImageAsset.path == path).values(
+                status="ready" if result else "failed",
+                variants=result["variants"] if result else None,
+                width=result["width"] if result else None,
+                height=result["height"] if result else None,
+                error=error,
+                processed_at=datetime.utcnow()
+            ))
+            if result:
+                variants = result["variants"]
+                # Entités créées avant la fin du traitement (index sur les colonnes d'URL)
+                db.execute(update(models.Post).where(models.Post.image_url == path)
+                           .values(image_variants=variants))
+                db.execute(update(models.Event).where(models.Event.image_url == path)
+                           .values(image_variants=variants))
+                db.execute(update(models.User).where(models.User.avatar_url == path)
+                           .values(avatar_variants=variants))
+            db.commit()
+
+    async def wait(self):
+        """Attend la fin des traitements en cours (arrêt, tests)"""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def stop(self):
+        await self.wait()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_pipeline = ImagePipeline()
@@ -1,35 +1,123 @@
-from typing import List, Dict, Any
-from ..models import User, Notification
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from datetime import datetime, timedelta
+from .. import models
+from ..models import User, Notification, BroadcastNotification, BroadcastReadMark, BroadcastReceipt, DeviceToken
 from ..database import get_db
+from sqlalchemy import select, insert, func, or_, and_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from .push import push_dispatcher
+from .unread import unread_counter
 import logging
-import firebase_admin
-from firebase_admin import credentials, messaging
 import json
 import os
+import threading
 
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase Admin SDK
-def initialize_firebase():
-    try:
-        # Check if Firebase is already initialized
-        if not firebase_admin._apps:
-            # Load Firebase credentials from environment variable or file
-            firebase_cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase-credentials.json')
-
-            if os.path.exists(firebase_cred_path):
-                cred = credentials.Certificate(firebase_cred_path)
-                firebase_admin.initialize_app(cred)
-                logger.info("Firebase Admin SDK initialized successfully")
-            else:
-                logger.warning(f"Firebase credentials file not found at {firebase_cred_path}")
-                logger.warning("Firebase notifications will not be available")
-    except Exception as e:
-        logger.error(f"Error initializing Firebase: {str(e)}")
+# Lignes par instruction INSERT des envois groupés (une seule transaction au total)
+NOTIFICATION_INSERT_CHUNK = int(os.getenv("NOTIFICATION_INSERT_CHUNK", "1000"))
+
+# Regroupement: fenêtre depuis la dernière activité du groupe et taille de l'échantillon d'acteurs
+NOTIFICATION_AGGREGATION_WINDOW_HOURS = float(os.getenv("NOTIFICATION_AGGREGATION_WINDOW_HOURS", "24"))
+NOTIFICATION_ACTOR_SAMPLE = int(os.getenv("NOTIFICATION_ACTOR_SAMPLE", "3"))
+# Tentatives d'ouverture d'un groupe en concurrence avec d'autres transactions
+NOTIFICATION_GROUP_ATTEMPTS = 3
+
+# Type regroupable -> (titre, action au singulier, action au pluriel)
+AGGREGATED_NOTIFICATIONS = {
+    "like": ("Nouveau j'aime", "a aimé votre publication", "ont aimé votre publication"),
+    "comment": ("Nouveau commentaire", "a commenté votre publication", "ont commenté votre publication"),
+    "follow": ("Nouvel abonné", "a commencé à vous suivre", "ont commencé à vous suivre"),
+    "registration": ("Nouvelle inscription", "s'est inscrit à votre événement", "se sont inscrits à votre événement"),
+    "vote": ("Nouveau vote", "a voté à votre sondage", "ont voté à votre sondage"),
+}
+
+
+def chunked(values: Iterable, size: int) -> Iterator[list]:
+    """Découpe un itérable en listes de `size` éléments au plus"""
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# ============ FIREBASE (INITIALISATION PARESSEUSE) ============
+# firebase_admin est lourd à importer: il n'est chargé qu'au premier envoi
+# push ou par le préchauffage en tâche de fond lancé au démarrage (main.py).
+_firebase_lock = threading.Lock()
+_firebase_state = {"initialized": False, "available": False}
+
+
+def initialize_firebase() -> bool:
+    """Initialise le SDK Firebase Admin une seule fois; renvoie True s'il est utilisable"""
+    with _firebase_lock:
+        if _firebase_state["initialized"]:
+            return _firebase_state["available"]
+        try:
+            import firebase_admin
+            from firebase_admin import credentials
+
+            # Check if Firebase is already initialized
+            if not firebase_admin._apps:
+                # Load Firebase credentials from environment variable or file
+                firebase_cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase-credentials.json')
+
+                if os.path.exists(firebase_cred_path):
+                    cred = credentials.Certificate(firebase_cred_path)
+                    firebase_admin.initialize_app(cred)
+                    logger.info("Firebase Admin SDK initialized successfully")
+                else:
+                    logger.warning(f"Firebase credentials file not found at {firebase_cred_path}")
+                    logger.warning("Firebase notifications will not be available")
+            _firebase_state["available"] = bool(firebase_admin._apps)
+        except Exception as e:
+            logger.error(f"Error initializing Firebase: {str(e)}")
+        _firebase_state["initialized"] = True
+        return _firebase_state["available"]
+
+
+def firebase_available() -> bool:
+    """Firebase est-il initialisé et utilisable (sans déclencher l'initialisation) ?"""
+    return _firebase_state["available"]
+
+
+def get_messaging():
+    """Module firebase_admin.messaging, ou None si Firebase n'est pas configuré"""
+    if not initialize_firebase():
+        return None
+    from firebase_admin import messaging
+    return messaging
+
+
+def notification_to_dict(notification, is_read: bool, is_broadcast: bool = False) -> Dict[str, Any]:
+    """Notification personnelle ou annonce, au format de NotificationResponse"""
+    return {
+        "id": notification.id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "data": notification.data,
+        "is_read": bool(is_read),
+        "is_broadcast": is_broadcast,
+        "actor_count": getattr(notification, "actor_count", None) or 1,
+        "created_at": notification.created_at
+    }
+
+
+def aggregated_message(type: str, actors: List[Dict[str, Any]], actor_count: int) -> str:
+    """"Alice, Bob et 12 autres ont aimé votre publication" à partir de l'échantillon d'acteurs"""
+    _, singular, plural = AGGREGATED_NOTIFICATIONS[type]
+    names = [actor["name"] for actor in actors[:2]]
+    others = actor_count - len(names)
+    if others > 0:
+        names.append(f"{others} autre{'s' if others > 1 else ''}")
+    subject = names[0] if len(names) == 1 else f"{', '.join(names[:-1])} et {names[-1]}"
+    return f"{subject} {singular if actor_count == 1 else plural}"
 
-# Initialize Firebase when module is imported
-initialize_firebase()
 
 class NotificationService:
     @staticmethod
@@ -53,25 +141,34 @@ class NotificationService:
         db.add(notification)
         db.commit()
         db.refresh(notification)
+        unread_counter.adjust([user_id], +1)
         return notification
 
     @staticmethod
     def create_bulk_notifications(
         db: Session,
-        user_ids: List[int],
+        user_ids: Iterable[int],
         title: str,
         message: str,
         type: str = "info",
-        data: Dict[str, Any] = None
-    ) -> List[Notification]:
-        """Créer des notifications pour plusieurs utilisateurs"""
-        notifications = []
-        for user_id in user_ids:
-            notification = NotificationService.create_notification(
-                db, user_id, title, message, type, data
-            )
-            notifications.append(notification)
-        return notifications
+        data: Dict[str, Any] = None,
+        chunk_size: int = None
+    ) -> int:
+        """Créer la même notification pour plusieurs utilisateurs; renvoie le nombre créé.
+
+        Insertions multi-lignes par paquets de NOTIFICATION_INSERT_CHUNK,
+        une seule transaction; les identifiants inconnus sont ignorés.
+        """
+        chunk_size = chunk_size or NOTIFICATION_INSERT_CHUNK
+        created_at = datetime.utcnow()
+        notified_ids = []
+        for chunk in chunked(dict.fromkeys(user_ids), chunk_size):
+            existing_ids = db.execute(select(User.id).filter(User.id.in_(chunk))).scalars().all()
+            NotificationService._insert_notifications(db, existing_ids, title, message, type, data, created_at)
+            notified_ids.extend(existing_ids)
+        db.commit()
+        unread_counter.adjust(notified_ids, +1)
+        return len(notified_ids)
 
     @staticmethod
     def create_notification_for_all_users(
@@ -79,14 +176,37 @@ class NotificationService:
         title: str,
         message: str,
         type: str = "info",
-        data: Dict[str, Any] = None
-    ) -> List[Notification]:
-        """Créer une notification pour tous les utilisateurs actifs"""
-        users = db.query(User).filter(User.is_active == True).all()
-        user_ids = [user.id for user in users]
-        return NotificationService.create_bulk_notifications(
-            db, user_ids, title, message, type, data
-        )
+        data: Dict[str, Any] = None,
+        chunk_size: int = None
+    ) -> int:
+        """Créer une notification pour tous les utilisateurs actifs; renvoie le nombre créé"""
+        chunk_size = chunk_size or NOTIFICATION_INSERT_CHUNK
+        created_at = datetime.utcnow()
+        # Identifiants seulement (aucun objet User chargé)
+        user_ids = db.execute(select(User.id).filter(User.is_active == True).order_by(User.id)).scalars().all()
+        count = 0
+        for chunk in chunked(user_ids, chunk_size):
+            count += NotificationService._insert_notifications(db, chunk, title, message, type, data, created_at)
+        db.commit()
+        unread_counter.adjust(user_ids, +1)
+        return count
+
+    @staticmethod
+    def _insert_notifications(db: Session, user_ids: List[int], title: str, message: str, type: str,
+                              data: Dict[str, Any], created_at: datetime) -> int:
+        """Un paquet de notifications en une instruction INSERT (executemany), sans commit"""
+        if not user_ids:
+            return 0
+        db.execute(insert(Notification), [{
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "type": type,
+            "data": data or {},
+            "is_read": False,
+            "created_at": created_at,
+        } for user_id in user_ids])
+        return len(user_ids)
 
     @staticmethod
     def get_user_notifications(
@@ -94,40 +214,63 @@ class NotificationService:
         user_id: int,
         skip: int = 0,
         limit: int = 50
-    ) -> List[Notification]:
-        """Récupérer les notifications d'un utilisateur"""
-        return db.query(Notification).filter(
+    ) -> List[Dict[str, Any]]:
+        """Récupérer les notifications d'un utilisateur: personnelles et annonces, fusionnées par date"""
+        personal = db.query(Notification).filter(
             Notification.user_id == user_id
         ).order_by(
             Notification.created_at.desc()
-        ).offset(skip).limit(limit).all()
+        ).limit(skip + limit).all()
+
+        broadcasts = db.execute(
+            NotificationService._visible_broadcasts(user_id, BroadcastNotification).order_by(
+                BroadcastNotification.created_at.desc()
+            ).limit(skip + limit)
+        ).all()
+
+        entries = [notification_to_dict(notif, notif.is_read) for notif in personal]
+        entries += [notification_to_dict(broadcast, is_read, is_broadcast=True) for broadcast, is_read in broadcasts]
+        entries.sort(key=lambda entry: entry["created_at"], reverse=True)
+        return entries[skip:skip + limit]
 
     @staticmethod
     def get_unread_notifications_count(
         db: Session,
         user_id: int
     ) -> int:
-        """Compter les notifications non lues"""
-        return db.query(Notification).filter(
+        """Compter les notifications non lues (personnelles et annonces), depuis le cache si possible"""
+        return unread_counter.get(user_id, lambda: NotificationService._count_unread(db, user_id))
+
+    @staticmethod
+    def _count_unread(db: Session, user_id: int) -> int:
+        personal = db.query(Notification).filter(
             Notification.user_id == user_id,
             Notification.is_read == False
         ).count()
+        return personal + NotificationService._unread_broadcasts_count(db, user_id)
 
     @staticmethod
     def mark_notification_as_read(
         db: Session,
         notification_id: int,
-        user_id: int
+        user_id: int,
+        broadcast: bool = False
     ) -> bool:
-        """Marquer une notification comme lue"""
+        """Marquer une notification (ou une annonce) comme lue"""
+        if broadcast:
+            return NotificationService._set_broadcast_receipt(db, notification_id, user_id, dismissed=False)
+
         notification = db.query(Notification).filter(
             Notification.id == notification_id,
             Notification.user_id == user_id
         ).first()
 
         if notification:
+            was_unread = not notification.is_read
             notification.is_read = True
             db.commit()
+            if was_unread:
+                unread_counter.adjust([user_id], -1)
             return True
         return False
 
@@ -142,125 +285,252 @@ class NotificationService:
             Notification.is_read == False
         ).update({"is_read": True}, synchronize_session=False)
 
+        # Annonces: avancer le repère de lecture jusqu'à la dernière publiée
+        unread_broadcasts = NotificationService._unread_broadcasts_count(db, user_id)
+        if unread_broadcasts:
+            last_id = db.execute(select(func.max(BroadcastNotification.id))).scalar()
+            read_mark = db.get(BroadcastReadMark, user_id)
+            if read_mark is None:
+                db.add(BroadcastReadMark(user_id=user_id, last_read_id=last_id))
+            else:
+                read_mark.last_read_id = last_id
+
         db.commit()
-        return result
+        unread_counter.set(user_id, 0)
+        return result + unread_broadcasts
 
     @staticmethod
     def delete_notification(
         db: Session,
         notification_id: int,
-        user_id: int
+        user_id: int,
+        broadcast: bool = False
     ) -> bool:
-        """Supprimer une notification"""
+        """Supprimer une notification (une annonce est seulement masquée pour l'utilisateur)"""
+        if broadcast:
+            return NotificationService._set_broadcast_receipt(db, notification_id, user_id, dismissed=True)
+
         notification = db.query(Notification).filter(
             Notification.id == notification_id,
             Notification.user_id == user_id
         ).first()
 
         if notification:
+            was_unread = not notification.is_read
             db.delete(notification)
             db.commit()
+            if was_unread:
+                unread_counter.adjust([user_id], -1)
             return True
         return False
 
+    # ============ REGROUPEMENT ============
+
     @staticmethod
-    def send_push_notification(
+    def create_aggregated_notification(
+        db: Session,
         user_id: int,
-        title: str,
-        body: str,
-        data: Dict[str, Any] = None
-    ) -> bool:
-        """
-        Envoyer une notification push via Firebase Cloud Messaging
+        type: str,
+        target_type: str,
+        target_id: int,
+        actor_id: int,
+        actor_name: str,
+        window: timedelta = None
+    ) -> Optional[Notification]:
+        """Notifier une action (like, commentaire, abonnement) en la regroupant par type et cible.
+
+        La notification non lue du groupe (unique: index partiel sur
+        (user_id, group_key)) est mise à jour sur place (nombre d'acteurs,
+        échantillon des derniers acteurs, message, date); sinon une nouvelle
+        ligne est créée. Si sa dernière activité date de plus de `window`, elle
+        sort du groupe et une nouvelle ligne l'ouvre. Une fois lue, la
+        notification n'est plus modifiée: l'activité suivante ouvre un nouveau
+        groupe. Un acteur déjà présent dans l'échantillon n'est pas recompté.
+        Renvoie None si l'utilisateur est l'auteur de l'action.
         """
-        from ..database import get_db
-        from sqlalchemy.orm import Session
+        if actor_id == user_id:
+            return None
+        window = window or timedelta(hours=NOTIFICATION_AGGREGATION_WINDOW_HOURS)
+        now = datetime.utcnow()
+        group_key = f"{type}:{target_type}:{target_id}"
+        actor = {"id": actor_id, "name": actor_name}
+
+        for attempt in range(NOTIFICATION_GROUP_ATTEMPTS):
+            notification = NotificationService._unread_group(db, user_id, group_key)
+            if notification is not None and notification.created_at < now - window:
+                # Groupe inactif: la ligne reste non lue mais n'est plus regroupée
+                notification.group_key = None
+                db.flush()
+                notification = None
+            if notification is not None:
+                break
+
+            notification = Notification(
+                user_id=user_id,
+                title=AGGREGATED_NOTIFICATIONS[type][0],
+                message=aggregated_message(type, [actor], 1),
+                type=type,
+                data={"target_type": target_type, "target_id": target_id, "actors": [actor]},
+                is_read=False,
+                created_at=now,
+                group_key=group_key,
+                actor_count=1
+            )
+            db.add(notification)
+            try:
+                db.commit()
+            except IntegrityError:
+                # Groupe ouvert entre-temps par une autre transaction: relecture de sa ligne
+                # (déjà lue ou supprimée depuis: nouvelle insertion au tour suivant)
+                db.rollback()
+                if attempt == NOTIFICATION_GROUP_ATTEMPTS - 1:
+                    raise
+                continue
+            unread_counter.adjust([user_id], +1)
+            return notification
+
+        data = dict(notification.data or {})
+        sample = data.get("actors", [])
+        if all(sampled["id"] != actor_id for sampled in sample):
+            notification.actor_count = (notification.actor_count or 1) + 1
+        # Acteur le plus récent en tête
+        data["actors"] = ([actor] + [sampled for sampled in sample if sampled["id"] != actor_id])[:NOTIFICATION_ACTOR_SAMPLE]
+        notification.data = data
+        notification.message = aggregated_message(type, data["actors"], notification.actor_count)
+        notification.created_at = now
+        # Toujours une seule notification non lue pour le groupe: compteur inchangé
+        db.commit()
+        return notification
 
-        try:
-            db: Session = next(get_db())
+    @staticmethod
+    def _unread_group(db: Session, user_id: int, group_key: str) -> Optional[Notification]:
+        # Index partiel unique (user_id, group_key) des non lues. C'est lui qui garantit une seule
+        # ligne par groupe: FOR UPDATE ne verrouille la ligne que sur PostgreSQL (ignoré par SQLite)
+        return db.query(Notification).filter(
+            Notification.user_id == user_id,
+            Notification.group_key == group_key,
+            Notification.is_read == False
+        ).with_for_update().first()
 
-            # Get user's device token from database
-            user = db.query(models.User).filter(models.User.id == user_id).first()
-            if not user or not user.device_token:
-                logger.warning(f"User {user_id} has no device token registered")
-                return False
+    # ============ ANNONCES (FAN-OUT À LA LECTURE) ============
 
-            # Check if Firebase is initialized
-            if not firebase_admin._apps:
-                logger.warning("Firebase not initialized, cannot send push notifications")
-                return False
-
-            # Prepare the message
-            message = messaging.Message(
-                notification=messaging.Notification(
-                    title=title,
-                    body=body,
-                ),
-                data=data or {},
-                token=user.device_token,
-            )
+    @staticmethod
+    def create_broadcast_notification(
+        db: Session,
+        title: str,
+        message: str,
+        type: str = "info",
+        data: Dict[str, Any] = None,
+        author_id: int = None
+    ) -> BroadcastNotification:
+        """Publier une annonce pour tous les utilisateurs: une seule ligne, quel que soit leur nombre"""
+        broadcast = BroadcastNotification(
+            title=title,
+            message=message,
+            type=type,
+            data=data or {},
+            author_id=author_id
+        )
+        db.add(broadcast)
+        db.commit()
+        db.refresh(broadcast)
+        # Visible par tous: chaque compteur en mémoire augmente
+        unread_counter.adjust(None, +1)
+        return broadcast
 
-            # Send the message
-            response = messaging.send(message)
-            logger.info(f"Firebase push notification sent to user {user_id}: {response}")
+    @staticmethod
+    def _visible_broadcasts(user_id: int, *columns):
+        """Annonces visibles par l'utilisateur (publiées depuis son inscription, non supprimées), avec leur état lu"""
+        receipt = BroadcastReceipt
+        user_created_at = select(User.created_at).filter(User.id == user_id).scalar_subquery()
+        last_read_id = func.coalesce(
+            select(BroadcastReadMark.last_read_id).filter(BroadcastReadMark.user_id == user_id).scalar_subquery(), 0
+        )
+        is_read = or_(BroadcastNotification.id <= last_read_id, receipt.user_id.isnot(None)).label("is_read")
+        return select(*columns, is_read).outerjoin(receipt, and_(
+            receipt.broadcast_id == BroadcastNotification.id,
+            receipt.user_id == user_id
+        )).filter(
+            BroadcastNotification.created_at >= user_created_at,
+            or_(receipt.dismissed.is_(None), receipt.dismissed == False)
+        )
 
-            return True
+    @staticmethod
+    def _unread_broadcasts_count(db: Session, user_id: int) -> int:
+        visible = NotificationService._visible_broadcasts(user_id, BroadcastNotification.id).subquery()
+        return db.execute(select(func.count()).select_from(visible).filter(visible.c.is_read == False)).scalar()
 
-        except Exception as e:
-            logger.error(f"Error sending Firebase push notification: {str(e)}")
+    @staticmethod
+    def _set_broadcast_receipt(db: Session, broadcast_id: int, user_id: int, dismissed: bool) -> bool:
+        if db.get(BroadcastNotification, broadcast_id) is None:
             return False
+        receipt = db.get(BroadcastReceipt, (user_id, broadcast_id))
+        if receipt is None:
+            db.add(BroadcastReceipt(user_id=user_id, broadcast_id=broadcast_id, dismissed=dismissed))
+        elif dismissed:
+            receipt.dismissed = True
+        db.commit()
+        unread_counter.set(user_id, NotificationService._count_unread(db, user_id))
+        return True
+
+    # ============ APPAREILS ============
 
     @staticmethod
-    def send_bulk_push_notifications(
-        user_ids: List[int],
+    def register_device_token(
+        db: Session,
+        user_id: int,
+        token: str,
+        platform: str = None
+    ) -> DeviceToken:
+        """Enregistrer (ou rafraîchir) le jeton push d'un appareil; un appareil repris change de propriétaire"""
+        device = db.query(DeviceToken).filter(DeviceToken.token == token).first()
+        now = datetime.utcnow()
+        if device is None:
+            device = DeviceToken(user_id=user_id, token=token, platform=platform, created_at=now)
+            db.add(device)
+        else:
+            device.user_id = user_id
+            device.platform = platform or device.platform
+        device.last_seen_at = now
+        db.commit()
+        db.refresh(device)
+        return device
+
+    @staticmethod
+    def unregister_device_token(
+        db: Session,
+        user_id: int,
+        token: str
+    ) -> bool:
+        """Retirer le jeton d'un appareil (déconnexion)"""
+        deleted = db.query(DeviceToken).filter(
+            DeviceToken.token == token,
+            DeviceToken.user_id == user_id
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted > 0
+
+    @staticmethod
+    def send_push_notification(
+        db: Session,
+        user_id: int,
         title: str,
         body: str,
         data: Dict[str, Any] = None
-    ) -> bool:
-        """Envoyer des notifications push à plusieurs utilisateurs"""
-        from ..database import get_db
-        from sqlalchemy.orm import Session
-
-        try:
-            db: Session = next(get_db())
-
-            # Check if Firebase is initialized
-            if not firebase_admin._apps:
-                logger.warning("Firebase not initialized, cannot send bulk push notifications")
-                return False
-
-            # Get device tokens for all users
-            users = db.query(models.User).filter(
-                models.User.id.in_(user_ids),
-                models.User.device_token.isnot(None)
-            ).all()
-
-            if not users:
-                logger.warning("No users with device tokens found for bulk notification")
-                return False
-
-            # Prepare messages for each user
-            messages = []
-            for user in users:
-                message = messaging.Message(
-                    notification=messaging.Notification(
-                        title=title,
-                        body=body,
-                    ),
-                    data=data or {},
-                    token=user.device_token,
-                )
-                messages.append(message)
-
-            # Send all messages as a batch
-            response = messaging.send_all(messages)
-            logger.info(f"Firebase bulk push notification sent to {len(users)} users: {response}")
-
-            return True
+    ) -> int:
+        """Mettre en file une notification push pour un utilisateur (envoi par services/push.py)"""
+        return push_dispatcher.enqueue(db, [user_id], title, body, data)
 
-        except Exception as e:
-            logger.error(f"Error sending bulk Firebase push notifications: {str(e)}")
-            return False
+    @staticmethod
+    def send_bulk_push_notifications(
+        db: Session,
+        user_ids: Optional[List[int]],
+        title: str,
+        body: str,
+        data: Dict[str, Any] = None
+    ) -> int:
+        """Mettre en file des notifications push (user_ids=None: tous les utilisateurs actifs)"""
+        return push_dispatcher.enqueue(db, user_ids, title, body, data)
 
 # Types de notifications courants
 class NotificationTypes:
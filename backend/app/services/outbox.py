@@ -0,0 +1,252 @@
+"""
+Outbox transactionnelle des actions sociales et livraison aux consommateurs.
+
+- Les routes (like, commentaire, abonnement, inscription, vote) appellent
+  `record_activity` avant leur commit: l'événement est enregistré dans la même
+  transaction que l'action, sans autre travail sur le chemin de la requête.
+- OutboxDispatcher lit les événements en attente par lots (ordre des id) et
+  les livre aux consommateurs enregistrés (`@outbox_dispatcher.consumer`).
+  Un consommateur synchrone reçoit (session, événement) et s'exécute dans le
+  threadpool; un consommateur asynchrone reçoit l'événement.
+- Livraison au moins une fois: un événement n'est marqué "done" qu'après le
+  succès de tous ses consommateurs. Après un échec, seuls les consommateurs
+  restants sont rappelés, avec un délai exponentiel (OUTBOX_BACKOFF_SECONDS,
+  plafonné à OUTBOX_BACKOFF_MAX_SECONDS), jusqu'à OUTBOX_MAX_ATTEMPTS
+  tentatives ("failed"). Les consommateurs doivent rester
+  idempotents (arrêt du processus entre la livraison et l'enregistrement).
+- Ordre par agrégat: tant qu'un événement d'un agrégat ("post", 42) attend
+  une nouvelle tentative, les suivants du même agrégat ne sont pas livrés.
+  Le lot ne lit que des événements dus et non retenus (filtre SQL): des
+  événements en attente de nouvelle tentative ne bloquent pas les autres.
+- Une seule boucle de livraison par déploiement: OUTBOX_DISPATCH=0 sur les
+  autres workers.
+- Métriques: outbox_lag_seconds (âge du plus ancien événement en attente),
+  outbox_pending_events, outbox_deliveries_total{consumer,result} et
+  outbox_delivery_delay_seconds.
+"""
+import asyncio
+import inspect
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import aliased
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..database import SessionLocal
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_DISPATCH = os.getenv("OUTBOX_DISPATCH", "1").lower() in ("1", "true", "yes")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.5"))
+OUTBOX_BACKOFF_SECONDS = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "5"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+
+outbox_lag = registry.gauge("outbox_lag_seconds", "Âge du plus ancien événement outbox en attente")
+outbox_pending = registry.gauge("outbox_pending_events", "Événements outbox en attente")
+outbox_deliveries = registry.counter("outbox_deliveries_total", "Livraisons outbox, par consommateur et résultat")
+outbox_delay = registry.summary("outbox_delivery_delay_seconds", "Délai entre l'écriture d'un événement et sa livraison complète")
+
+
+def record_event(db, aggregate_type: str, aggregate_id: int, event_type: str, payload: Dict = None):
+    """Ajoute un événement à la transaction en cours (Session ou AsyncSession); le commit reste à l'appelant"""
+    db.add(models.OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=payload or {},
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+        delivered=[],
+    ))
+
+
+def record_activity(db, event_type: str, aggregate_type: str, aggregate_id: int, owner_id: Optional[int],
+                    actor: models.User):
+    """Action sociale d'`actor` sur un agrégat appartenant à `owner_id` (payload des consommateurs d'activité)"""
+    record_event(db, aggregate_type, aggregate_id, event_type, {
+        "owner_id": owner_id,
+        "actor_id": actor.id,
+        "actor_name": f"{actor.first_name} {actor.last_name}",
+    })
+
+
+def outbox_backoff(attempts: int) -> float:
+    """Délai avant la tentative suivante: OUTBOX_BACKOFF_SECONDS × 2^(tentatives - 1), plafonné"""
+    return min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_SECONDS * 2 ** max(0, attempts - 1))
+
+
+class Consumer:
+    __slots__ = ("name", "handler", "events")
+
+    def __init__(self, name: str, handler: Callable, events: Optional[Iterable[str]]):
+        self.name = name
+        self.handler = handler
+        self.events = set(events) if events is not None else None
+
+    def accepts(self, event_type: str) -> bool:
+        return self.events is None or event_type in self.events
+
+
+class OutboxDispatcher:
+    """Livre les événements de l'outbox aux consommateurs enregistrés"""
+
+    def __init__(self, session_factory=None, batch_size: int = None, max_attempts: int = None,
+                 poll_interval: float = None):
+        self.session_factory = session_factory or SessionLocal
+        self.batch_size = batch_size or OUTBOX_BATCH_SIZE
+        self.max_attempts = max_attempts or OUTBOX_MAX_ATTEMPTS
+        self.poll_interval = OUTBOX_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.consumers: List[Consumer] = []
+        self._task = None
+
+    # ============ CONSOMMATEURS ============
+
+    def register(self, name: str, handler: Callable, events: Iterable[str] = None):
+        """Enregistre un consommateur pour `events` (None: tous les événements)"""
+        self.consumers = [consumer for consumer in self.consumers if consumer.name != name]
+        self.consumers.append(Consumer(name, handler, events))
+
+    def consumer(self, name: str, events: Iterable[str] = None):
+        def decorator(handler):
+            self.register(name, handler, events)
+            return handler
+        return decorator
+
+    # ============ LIVRAISON ============
+
+    def _fetch(self, now: datetime) -> List[dict]:
+        event = models.OutboxEvent
+        earlier = aliased(models.OutboxEvent)
+        with self.session_factory() as db:
+            # Index (status, id); événements dus dont aucun prédécesseur du même agrégat n'attend
+            # de nouvelle tentative (index (aggregate_type, aggregate_id, status, id))
+            rows = db.execute(
+                select(event.id, event.aggregate_type, event.aggregate_id, event.event_type, event.payload,
+                       event.attempts, event.next_attempt_at, event.delivered, event.created_at)
+                .filter(
+                    event.status == "pending",
+                    event.next_attempt_at <= now,
+                    ~select(earlier.id).filter(
+                        earlier.aggregate_type == event.aggregate_type,
+                        earlier.aggregate_id == event.aggregate_id,
+                        earlier.status == "pending",
+                        earlier.id < event.id,
+                        earlier.next_attempt_at > now
+                    ).exists()
+                )
+                .order_by(event.id).limit(self.batch_size)
+            ).mappings().all()
+            pending, oldest = db.execute(
+                select(func.count(event.id), func.min(event.created_at)).filter(event.status == "pending")
+            ).one()
+        outbox_pending.set(pending)
+        outbox_lag.set((datetime.utcnow() - oldest).total_seconds() if oldest else 0)
+        return [dict(row) for row in rows]
+
+    def _save(self, outcomes: List[dict]):
+        with self.session_factory() as db:
+            db.execute(update(models.OutboxEvent), outcomes)
+            db.commit()
+
+    async def _deliver(self, consumer: Consumer, event: dict):
+        if inspect.iscoroutinefunction(consumer.handler):
+            await consumer.handler(event)
+            return
+
+        def call():
+            with self.session_factory() as db:
+                consumer.handler(db, event)
+        await run_in_threadpool(call)
+
+    async def dispatch_batch(self) -> int:
+        """Livre un lot d'événements dus; renvoie le nombre d'événements traités"""
+        now = datetime.utcnow()
+        events = await run_in_threadpool(self._fetch, now)
+        blocked = set()
+        outcomes = []
+        for event in events:
+            aggregate = (event["aggregate_type"], event["aggregate_id"])
+            if aggregate in blocked:
+                # Un événement antérieur du même agrégat vient d'échouer dans ce lot
+                continue
+
+            delivered = list(event["delivered"] or [])
+            error = None
+            for consumer in self.consumers:
+                if consumer.name in delivered or not consumer.accepts(event["event_type"]):
+                    continue
+                try:
+                    await self._deliver(consumer, event)
+                except Exception as e:
+                    error = f"{consumer.name}: {e}"
+                    outbox_deliveries.inc(consumer=consumer.name, result="error")
+                    break
+                delivered.append(consumer.name)
+                outbox_deliveries.inc(consumer=consumer.name, result="ok")
+
+            outcome = {
+                "id": event["id"],
+                "status": "done",
+                "attempts": event["attempts"] + 1,
+                "delivered": delivered,
+                "last_error": error,
+                "next_attempt_at": event["next_attempt_at"],
+                "dispatched_at": None,
+            }
+            if error is None:
+                outcome["dispatched_at"] = datetime.utcnow()
+                outbox_delay.observe((outcome["dispatched_at"] - event["created_at"]).total_seconds())
+            elif outcome["attempts"] >= self.max_attempts:
+                outcome["status"] = "failed"
+                logger.error(f"Événement outbox {event['id']} abandonné après {outcome['attempts']} tentatives: {error}")
+            else:
+                outcome["status"] = "pending"
+                outcome["next_attempt_at"] = now + timedelta(seconds=outbox_backoff(outcome["attempts"]))
+                blocked.add(aggregate)
+            outcomes.append(outcome)
+
+        if outcomes:
+            await run_in_threadpool(self._save, outcomes)
+        return len(outcomes)
+
+    async def drain(self) -> int:
+        """Livre tous les événements dus (tests, tâches ponctuelles)"""
+        total = 0
+        while True:
+            dispatched = await self.dispatch_batch()
+            if not dispatched:
+                return total
+            total += dispatched
+
+    # ============ TÂCHE DE FOND ============
+
+    def start(self):
+        """Démarre la boucle de livraison (idempotent) dans la boucle courante"""
+        if OUTBOX_DISPATCH and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.dispatch_batch() >= self.batch_size:
+                    # Retard à rattraper: lot suivant sans attendre
+                    continue
+            except Exception as e:
+                logger.error(f"Livraison de l'outbox impossible: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+
+outbox_dispatcher = OutboxDispatcher()
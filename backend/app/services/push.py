@@ -0,0 +1,265 @@
+"""
+File d'envoi des notifications push (FCM), persistante et traitée en tâche de fond.
+
+- `enqueue` résout les jetons des destinataires en une requête et enregistre
+  un lot (PushJob) par tranche de PUSH_BATCH_SIZE jetons (500 = maximum FCM
+  par multicast). Les routes ne parlent jamais à Firebase.
+- PUSH_WORKERS workers réclament les lots atomiquement (UPDATE ... RETURNING,
+  avec un bail: un lot abandonné par un worker arrêté est repris).
+- Résultat par jeton: "ok", "invalid" (appareil supprimé de device_tokens) ou "retry";
+  les jetons à réessayer restent dans le lot, replanifié avec un délai
+  exponentiel, jusqu'à PUSH_MAX_ATTEMPTS tentatives.
+- Le transport est interchangeable: FirebaseTransport en production,
+  FakePushTransport pour le développement et les tests (PUSH_TRANSPORT=fake).
+"""
+import asyncio
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..database import SessionLocal
+from ..metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PUSH_TRANSPORT = os.getenv("PUSH_TRANSPORT", "firebase")
+PUSH_BATCH_SIZE = int(os.getenv("PUSH_BATCH_SIZE", "500"))
+PUSH_WORKERS = int(os.getenv("PUSH_WORKERS", "4"))
+PUSH_MAX_ATTEMPTS = int(os.getenv("PUSH_MAX_ATTEMPTS", "5"))
+PUSH_BACKOFF_SECONDS = float(os.getenv("PUSH_BACKOFF_SECONDS", "2"))
+PUSH_BACKOFF_MAX_SECONDS = float(os.getenv("PUSH_BACKOFF_MAX_SECONDS", "3600"))
+PUSH_LEASE_SECONDS = float(os.getenv("PUSH_LEASE_SECONDS", "60"))
+PUSH_POLL_INTERVAL = float(os.getenv("PUSH_POLL_INTERVAL", "1"))
+
+# Résultats d'envoi par jeton
+OK, INVALID, RETRY = "ok", "invalid", "retry"
+
+push_jobs_enqueued = registry.counter("push_jobs_enqueued_total", "Lots push enregistrés")
+push_tokens_sent = registry.counter("push_tokens_total", "Jetons traités par les envois push, par résultat")
+push_jobs_failed = registry.counter("push_jobs_failed_total", "Lots push abandonnés après toutes les tentatives")
+
+
+# ============ TRANSPORTS ============
+
+class PushTransport(ABC):
+    """Envoi d'un multicast; renvoie un résultat (OK, INVALID, RETRY) par jeton, dans l'ordre"""
+
+    @abstractmethod
+    def send_multicast(self, tokens: List[str], title: str, body: str, data: Dict[str, str]) -> List[str]:
+        """Envoie la notification à `tokens` (un seul appel au fournisseur)"""
+
+
+class FirebaseTransport(PushTransport):
+    """FCM via firebase_admin (send_each_for_multicast, 500 jetons au plus)"""
+
+    # Jeton définitivement inutilisable: à supprimer
+    INVALID_ERRORS = ("UnregisteredError", "SenderIdMismatchError", "InvalidArgumentError", "NotFoundError")
+
+    def send_multicast(self, tokens, title, body, data):
+        from .notifications import get_messaging
+
+        messaging = get_messaging()
+        if messaging is None:
+            raise RuntimeError("Firebase non configuré")
+        response = messaging.send_each_for_multicast(messaging.MulticastMessage(
+            tokens=tokens,
+            notification=messaging.Notification(title=title, body=body),
+            data={key: str(value) for key, value in (data or {}).items()},
+        ))
+        return [
+            OK if result.success else
+            INVALID if type(result.exception).__name__ in self.INVALID_ERRORS else RETRY
+            for result in response.responses
+        ]
+
+
+class FakePushTransport(PushTransport):
+    """Transport local: enregistre les envois; jetons invalides et échecs programmables"""
+
+    def __init__(self, invalid_tokens: Iterable[str] = (), failures: Dict[str, int] = None):
+        self.invalid_tokens = set(invalid_tokens)
+        # jeton -> nombre d'échecs temporaires avant succès
+        self.failures = dict(failures or {})
+        self.sent: List[dict] = []
+
+    def send_multicast(self, tokens, title, body, data):
+        self.sent.append({"tokens": list(tokens), "title": title, "body": body, "data": data})
+        results = []
+        for token in tokens:
+            if token in self.invalid_tokens:
+                results.append(INVALID)
+            elif self.failures.get(token, 0) > 0:
+                self.failures[token] -= 1
+                results.append(RETRY)
+            else:
+                results.append(OK)
+        return results
+
+
+def make_transport(name: str = None) -> PushTransport:
+    name = PUSH_TRANSPORT if name is None else name
+    if name == "fake":
+        return FakePushTransport()
+    return FirebaseTransport()
+
+
+# ============ FILE ============
+
+def backoff_delay(attempts: int, base: float = None, maximum: float = None) -> float:
+    """Délai avant la tentative suivante: base × 2^(tentatives - 1), plafonné"""
+    base = PUSH_BACKOFF_SECONDS if base is None else base
+    maximum = PUSH_BACKOFF_MAX_SECONDS if maximum is None else maximum
+    return min(maximum, base * 2 ** max(0, attempts - 1))
+
+
+class PushDispatcher:
+    """Enregistre les lots push et les fait traiter par un pool de workers"""
+
+    def __init__(self, session_factory=None, transport: PushTransport = None, workers: int = None,
+                 batch_size: int = None, max_attempts: int = None):
+        self.session_factory = session_factory or SessionLocal
+        self.transport = transport or make_transport()
+        self.workers = workers or PUSH_WORKERS
+        self.batch_size = batch_size or PUSH_BATCH_SIZE
+        self.max_attempts = max_attempts or PUSH_MAX_ATTEMPTS
+        self._tasks = []
+        self._wake: Optional[asyncio.Event] = None
+
+    # ============ ENREGISTREMENT ============
+
+    def enqueue(self, db: Session, user_ids: Optional[Iterable[int]], title: str, body: str,
+                data: Dict = None) -> int:
+        """Enregistre les lots pour `user_ids` (None = tous les utilisateurs actifs); renvoie le nombre de lots"""
+        # Tous les appareils des destinataires actifs (index device_tokens.user_id)
+        query = select(models.DeviceToken.token).join(
+            models.User, models.User.id == models.DeviceToken.user_id
+        ).filter(models.User.is_active == True)
+        if user_ids is not None:
+            query = query.filter(models.DeviceToken.user_id.in_(set(user_ids)))
+        tokens = list(dict.fromkeys(db.execute(query).scalars().all()))
+        if not tokens:
+            return 0
+
+        now = datetime.utcnow()
+        db.add_all([models.PushJob(
+            tokens=tokens[start:start + self.batch_size],
+            title=title,
+            body=body,
+            data=data or {},
+            status="pending",
+            attempts=0,
+            next_attempt_at=now,
+        ) for start in range(0, len(tokens), self.batch_size)])
+        db.commit()
+
+        jobs = -(-len(tokens) // self.batch_size)
+        push_jobs_enqueued.inc(jobs)
+        if self._wake is not None:
+            self._wake.set()
+        return jobs
+
+    # ============ TRAITEMENT ============
+
+    def claim(self) -> Optional[dict]:
+        """Réclame atomiquement le prochain lot dû (ou dont le bail a expiré)"""
+        now = datetime.utcnow()
+        job = models.PushJob
+        due = select(job.id).filter(
+            job.status.in_(("pending", "sending")),
+            job.next_attempt_at <= now
+        ).order_by(job.next_attempt_at).limit(1).with_for_update(skip_locked=True).scalar_subquery()
+        with self.session_factory() as db:
+            row = db.execute(
+                update(job).where(
+                    job.id == due,
+                    job.status.in_(("pending", "sending")),
+                    job.next_attempt_at <= now
+                ).values(
+                    status="sending",
+                    attempts=job.attempts + 1,
+                    next_attempt_at=now + timedelta(seconds=PUSH_LEASE_SECONDS)
+                ).returning(job.id, job.tokens, job.title, job.body, job.data, job.attempts)
+            ).mappings().first()
+            db.commit()
+        return dict(row) if row else None
+
+    def process(self, job: dict):
+        """Envoie un lot, supprime les jetons invalides et replanifie les jetons en échec"""
+        tokens = job["tokens"]
+        try:
+            results = self.transport.send_multicast(tokens, job["title"], job["body"], job["data"])
+            error = None
+        except Exception as e:
+            results, error = [RETRY] * len(tokens), str(e)
+
+        invalid = [token for token, result in zip(tokens, results) if result == INVALID]
+        retry = [token for token, result in zip(tokens, results) if result == RETRY]
+        for result in (OK, INVALID, RETRY):
+            push_tokens_sent.inc(results.count(result), result=result)
+
+        values = {"tokens": retry or tokens, "last_error": error}
+        if not retry:
+            values["status"] = "done"
+        elif job["attempts"] >= self.max_attempts:
+            values["status"] = "failed"
+            push_jobs_failed.inc()
+            logger.error(f"Lot push {job['id']} abandonné après {job['attempts']} tentatives: {error}")
+        else:
+            values["status"] = "pending"
+            values["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=backoff_delay(job["attempts"]))
+
+        with self.session_factory() as db:
+            if invalid:
+                # Jetons désinscrits: plus jamais d'envoi vers eux
+                db.execute(delete(models.DeviceToken).where(models.DeviceToken.token.in_(invalid)))
+            db.execute(update(models.PushJob).where(models.PushJob.id == job["id"]).values(**values))
+            db.commit()
+
+    def drain(self) -> int:
+        """Traite tous les lots dus, dans le thread courant (tests, tâches ponctuelles)"""
+        processed = 0
+        while True:
+            job = self.claim()
+            if job is None:
+                return processed
+            self.process(job)
+            processed += 1
+
+    # ============ WORKERS ============
+
+    def start(self):
+        """Démarre le pool de workers (idempotent) dans la boucle courante"""
+        if not self._tasks:
+            self._wake = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        self._wake = None
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await run_in_threadpool(self.claim)
+                if job is not None:
+                    await run_in_threadpool(self.process, job)
+                    continue
+            except Exception as e:
+                logger.error(f"Worker push: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), PUSH_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+push_dispatcher = PushDispatcher()
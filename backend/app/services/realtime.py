@@ -0,0 +1,225 @@
+"""
+Hub des connexions WebSocket temps réel.
+
+- Plusieurs connexions par utilisateur (téléphone + web): un ensemble par user_id.
+- Chaque connexion a une file d'envoi bornée, vidée par sa propre tâche
+  d'écriture: un destinataire lent ne bloque jamais l'expéditeur.
+- Consommateur lent: quand la file est pleine, la trame est abandonnée; après
+  WS_EVICT_AFTER_DROPS abandons consécutifs (ou un envoi bloqué plus de
+  WS_SEND_TIMEOUT secondes), la connexion est fermée (code 1013) et le client
+  se reconnecte.
+- Battements de cœur: {"type": "ping"} toutes les WS_PING_INTERVAL secondes;
+  sans {"type": "pong"} pendant WS_PING_TIMEOUT secondes, la connexion est fermée.
+- Multi-workers: `publish` passe par le broker (services/broker.py); chaque
+  worker s'abonne aux utilisateurs qui y sont connectés et livre localement.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Set
+
+from ..metrics import registry
+from .broker import Broker, make_broker
+
+logger = logging.getLogger(__name__)
+
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "100"))
+WS_EVICT_AFTER_DROPS = int(os.getenv("WS_EVICT_AFTER_DROPS", "20"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "25"))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", "60"))
+
+# Codes de fermeture WebSocket
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+ws_connections = registry.gauge("ws_connections", "Connexions WebSocket ouvertes")
+ws_users = registry.gauge("ws_connected_users", "Utilisateurs ayant au moins une connexion WebSocket")
+ws_queue_depth = registry.gauge("ws_queue_depth", "Trames en attente d'envoi, toutes connexions confondues")
+ws_frames_sent = registry.counter("ws_frames_sent_total", "Trames WebSocket envoyées")
+ws_frames_dropped = registry.counter("ws_frames_dropped_total", "Trames abandonnées (file d'envoi pleine)")
+ws_evictions = registry.counter("ws_evictions_total", "Connexions fermées par le serveur, par motif")
+
+
+class Connection:
+    """Une connexion WebSocket et sa file d'envoi bornée"""
+
+    def __init__(self, websocket, user_id: int, queue_size: int = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or WS_QUEUE_SIZE)
+        self.consecutive_drops = 0
+        self.last_pong = time.monotonic()
+        self.closed = False
+        self.tasks = []
+
+    def enqueue(self, frame: str) -> bool:
+        """Met une trame en file sans jamais attendre; False si elle a été abandonnée"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.consecutive_drops += 1
+            ws_frames_dropped.inc()
+            return False
+        self.consecutive_drops = 0
+        ws_queue_depth.inc()
+        return True
+
+
+class ConnectionHub:
+    """Registre des connexions par utilisateur et distribution des trames"""
+
+    def __init__(self, queue_size: int = None, evict_after_drops: int = None, send_timeout: float = None,
+                 ping_interval: float = None, ping_timeout: float = None, broker: Broker = None):
+        self.queue_size = queue_size or WS_QUEUE_SIZE
+        self.evict_after_drops = evict_after_drops or WS_EVICT_AFTER_DROPS
+        self.send_timeout = send_timeout or WS_SEND_TIMEOUT
+        self.ping_interval = ping_interval or WS_PING_INTERVAL
+        self.ping_timeout = ping_timeout or WS_PING_TIMEOUT
+        self.broker = broker or make_broker()
+        self._connections: Dict[int, Set[Connection]] = {}
+        self._started = False
+
+    # ============ CYCLE DE VIE ============
+
+    async def start(self):
+        """Démarre le broker (idempotent): au démarrage de l'application ou à la première connexion"""
+        if not self._started:
+            self._started = True
+            await self.broker.start(self._on_broker_message)
+
+    async def stop(self):
+        await self.close_all()
+        if self._started:
+            self._started = False
+            await self.broker.close()
+
+    async def connect(self, websocket, user_id: int, accepted: bool = False) -> Connection:
+        """Enregistre la connexion; `accepted`: poignée de main déjà faite (authentification par premier frame)"""
+        await self.start()
+        if not accepted:
+            await websocket.accept()
+        connection = Connection(websocket, user_id, self.queue_size)
+        if user_id not in self._connections:
+            # Premier appareil de l'utilisateur sur ce worker
+            await self.broker.subscribe(user_id)
+        self._connections.setdefault(user_id, set()).add(connection)
+        connection.tasks = [
+            asyncio.create_task(self._writer(connection)),
+            asyncio.create_task(self._heartbeat(connection)),
+        ]
+        ws_connections.inc()
+        ws_users.set(len(self._connections))
+        return connection
+
+    async def disconnect(self, connection: Connection, code: int = None, reason: str = None):
+        """Retire la connexion (idempotent); la ferme côté serveur si `code` est fourni"""
+        if connection.closed:
+            return
+        connection.closed = True
+
+        connections = self._connections.get(connection.user_id)
+        if connections is not None:
+            connections.discard(connection)
+            if not connections:
+                del self._connections[connection.user_id]
+                try:
+                    await self.broker.unsubscribe(connection.user_id)
+                except Exception as e:
+                    logger.error(f"Désabonnement du broker impossible: {e}")
+        ws_connections.dec()
+        ws_users.set(len(self._connections))
+        ws_queue_depth.dec(connection.queue.qsize())
+
+        current = asyncio.current_task()
+        for task in connection.tasks:
+            if task is not current:
+                task.cancel()
+
+        if code is not None:
+            ws_evictions.inc(reason=reason or str(code))
+            try:
+                await connection.websocket.close(code=code, reason=reason)
+            except Exception:
+                pass
+
+    async def close_all(self):
+        for connections in list(self._connections.values()):
+            for connection in list(connections):
+                await self.disconnect(connection, CLOSE_GOING_AWAY, "arrêt du serveur")
+
+    # ============ ENVOI ============
+
+    def is_connected(self, user_id: int) -> bool:
+        return bool(self._connections.get(user_id))
+
+    def connected_users(self) -> Set[int]:
+        return set(self._connections)
+
+    def connection_count(self, user_id: int = None) -> int:
+        if user_id is not None:
+            return len(self._connections.get(user_id, ()))
+        return sum(len(connections) for connections in self._connections.values())
+
+    def send(self, connection: Connection, payload: dict) -> bool:
+        """Livraison à une seule connexion (accusés, rattrapage à la reconnexion)"""
+        return connection.enqueue(json.dumps(payload, default=str))
+
+    def send_to_user(self, user_id: int, payload: dict) -> int:
+        """Livraison locale: met la trame en file pour chaque connexion de l'utilisateur sur ce worker"""
+        connections = self._connections.get(user_id)
+        if not connections:
+            return 0
+        frame = json.dumps(payload, default=str)
+        delivered = 0
+        for connection in list(connections):
+            if connection.enqueue(frame):
+                delivered += 1
+            elif connection.consecutive_drops >= self.evict_after_drops:
+                asyncio.create_task(self.disconnect(connection, CLOSE_TRY_AGAIN_LATER, "consommateur lent"))
+        return delivered
+
+    async def publish(self, user_id: int, payload: dict):
+        """Envoie une trame à l'utilisateur, quel que soit le worker auquel il est connecté"""
+        await self.start()
+        await self.broker.publish(user_id, payload)
+
+    async def _on_broker_message(self, user_id: int, payload: dict):
+        self.send_to_user(user_id, payload)
+
+    def handle_pong(self, connection: Connection):
+        connection.last_pong = time.monotonic()
+
+    # ============ TÂCHES PAR CONNEXION ============
+
+    async def _writer(self, connection: Connection):
+        """Vide la file d'envoi; un envoi bloqué trop longtemps évince la connexion"""
+        while True:
+            frame = await connection.queue.get()
+            ws_queue_depth.dec()
+            try:
+                await asyncio.wait_for(connection.websocket.send_text(frame), self.send_timeout)
+            except asyncio.TimeoutError:
+                await self.disconnect(connection, CLOSE_TRY_AGAIN_LATER, "envoi bloqué")
+                return
+            except Exception:
+                # Socket déjà fermée côté client: la boucle de réception fera le ménage
+                await self.disconnect(connection)
+                return
+            ws_frames_sent.inc()
+
+    async def _heartbeat(self, connection: Connection):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            if time.monotonic() - connection.last_pong > self.ping_timeout:
+                await self.disconnect(connection, CLOSE_GOING_AWAY, "battement de cœur manqué")
+                return
+            connection.enqueue(json.dumps({"type": "ping"}))
+
+
+hub = ConnectionHub()
@@ -0,0 +1,153 @@
+"""
+Rétention des notifications: purge périodique, par petits lots, avec archivage optionnel.
+
+- Politique: les notifications lues expirent après NOTIFICATION_READ_TTL_DAYS
+  jours, les non lues après NOTIFICATION_UNREAD_TTL_DAYS (date de dernière
+  activité, `created_at`). 0 désactive la purge correspondante.
+- Chaque lot (NOTIFICATION_PURGE_BATCH lignes, index (is_read, created_at))
+  est supprimé dans sa propre transaction, suivie d'une courte pause: le
+  verrou d'écriture n'est jamais tenu longtemps.
+- NOTIFICATION_ARCHIVE_DIR: les lignes sont d'abord ajoutées à un fichier
+  NDJSON compressé par jour (notifications-AAAA-MM-JJ.ndjson.gz); un lot
+  dont l'archivage échoue n'est pas supprimé.
+- Métriques: notifications_purged_total{state} et notifications_table_rows.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import select, delete, func
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..database import SessionLocal
+from ..metrics import registry
+from .unread import unread_counter
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_READ_TTL_DAYS = float(os.getenv("NOTIFICATION_READ_TTL_DAYS", "30"))
+NOTIFICATION_UNREAD_TTL_DAYS = float(os.getenv("NOTIFICATION_UNREAD_TTL_DAYS", "180"))
+NOTIFICATION_PURGE_BATCH = int(os.getenv("NOTIFICATION_PURGE_BATCH", "500"))
+NOTIFICATION_PURGE_PAUSE_MS = float(os.getenv("NOTIFICATION_PURGE_PAUSE_MS", "50"))
+NOTIFICATION_PURGE_INTERVAL = float(os.getenv("NOTIFICATION_PURGE_INTERVAL", "3600"))
+NOTIFICATION_ARCHIVE_DIR = os.getenv("NOTIFICATION_ARCHIVE_DIR", "")
+
+notifications_purged = registry.counter("notifications_purged_total", "Notifications supprimées par la rétention, par état")
+notifications_table_rows = registry.gauge("notifications_table_rows", "Lignes de la table notifications après la dernière purge")
+
+
+def notification_record(notification: models.Notification) -> dict:
+    """Ligne archivée (une ligne JSON par notification)"""
+    return {
+        "id": notification.id,
+        "user_id": notification.user_id,
+        "title": notification.title,
+        "message": notification.message,
+        "type": notification.type,
+        "data": notification.data,
+        "is_read": bool(notification.is_read),
+        "group_key": notification.group_key,
+        "actor_count": notification.actor_count,
+        "created_at": notification.created_at.isoformat() if notification.created_at else None,
+    }
+
+
+class NotificationRetention:
+    """Applique la politique de rétention des notifications"""
+
+    def __init__(self, session_factory=None, read_ttl_days: float = None, unread_ttl_days: float = None,
+                 batch_size: int = None, pause_ms: float = None, archive_dir: str = None,
+                 interval: float = None):
+        self.session_factory = session_factory or SessionLocal
+        self.read_ttl_days = NOTIFICATION_READ_TTL_DAYS if read_ttl_days is None else read_ttl_days
+        self.unread_ttl_days = NOTIFICATION_UNREAD_TTL_DAYS if unread_ttl_days is None else unread_ttl_days
+        self.batch_size = batch_size or NOTIFICATION_PURGE_BATCH
+        self.pause = (NOTIFICATION_PURGE_PAUSE_MS if pause_ms is None else pause_ms) / 1000
+        self.archive_dir = NOTIFICATION_ARCHIVE_DIR if archive_dir is None else archive_dir
+        self.interval = interval or NOTIFICATION_PURGE_INTERVAL
+        self._task = None
+
+    # ============ PURGE ============
+
+    def purge(self) -> int:
+        """Supprime toutes les notifications expirées, lot par lot; renvoie le nombre supprimé"""
+        now = datetime.utcnow()
+        purged = 0
+        for is_read, ttl_days in ((True, self.read_ttl_days), (False, self.unread_ttl_days)):
+            if ttl_days > 0:
+                purged += self._purge_state(is_read, now - timedelta(days=ttl_days))
+        with self.session_factory() as db:
+            notifications_table_rows.set(db.execute(select(func.count(models.Notification.id))).scalar())
+        return purged
+
+    def _purge_state(self, is_read: bool, cutoff: datetime) -> int:
+        state = "read" if is_read else "unread"
+        purged = 0
+        while True:
+            with self.session_factory() as db:
+                batch = db.execute(
+                    select(models.Notification).filter(
+                        models.Notification.is_read == is_read,
+                        models.Notification.created_at < cutoff
+                    ).order_by(models.Notification.created_at).limit(self.batch_size)
+                ).scalars().all()
+                if not batch:
+                    return purged
+                if self.archive_dir:
+                    self.archive(batch)
+                db.execute(delete(models.Notification).where(
+                    models.Notification.id.in_([notification.id for notification in batch])
+                ))
+                db.commit()
+
+            purged += len(batch)
+            notifications_purged.inc(len(batch), state=state)
+            if not is_read:
+                # Compteurs de non-lus en mémoire
+                for user_id, count in Counter(notification.user_id for notification in batch).items():
+                    unread_counter.adjust([user_id], -count)
+            if len(batch) < self.batch_size:
+                return purged
+            # Laisser passer les autres écritures entre deux lots
+            time.sleep(self.pause)
+
+    def archive(self, notifications: List[models.Notification]):
+        """Ajoute les notifications au fichier NDJSON compressé du jour"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"notifications-{datetime.utcnow():%Y-%m-%d}.ndjson.gz")
+        # Un membre gzip par lot: le fichier reste lisible d'un seul tenant
+        with gzip.open(path, "at", encoding="utf-8") as archive:
+            for notification in notifications:
+                archive.write(json.dumps(notification_record(notification), ensure_ascii=False, default=str) + "\n")
+
+    # ============ TÂCHE DE FOND ============
+
+    def start(self):
+        """Démarre la purge périodique (idempotent) dans la boucle courante"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                purged = await run_in_threadpool(self.purge)
+                if purged:
+                    logger.info(f"Rétention: {purged} notifications supprimées")
+            except Exception as e:
+                logger.error(f"Purge des notifications impossible: {e}")
+            await asyncio.sleep(self.interval)
+
+
+notification_retention = NotificationRetention()
@@ -0,0 +1,149 @@
+"""
+Compteurs de notifications non lues, en mémoire et poussés par WebSocket.
+
+- `get` sert le compteur depuis la mémoire; absent ou plus vieux que
+  UNREAD_CACHE_TTL secondes, il est recalculé en base (COUNT), qui reste la
+  référence. Le TTL borne l'écart quand un autre worker a modifié le compteur.
+  Un ajustement arrivé pendant ce calcul rend la valeur lue périmée: elle est
+  renvoyée sans être mise en mémoire (génération par utilisateur).
+- NotificationService ajuste les compteurs après chaque écriture (création,
+  lecture, suppression) et chaque changement est publié à l'utilisateur:
+  {"type": "unread_count", "count": n}. Le client reçoit aussi la valeur à
+  la connexion (/ws/{user_id}): il n'a plus besoin d'interroger
+  /notifications/unread-count.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+from ..database import AsyncSessionLocal
+from ..metrics import registry
+from .realtime import ConnectionHub, hub
+
+logger = logging.getLogger(__name__)
+
+UNREAD_CACHE_TTL = float(os.getenv("UNREAD_CACHE_TTL", "60"))
+UNREAD_CACHE_MAX_USERS = int(os.getenv("UNREAD_CACHE_MAX_USERS", "100000"))
+
+unread_cache_lookups = registry.counter("unread_cache_lookups_total", "Lectures du compteur de non-lus, par résultat")
+
+
+class UnreadCounter:
+    """Compteurs par utilisateur (LRU borné) et publication des changements"""
+
+    def __init__(self, realtime_hub: ConnectionHub = None, ttl: float = None, max_users: int = None,
+                 session_factory=None):
+        self.hub = realtime_hub or hub
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.ttl = UNREAD_CACHE_TTL if ttl is None else ttl
+        self.max_users = max_users or UNREAD_CACHE_MAX_USERS
+        # user_id -> [compteur, instant du dernier calcul en base]
+        self._counts: "OrderedDict[int, list]" = OrderedDict()
+        # user_id -> [calculs en base en cours, génération]; seulement pendant un calcul
+        self._loading: Dict[int, list] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def start(self):
+        """Mémorise la boucle de l'application: les écritures faites dans le threadpool publient par elle"""
+        self._loop = asyncio.get_running_loop()
+
+    def clear(self):
+        with self._lock:
+            self._counts.clear()
+            for user_id in self._loading:
+                self._bump_locked(user_id)
+
+    # ============ LECTURE ============
+
+    def get(self, user_id: int, load: Callable[[], int]) -> int:
+        """Compteur en mémoire, ou `load()` (COUNT en base) s'il est absent ou expiré"""
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl:
+                self._counts.move_to_end(user_id)
+                unread_cache_lookups.inc(result="hit")
+                return entry[0]
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[0] += 1
+            generation = loading[1]
+        unread_cache_lookups.inc(result="miss")
+        count = None
+        try:
+            count = load()
+        finally:
+            with self._lock:
+                loading = self._loading[user_id]
+                loading[0] -= 1
+                if not loading[0]:
+                    del self._loading[user_id]
+                # Compteur modifié pendant le calcul: la valeur lue peut précéder la modification
+                if count is not None and loading[1] == generation:
+                    self._store_locked(user_id, count)
+        return count
+
+    async def current(self, user_id: int) -> int:
+        """Compteur pour un contexte asynchrone (connexion WebSocket)"""
+        from .notifications import NotificationService
+
+        async with self.session_factory() as db:
+            return await db.run_sync(NotificationService.get_unread_notifications_count, user_id)
+
+    # ============ MISES À JOUR ============
+
+    def set(self, user_id: int, count: int):
+        """Valeur exacte (recalculée ou connue après écriture), publiée à l'utilisateur"""
+        self._store(user_id, count)
+        self._publish(user_id, count)
+
+    def adjust(self, user_ids: Optional[Iterable[int]], delta: int):
+        """Ajoute `delta` aux compteurs en mémoire (`None`: tous); les absents seront calculés à la lecture"""
+        changed = []
+        with self._lock:
+            targets = list(self._counts) if user_ids is None else list(user_ids)
+            for user_id in (self._loading if user_ids is None else targets):
+                self._bump_locked(user_id)
+            for user_id in targets:
+                entry = self._counts.get(user_id)
+                if entry is not None:
+                    entry[0] = max(0, entry[0] + delta)
+                    changed.append((user_id, entry[0]))
+        for user_id, count in changed:
+            self._publish(user_id, count)
+
+    def _store(self, user_id: int, count: int):
+        with self._lock:
+            self._bump_locked(user_id)
+            self._store_locked(user_id, count)
+
+    def _store_locked(self, user_id: int, count: int):
+        self._counts[user_id] = [count, time.monotonic()]
+        self._counts.move_to_end(user_id)
+        while len(self._counts) > self.max_users:
+            self._counts.popitem(last=False)
+
+    def _bump_locked(self, user_id: int):
+        """Invalide les calculs en base en cours pour `user_id`"""
+        loading = self._loading.get(user_id)
+        if loading is not None:
+            loading[1] += 1
+
+    # ============ PUBLICATION ============
+
+    def _publish(self, user_id: int, count: int):
+        frame = {"type": "unread_count", "count": count}
+        try:
+            asyncio.get_running_loop().create_task(self.hub.publish(user_id, frame))
+            return
+        except RuntimeError:
+            pass
+        # Appel depuis un thread du threadpool
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.hub.publish(user_id, frame), self._loop)
+
+
+unread_counter = UnreadCounter()
@@ -0,0 +1,185 @@
+"""
+Journal des requêtes SQL lentes.
+
+Toute instruction dont la durée dépasse le seuil configuré (voir
+SLOW_QUERY_THRESHOLD_MS dans database.py) est:
+- journalisée en JSON (une ligne par requête) dans un fichier à rotation,
+  avec la forme des paramètres liés (types, jamais les valeurs), la route
+  appelante et le plan d'exécution (EXPLAIN QUERY PLAN / EXPLAIN, jamais
+  ANALYZE: l'instruction n'est pas réexécutée);
+- agrégée en mémoire par forme d'instruction pour l'endpoint admin
+  GET /admin/slow-queries/ (pires requêtes par temps cumulé), au plus
+  SLOW_QUERY_MAX_SHAPES formes: les moins coûteuses sont oubliées.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from sqlalchemy import event
+
+from .instrumentation import current_route, normalize_statement
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MAX_SHAPES = int(os.getenv("SLOW_QUERY_MAX_SHAPES", "500"))
+# Routes retenues par forme d'instruction
+SLOW_QUERY_MAX_ROUTES = 20
+
+slow_queries_total = registry.counter("db_slow_queries_total", "Requêtes SQL au-delà du seuil de lenteur, par route")
+
+
+def parameter_shape(parameters):
+    """Types des paramètres liés: (int, str) ou {"id": "int"}; les valeurs ne sont jamais conservées"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def explain(conn, statement: str, parameters) -> list:
+    """Plan d'exécution de l'instruction, sur la connexion DBAPI brute (sans repasser par les événements).
+
+    Hors SQLite, l'EXPLAIN s'exécute dans un SAVEPOINT: en cas d'échec, seul
+    le savepoint est annulé et la transaction de la requête reste utilisable
+    (PostgreSQL annule sinon toute la transaction).
+    """
+    sqlite = conn.dialect.name == "sqlite"
+    prefix = "EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN "
+
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if sqlite:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        else:
+            cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = cursor.fetchall()
+            except Exception:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            finally:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+    # SQLite: (id, parent, notused, detail); PostgreSQL: une colonne de texte
+    return [str(row[-1]) for row in rows]
+
+
+class SlowQueryLog:
+    """Détecte, journalise et agrège les requêtes SQL lentes"""
+
+    def __init__(self, threshold_ms: float, log_file: str = None, max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5, max_shapes: int = None):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes or SLOW_QUERY_MAX_SHAPES
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file_logger = None
+        self._offenders = {}
+        self._lock = threading.Lock()
+
+    # ============ ÉVÉNEMENTS SQLALCHEMY ============
+
+    def install(self, engine):
+        """Branche la mesure sur un moteur synchrone (ou `async_engine.sync_engine`)"""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start_times = conn.info.get("slow_query_start")
+        if not start_times:
+            return
+        duration_ms = (time.perf_counter() - start_times.pop()) * 1000
+        if self.threshold_ms is None or duration_ms < self.threshold_ms:
+            return
+
+        plan = None
+        if not executemany:
+            try:
+                plan = explain(conn, statement, parameters)
+            except Exception as e:
+                plan = [f"EXPLAIN indisponible: {e}"]
+        self.record(statement, parameters, duration_ms, current_route(), plan)
+
+    # ============ JOURNAL ET AGRÉGATION ============
+
+    def record(self, statement: str, parameters, duration_ms: float, route: str = None, plan: list = None):
+        shape = normalize_statement(statement)
+        entry = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "route": route,
+            "statement": shape,
+            "parameters": parameter_shape(parameters),
+            "plan": plan,
+        }
+        with self._lock:
+            if shape not in self._offenders and len(self._offenders) >= self.max_shapes:
+                # Agrégat borné: la forme au plus faible temps cumulé laisse sa place
+                del self._offenders[min(self._offenders, key=lambda key: self._offenders[key]["total_ms"])]
+            offender = self._offenders.setdefault(shape, {
+                "statement": shape, "count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": set(),
+            })
+            offender["count"] += 1
+            offender["total_ms"] += duration_ms
+            offender["max_ms"] = max(offender["max_ms"], duration_ms)
+            if route and len(offender["routes"]) < SLOW_QUERY_MAX_ROUTES:
+                offender["routes"].add(route)
+            offender["parameters"] = entry["parameters"]
+            offender["plan"] = plan
+            offender["last_seen"] = entry["timestamp"]
+
+        slow_queries_total.inc(route=route or "hors requête")
+        self._write(entry)
+
+    def _write(self, entry: dict):
+        file_logger = self._get_file_logger()
+        if file_logger is not None:
+            file_logger.info(json.dumps(entry, ensure_ascii=False))
+        else:
+            logger.warning("Requête lente (%.1f ms) %s: %s", entry["duration_ms"], entry["route"], entry["statement"])
+
+    def _get_file_logger(self):
+        # Fichier ouvert au premier enregistrement seulement (pas d'effet de bord à l'import)
+        if self.log_file is None:
+            return None
+        if self._file_logger is None:
+            Path(self.log_file).parent.mkdir(parents=True, exist_ok=True)
+            handler = RotatingFileHandler(
+                self.log_file, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            # Logger dédié, hors hiérarchie: chaque journal garde son propre fichier
+            file_logger = logging.Logger(f"{__name__}.file", logging.INFO)
+            file_logger.addHandler(handler)
+            self._file_logger = file_logger
+        return self._file_logger
+
+    def top_offenders(self, limit: int = 20) -> list:
+        """Formes d'instructions les plus coûteuses, par temps cumulé décroissant"""
+        with self._lock:
+            offenders = sorted(self._offenders.values(), key=lambda o: o["total_ms"], reverse=True)[:limit]
+            return [{
+                **offender,
+                "total_ms": round(offender["total_ms"], 3),
+                "max_ms": round(offender["max_ms"], 3),
+                "avg_ms": round(offender["total_ms"] / offender["count"], 3),
+                "routes": sorted(offender["routes"]),
+            } for offender in offenders]
+
+    def reset(self):
+        with self._lock:
+            self._offenders.clear()
@@ -0,0 +1,92 @@
+"""
+Benchmark du débit d'écriture SQLite: profil par défaut vs profil de production.
+
+Plusieurs threads insèrent des posts en parallèle, chacun avec sa propre
+session, comme le ferait le threadpool de FastAPI.
+
+Usage (depuis backend/):
+    python -m benchmarks.sqlite_writes --threads 8 --writes 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, make_engine, SerializedWriter
+from app import models
+
+
+def run(engine, session_factory, threads: int, writes: int) -> dict:
+    Base.metadata.create_all(bind=engine)
+    with session_factory() as db:
+        author = models.User(unique_id="SP-00000", first_name="Bench", last_name="Mark", district="Korhogo")
+        db.add(author)
+        db.commit()
+        author_id = author.id
+
+    errors = []
+
+    def worker(n):
+        db = session_factory()
+        try:
+            for i in range(writes):
+                try:
+                    db.add(models.Post(content=f"post {n}-{i}", author_id=author_id))
+                    db.commit()
+                except OperationalError as e:
+                    db.rollback()
+                    errors.append(str(e))
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    committed = threads * writes - len(errors)
+    return {
+        "committed": committed,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "writes_per_second": committed / elapsed if elapsed else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Avant: moteur par défaut (journal rollback, synchronous=FULL, pas de sérialisation)
+        url = f"sqlite:///{os.path.join(tmp, 'before.db')}"
+        before_engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 0.1})
+        before = run(before_engine, sessionmaker(bind=before_engine), args.threads, args.writes)
+        before_engine.dispose()
+
+        # Après: profil de production + écrivain sérialisé
+        url = f"sqlite:///{os.path.join(tmp, 'after.db')}"
+        after_engine = make_engine(url)
+        after_factory = sessionmaker(bind=after_engine)
+        SerializedWriter().install(after_factory)
+        after = run(after_engine, after_factory, args.threads, args.writes)
+        after_engine.dispose()
+
+    for label, result in (("avant", before), ("après", after)):
+        print(
+            f"{label:>6}: {result['committed']} écritures en {result['seconds']:.2f}s "
+            f"({result['writes_per_second']:.0f}/s), {result['errors']} erreurs 'database is locked'"
+        )
+
+
+if __name__ == "__main__":
+    main()
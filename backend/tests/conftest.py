@@ -0,0 +1,155 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+from app.main import app
+from app.database import get_db, get_async_db, make_engine, make_async_engine, make_async_session_factory, \
+    SerializedWriter
+from app.migrations import upgrade_database
+from app.auth import create_access_token
+from app import models, instrumentation
+from app.services.chat import message_writer
+from app.services.push import push_dispatcher, FakePushTransport
+from app.services.unread import unread_counter
+from app.services.retention import notification_retention
+from app.services.outbox import outbox_dispatcher
+from app.services.images import image_pipeline
+
+
+@pytest.fixture(autouse=True)
+def strict_query_budget(monkeypatch):
+    """Toute route qui dépasse son budget SQL (ou boucle en N+1) fait échouer le test"""
+    monkeypatch.setattr(instrumentation, "SQL_QUERY_BUDGET_ENFORCE", True)
+
+
+@pytest.fixture(autouse=True)
+def fresh_unread_counts():
+    """Compteurs de non-lus en mémoire: propres à chaque base de test"""
+    unread_counter.clear()
+    yield
+    unread_counter.clear()
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """Base SQLite temporaire migrée jusqu'à la dernière révision Alembic"""
+    test_engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    upgrade_database(test_engine)
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def async_engine(engine):
+    """Moteur asynchrone sur le même fichier que `engine`"""
+    test_async_engine = make_async_engine(str(engine.url))
+    yield test_async_engine
+    test_async_engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def writer():
+    """Verrou d'écriture du processus, propre à la base de test"""
+    return SerializedWriter()
+
+
+@pytest.fixture
+def session_factory(engine, writer):
+    # Comme SessionLocal sur SQLite: écritures synchrones sous le verrou du processus
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    writer.install(factory)
+    return factory
+
+
+@pytest.fixture
+def client(session_factory, async_engine, writer, monkeypatch):
+    # Même fabrique que AsyncSessionLocal: sessions sérialisées avec les écritures synchrones
+    async_session_factory = make_async_session_factory(async_engine, writer)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    previous = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    # Messages WebSocket: écriture et rattrapage sur la base de test
+    monkeypatch.setattr(message_writer, "session_factory", async_session_factory)
+    monkeypatch.setattr(unread_counter, "session_factory", async_session_factory)
+    # Envois push: base de test et transport local
+    monkeypatch.setattr(push_dispatcher, "session_factory", session_factory)
+    monkeypatch.setattr(push_dispatcher, "transport", FakePushTransport())
+    monkeypatch.setattr(notification_retention, "session_factory", session_factory)
+    monkeypatch.setattr(outbox_dispatcher, "session_factory", session_factory)
+    # Variantes d'images: base de test, rendu dans le threadpool
+    monkeypatch.setattr(image_pipeline, "session_factory", session_factory)
+    monkeypatch.setattr(image_pipeline, "workers", 0)
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
+
+
+@pytest.fixture
+def seed(session_factory):
+    """Jeu de données minimal couvrant toutes les tables interrogées par les routers"""
+    db = session_factory()
+    alice = models.User(unique_id="SP-10001", email="alice@poro.ci", first_name="Alice", last_name="Koné",
+                        district="Korhogo", is_admin=True)
+    bob = models.User(unique_id="SP-10002", email="bob@poro.ci", first_name="Bob", last_name="Ouattara",
+                      district="Sinématiali")
+    db.add_all([alice, bob])
+    db.flush()
+
+    post = models.Post(content="Campagne de vaccination", author_id=alice.id)
+    event = models.Event(title="Formation PEV", description="Chaîne du froid", category="formation",
+                         date="2026-11-02", time="09:00 - 12:00", location="CHR Korhogo",
+                         district="Korhogo", organizer="DDS", author_id=alice.id)
+    poll = models.Poll(question="Disponibilité des vaccins ?", author_id=alice.id)
+    article = models.HealthArticle(title="Paludisme", summary="Prévention", content="MILDA",
+                                   category="prevention", author_id=alice.id)
+    protocol = models.HealthProtocol(title="PCIME", content="Étapes", category="treatment",
+                                     author_id=alice.id, is_public=True)
+    contact = models.EmergencyContact(name="SAMU", phone="185", type="emergency", district="Korhogo")
+    db.add_all([post, event, poll, article, protocol, contact])
+    db.flush()
+
+    option = models.PollOption(poll_id=poll.id, text="Oui", votes=1)
+    message = models.Message(content="Bonjour", sender_id=bob.id, receiver_id=alice.id)
+    db.add_all([option, message])
+    db.flush()
+
+    conversation = models.Conversation(user1_id=alice.id, user2_id=bob.id, last_message_id=message.id)
+    db.add(conversation)
+    db.flush()
+    message.conversation_id = conversation.id
+    db.add_all([
+        models.PollVote(poll_id=poll.id, option_id=option.id, user_id=bob.id),
+        models.Like(post_id=post.id, user_id=bob.id),
+        models.Comment(content="Merci", post_id=post.id, author_id=bob.id),
+        models.Follow(follower_id=bob.id, following_id=alice.id),
+        models.EventRegistration(event_id=event.id, user_id=bob.id),
+        models.HealthArticleLike(article_id=article.id, user_id=bob.id),
+        models.HealthArticleBookmark(article_id=article.id, user_id=alice.id),
+        models.Notification(user_id=alice.id, title="Bienvenue", message="Bienvenue sur Santé Poro"),
+    ])
+    db.commit()
+
+    data = {
+        "alice_id": alice.id, "bob_id": bob.id, "post_id": post.id, "event_id": event.id,
+        "poll_id": poll.id, "article_id": article.id, "protocol_id": protocol.id,
+        "contact_id": contact.id, "conversation_id": conversation.id,
+    }
+    db.close()
+    return data
+
+
+@pytest.fixture
+def auth_headers(seed):
+    token = create_access_token(data={"sub": seed["alice_id"]})
+    return {"Authorization": f"Bearer {token}"}
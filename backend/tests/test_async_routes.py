@@ -0,0 +1,120 @@
+"""Parcours d'écriture sur les routers asynchrones (auth, posts, follows, events, notifications)"""
+import asyncio
+import httpx
+from app import models
+from app.auth import create_access_token
+from app.main import app
+
+
+def headers_for(user_id):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user_id})}"}
+
+
+def test_register_and_login(client, seed):
+    response = client.post("/api/v1/auth/register", json={
+        "email": "awa@poro.ci", "username": "awa", "password": "secret123",
+        "first_name": "Awa", "last_name": "Silué", "district": "Korhogo",
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["user"]["unique_id"].startswith("SP-")
+
+    response = client.post("/api/v1/auth/login", data={"username": "awa@poro.ci", "password": "secret123"})
+    assert response.status_code == 200, response.text
+    token = response.json()["access_token"]
+
+    response = client.get("/api/v1/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.json()["email"] == "awa@poro.ci"
+
+
+def test_post_like_comment_cycle(client, seed, auth_headers):
+    response = client.post("/api/v1/posts/", json={"content": "Rupture de stock ACT"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    post_id = response.json()["id"]
+    assert response.json()["author"]["id"] == seed["alice_id"]
+
+    bob = headers_for(seed["bob_id"])
+    assert client.post(f"/api/v1/posts/{post_id}/like", headers=bob).status_code == 200
+    assert client.post(f"/api/v1/posts/{post_id}/like", headers=bob).status_code == 400
+    response = client.post(f"/api/v1/posts/{post_id}/comments", json={"content": "Reçu"}, headers=bob)
+    assert response.status_code == 200, response.text
+
+    details = client.get(f"/api/v1/posts/{post_id}", headers=auth_headers).json()
+    assert details["likes_count"] == 1
+    assert details["comments_count"] == 1
+    assert details["comments"][0]["author"]["id"] == seed["bob_id"]
+
+    assert client.delete(f"/api/v1/posts/{post_id}", headers=auth_headers).status_code == 200
+    assert client.get(f"/api/v1/posts/{post_id}", headers=auth_headers).status_code == 404
+
+
+def test_follow_unfollow(client, seed, auth_headers):
+    response = client.post(f"/api/v1/follows/{seed['bob_id']}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["following"]["id"] == seed["bob_id"]
+
+    following = client.get("/api/v1/follows/following", headers=auth_headers).json()
+    assert [u["id"] for u in following] == [seed["bob_id"]]
+
+    assert client.delete(f"/api/v1/follows/{seed['bob_id']}", headers=auth_headers).status_code == 200
+    assert client.get("/api/v1/follows/following", headers=auth_headers).json() == []
+
+
+def test_event_registration(client, seed, auth_headers):
+    response = client.post("/api/v1/events/", headers=auth_headers, json={
+        "title": "Réunion CSU", "description": "Bilan", "category": "reunion", "date": "2026-12-01",
+        "time": "10:00 - 11:00", "location": "Ferké", "district": "Ferkessédougou",
+        "organizer": "DDS", "max_participants": 1,
+    })
+    assert response.status_code == 200, response.text
+    event_id = response.json()["id"]
+
+    assert client.post(f"/api/v1/events/{event_id}/register", headers=auth_headers).status_code == 200
+    bob = headers_for(seed["bob_id"])
+    assert client.post(f"/api/v1/events/{event_id}/register", headers=bob).status_code == 400
+
+    event = client.get(f"/api/v1/events/{event_id}", headers=auth_headers).json()
+    assert event["registered_count"] == 1
+    assert event["is_registered"] is True
+
+
+def test_send_message(client, seed, auth_headers):
+    response = client.post("/api/v1/events/messages", headers=auth_headers,
+                           json={"receiver_id": seed["bob_id"], "content": "Les doses sont arrivées"})
+    assert response.status_code == 200, response.text
+    assert response.json()["receiver"]["id"] == seed["bob_id"]
+
+
+def test_notifications_mark_read(client, seed, auth_headers):
+    assert client.get("/api/v1/notifications/unread-count", headers=auth_headers).json() == {"unread_count": 1}
+    assert client.post("/api/v1/notifications/mark-all-read", headers=auth_headers).status_code == 200
+    assert client.get("/api/v1/notifications/unread-count", headers=auth_headers).json() == {"unread_count": 0}
+
+
+def test_concurrent_sync_and_async_writes_share_the_writer_lock(client, seed, auth_headers, writer, session_factory,
+                                                               monkeypatch):
+    acquired = []
+    acquire_async = writer.acquire_async
+
+    async def recording_acquire_async(session):
+        await acquire_async(session)
+        acquired.append(session.info.get("holds_write_lock"))
+    monkeypatch.setattr(writer, "acquire_async", recording_acquire_async)
+
+    async def scenario():
+        # Même boucle pour toutes les requêtes: routes async (posts) et sync (profil, threadpool) entrelacées
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post("/api/v1/posts/", json={"content": f"Rapport {i}"}, headers=auth_headers) if i % 2 else
+                http.put("/api/v1/users/me", json={"bio": f"Version {i}"}, headers=auth_headers)
+                for i in range(12)
+            ))
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [200] * 12
+    assert acquired and all(acquired)
+    assert not writer._lock.locked()
+
+    db = session_factory()
+    assert db.query(models.Post).filter(models.Post.content.like("Rapport %")).count() == 6
+    db.close()
@@ -0,0 +1,45 @@
+"""Annonces générales: une ligne par annonce, fusion avec les notifications personnelles à la lecture"""
+from app import models
+from app.auth import create_access_token
+
+NOTIFICATIONS = "/api/v1/notifications"
+
+
+def test_send_all_stores_a_single_row(client, seed, auth_headers, session_factory):
+    response = client.post(f"{NOTIFICATIONS}/admin/send-all/", headers=auth_headers, json={
+        "user_id": seed["alice_id"], "title": "Alerte choléra", "message": "Renforcer la surveillance",
+        "type": "warning",
+    })
+    assert response.status_code == 200, response.text
+
+    db = session_factory()
+    assert db.query(models.BroadcastNotification).count() == 1
+    assert db.query(models.Notification).filter(models.Notification.title == "Alerte choléra").count() == 0
+    db.close()
+
+
+def test_broadcasts_are_merged_read_and_dismissed_per_user(client, seed, auth_headers):
+    bob_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': seed['bob_id']})}"}
+    for title in ("Annonce 1", "Annonce 2"):
+        client.post(f"{NOTIFICATIONS}/admin/send-all/", headers=auth_headers,
+                    json={"user_id": seed["alice_id"], "title": title, "message": "..."})
+
+    # Alice: notification personnelle du jeu de données + 2 annonces, les plus récentes d'abord
+    notifications = client.get(f"{NOTIFICATIONS}/", headers=auth_headers).json()
+    assert [n["title"] for n in notifications] == ["Annonce 2", "Annonce 1", "Bienvenue"]
+    assert [n["is_broadcast"] for n in notifications] == [True, True, False]
+    assert client.get(f"{NOTIFICATIONS}/unread-count", headers=auth_headers).json() == {"unread_count": 3}
+
+    latest, first = notifications[0]["id"], notifications[1]["id"]
+    assert client.post(f"{NOTIFICATIONS}/mark-read/{first}?broadcast=true", headers=auth_headers).status_code == 200
+    assert client.delete(f"{NOTIFICATIONS}/{latest}?broadcast=true", headers=auth_headers).status_code == 200
+    notifications = client.get(f"{NOTIFICATIONS}/", headers=auth_headers).json()
+    assert [(n["title"], n["is_read"]) for n in notifications] == [("Annonce 1", True), ("Bienvenue", False)]
+    assert client.get(f"{NOTIFICATIONS}/unread-count", headers=auth_headers).json() == {"unread_count": 1}
+
+    # Bob n'est pas concerné par les choix d'Alice; "tout marquer comme lu" avance son repère
+    assert client.get(f"{NOTIFICATIONS}/unread-count", headers=bob_headers).json() == {"unread_count": 2}
+    response = client.post(f"{NOTIFICATIONS}/mark-all-read", headers=bob_headers)
+    assert response.json() == {"message": "2 notifications marquées comme lues"}
+    assert client.get(f"{NOTIFICATIONS}/unread-count", headers=bob_headers).json() == {"unread_count": 0}
+    assert all(n["is_read"] for n in client.get(f"{NOTIFICATIONS}/", headers=bob_headers).json())
@@ -0,0 +1,147 @@
+"""
+Diffusion temps réel entre workers: deux hubs (deux « workers ») partagent
+un broker; un utilisateur connecté à l'un reçoit ce que l'autre publie.
+
+Le backend Redis est testé contre REDIS_URL si défini, sinon contre un petit
+serveur local parlant le protocole Redis (RESP) limité au pub/sub.
+"""
+import asyncio
+import os
+import pytest
+from app.services.broker import Broker, InProcessBroker, RedisBroker, make_broker
+from app.services.realtime import ConnectionHub
+from .test_realtime import FakeWebSocket
+
+
+class RespPubSubServer:
+    """Serveur minimal: SUBSCRIBE, UNSUBSCRIBE, PUBLISH, PING (+OK pour le reste)"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self.server = None
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @staticmethod
+    def encode(value) -> bytes:
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(RespPubSubServer.encode(item) for item in value)
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    @staticmethod
+    async def read_command(reader) -> list:
+        header = await reader.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def handle(self, reader, writer):
+        channels = set()
+        try:
+            while (command := await self.read_command(reader)) is not None:
+                name, args = command[0].upper(), command[1:]
+                if name == b"SUBSCRIBE":
+                    for channel in args:
+                        channels.add(channel)
+                        self.subscribers.setdefault(channel, set()).add(writer)
+                        writer.write(self.encode([b"subscribe", channel, len(channels)]))
+                elif name == b"UNSUBSCRIBE":
+                    for channel in args:
+                        channels.discard(channel)
+                        self.subscribers.get(channel, set()).discard(writer)
+                        writer.write(self.encode([b"unsubscribe", channel, len(channels)]))
+                elif name == b"PUBLISH":
+                    receivers = self.subscribers.get(args[0], set())
+                    for receiver in receivers:
+                        receiver.write(self.encode([b"message", args[0], args[1]]))
+                    writer.write(self.encode(len(receivers)))
+                elif name == b"PING":
+                    writer.write(b"+PONG\r\n")
+                else:
+                    writer.write(b"+OK\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in channels:
+                self.subscribers.get(channel, set()).discard(writer)
+            writer.close()
+
+
+async def wait_for(predicate, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "délai dépassé"
+        await asyncio.sleep(0.01)
+
+
+def test_make_broker_selects_backend_from_url():
+    assert isinstance(make_broker(""), InProcessBroker)
+    assert isinstance(make_broker("redis://localhost:6379/0"), RedisBroker)
+
+
+def test_in_process_broker_delivers_to_local_subscribers():
+    async def scenario():
+        hub = ConnectionHub(broker=InProcessBroker(), ping_interval=60)
+        socket = FakeWebSocket()
+        await hub.connect(socket, user_id=1)
+        await hub.publish(1, {"type": "new_message"})
+        await hub.publish(2, {"type": "personne"})  # utilisateur non connecté: ignoré
+        await wait_for(lambda: socket.sent)
+        assert socket.sent == [{"type": "new_message"}]
+        await hub.stop()
+
+    asyncio.run(scenario())
+
+
+def test_redis_broker_fans_out_across_workers():
+    pytest.importorskip("redis")
+
+    async def scenario():
+        server = None
+        url = os.getenv("REDIS_URL")
+        if not url:
+            server = RespPubSubServer()
+            url = await server.start()
+
+        worker_a = ConnectionHub(broker=RedisBroker(url, channel_prefix="test"), ping_interval=60)
+        worker_b = ConnectionHub(broker=RedisBroker(url, channel_prefix="test"), ping_interval=60)
+        await worker_a.start()
+        await worker_b.start()
+        try:
+            socket = FakeWebSocket()
+            connection = await worker_a.connect(socket, user_id=42)
+            await asyncio.sleep(0.05)  # abonnement effectif côté serveur
+
+            await worker_b.publish(42, {"type": "typing_status", "sender_id": 7})
+            await wait_for(lambda: socket.sent)
+            assert socket.sent == [{"type": "typing_status", "sender_id": 7}]
+
+            # Après déconnexion, le worker A se désabonne
+            await worker_a.disconnect(connection)
+            assert 42 not in worker_a.broker.subscriptions
+        finally:
+            await worker_a.stop()
+            await worker_b.stop()
+            if server is not None:
+                await server.stop()
+
+    asyncio.run(scenario())
+
+
+def test_broker_interface_requires_publish():
+    with pytest.raises(TypeError):
+        Broker()
@@ -0,0 +1,50 @@
+"""Notifications groupées: insertions multi-lignes par paquets, une seule transaction"""
+from sqlalchemy import event
+from app import models
+from app.services.notifications import NotificationService
+
+
+def add_agents(session_factory, count: int):
+    db = session_factory()
+    db.add_all([
+        models.User(unique_id=f"SP-2{i:04d}", email=f"agent{i}@poro.ci", first_name="Agent", last_name=str(i),
+                    district="Korhogo")
+        for i in range(count)
+    ])
+    db.commit()
+    db.close()
+
+
+def test_all_users_alert_is_chunked_in_one_transaction(seed, engine, session_factory):
+    add_agents(session_factory, 25)
+    statements, commits = [], []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement.split()[0].upper()))
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+
+    db = session_factory()
+    count = NotificationService.create_notification_for_all_users(
+        db, "Alerte", "Rupture de stock d'ACT", "warning", {"district": "Korhogo"}, chunk_size=10
+    )
+    db.close()
+
+    assert count == 27
+    assert statements.count("INSERT") == 3
+    assert statements.count("SELECT") == 1
+    assert len(commits) == 1
+
+    db = session_factory()
+    assert db.query(models.Notification).filter(models.Notification.title == "Alerte").count() == 27
+    db.close()
+
+
+def test_bulk_notifications_skip_unknown_and_duplicate_ids(client, seed, auth_headers, session_factory):
+    response = client.post("/api/v1/notifications/admin/send-bulk/", headers=auth_headers, json={
+        "user_ids": [seed["bob_id"], seed["bob_id"], 999], "title": "Réunion", "message": "Lundi 9h",
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["message"].startswith("1 notifications")
+
+    db = session_factory()
+    assert db.query(models.Notification).filter(models.Notification.title == "Réunion").count() == 1
+    db.close()
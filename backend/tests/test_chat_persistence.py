@@ -0,0 +1,136 @@
+"""Messages WebSocket: acquittement immédiat, écriture différée par lots, rattrapage à la reconnexion"""
+import asyncio
+import json
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app import main, models
+from app.services import chat
+from app.services.chat import MessageWriteBehind
+from app.services.realtime import ConnectionHub
+from tests.test_realtime import FakeWebSocket, ws_url
+
+
+def test_socket_message_is_acked_persisted_and_delivered_on_reconnect(client, seed, session_factory, monkeypatch):
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    alice_id, bob_id = seed["alice_id"], seed["bob_id"]
+
+    with client:
+        with client.websocket_connect(ws_url(bob_id)) as bob:
+            assert bob.receive_json()["type"] == "unread_count"
+            bob.send_text(json.dumps({"type": "message", "recipient_id": alice_id,
+                                      "data": {"content": "Stock de SRO épuisé", "client_id": "c1"}}))
+            assert bob.receive_json() == {"type": "message_ack", "client_id": "c1"}
+            saved = bob.receive_json()
+            assert saved["type"] == "message_saved" and saved["client_id"] == "c1"
+
+        db = session_factory()
+        message = db.get(models.Message, saved["message_id"])
+        assert message.content == "Stock de SRO épuisé"
+        assert message.conversation_id == seed["conversation_id"]
+        assert db.get(models.Conversation, seed["conversation_id"]).last_message_id == message.id
+        db.close()
+
+        # Alice était hors ligne: ses non-lus lui sont livrés à la connexion
+        with client.websocket_connect(ws_url(alice_id)) as alice:
+            assert alice.receive_json() == {"type": "unread_count", "count": 1}
+            contents = [alice.receive_json()["data"]["content"] for _ in range(2)]
+        assert contents == ["Bonjour", "Stock de SRO épuisé"]
+
+        # Avec `since`, seuls les messages postérieurs sont renvoyés
+        with client.websocket_connect(ws_url(alice_id, f"&since={saved['message_id'] - 1}")) as alice:
+            alice.receive_json()
+            assert alice.receive_json()["data"]["id"] == saved["message_id"]
+
+
+def test_queued_messages_are_written_in_one_transaction(seed, session_factory, async_engine):
+    db = session_factory()
+    carol = models.User(unique_id="SP-10003", email="carol@poro.ci", first_name="Carol", last_name="Yéo",
+                        district="Korhogo")
+    db.add(carol)
+    db.commit()
+    carol_id = carol.id
+    db.close()
+    alice_id, bob_id = seed["alice_id"], seed["bob_id"]
+
+    statements = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement.split()[0].upper()))
+
+    async def scenario():
+        hub = ConnectionHub(ping_interval=60)
+        carol_socket = FakeWebSocket()
+        await hub.connect(carol_socket, user_id=carol_id)
+        writer = MessageWriteBehind(async_sessionmaker(async_engine, expire_on_commit=False), hub,
+                                    flush_interval_ms=20)
+        for i in range(30):
+            assert writer.submit(alice_id, carol_id if i % 2 else bob_id, f"Message {i}")
+        assert writer.submit(alice_id, 999, "Inconnu", client_id="x")
+        await writer.stop()
+        await asyncio.sleep(0.01)
+        await hub.close_all()
+        return carol_socket.sent
+
+    carol_frames = asyncio.run(scenario())
+
+    # Destinataires, conversations, conversation créée, messages, last_message_id: une transaction
+    # (SQLite: insertion ordonnée ligne par ligne; une seule requête multi-lignes sur PostgreSQL)
+    assert statements.count("INSERT") == 1 + 30
+    assert statements.count("UPDATE") == 1
+    assert [frame["data"]["content"] for frame in carol_frames] == [f"Message {i}" for i in range(1, 30, 2)]
+
+    db = session_factory()
+    conversation = db.query(models.Conversation).filter(models.Conversation.user2_id == carol_id).one()
+    assert conversation.last_message_id == carol_frames[-1]["data"]["id"]
+    assert db.query(models.Message).filter(models.Message.content.like("Message %")).count() == 30
+    db.close()
+
+
+def test_one_bad_message_does_not_lose_its_batch(seed, async_engine):
+    alice_id, bob_id = seed["alice_id"], seed["bob_id"]
+
+    async def scenario():
+        hub = ConnectionHub(ping_interval=60)
+        alice_socket = FakeWebSocket()
+        await hub.connect(alice_socket, user_id=alice_id)
+        writer = MessageWriteBehind(async_sessionmaker(async_engine, expire_on_commit=False), hub,
+                                    flush_interval_ms=20)
+        with pytest.raises(ValueError):
+            writer.submit(alice_id, "bob", "Identifiant texte")
+        assert writer.submit(alice_id, bob_id, "Avant", client_id="a")
+        # Identifiant hors des entiers SQLite: la transaction du lot échoue
+        assert writer.submit(alice_id, 2 ** 70, "Hors limites", client_id="b")
+        assert writer.submit(alice_id, bob_id, "Après", client_id="c")
+        await writer.stop()
+        await asyncio.sleep(0.01)
+        await hub.close_all()
+        return alice_socket.sent
+
+    frames = asyncio.run(scenario())
+    assert [(frame["type"], frame["client_id"]) for frame in frames] == [
+        ("message_saved", "a"), ("message_saved", "c"), ("message_error", "b")
+    ]
+    assert frames[-1]["detail"] == "Message non enregistré"
+
+
+def test_reconnect_delivers_the_newest_unread_messages(seed, session_factory, async_engine, monkeypatch):
+    monkeypatch.setattr(chat, "CHAT_PENDING_DELIVERY_MAX", 5)
+    alice_id, bob_id = seed["alice_id"], seed["bob_id"]
+    db = session_factory()
+    db.add_all([models.Message(content=f"Relance {i}", sender_id=bob_id, receiver_id=alice_id,
+                               conversation_id=seed["conversation_id"], is_read=False) for i in range(8)])
+    db.commit()
+    db.close()
+
+    async def scenario():
+        hub = ConnectionHub(ping_interval=60)
+        alice_socket = FakeWebSocket()
+        connection = await hub.connect(alice_socket, user_id=alice_id)
+        writer = MessageWriteBehind(async_sessionmaker(async_engine, expire_on_commit=False), hub)
+        assert await writer.deliver_pending(connection) == 5
+        await asyncio.sleep(0.01)
+        await hub.close_all()
+        return alice_socket.sent
+
+    # 9 non-lus (dont "Bonjour"): les 5 plus récents, du plus ancien au plus récent
+    assert [frame["data"]["content"] for frame in asyncio.run(scenario())] == [f"Relance {i}" for i in range(3, 8)]
@@ -0,0 +1,71 @@
+"""Regroupement des signaux de saisie et des accusés de lecture"""
+import asyncio
+from app.services.coalescing import SignalCoalescer
+
+
+class RecordingHub:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, user_id: int, payload: dict):
+        self.published.append((user_id, payload))
+
+
+def test_typing_burst_is_coalesced():
+    async def scenario():
+        hub = RecordingHub()
+        coalescer = SignalCoalescer(hub, interval_ms=50, typing_refresh=60)
+        # Une frappe toutes les 5 ms pendant 0,25 s, puis arrêt de la saisie
+        for _ in range(50):
+            await coalescer.typing(1, 2, True)
+            await asyncio.sleep(0.005)
+        await coalescer.typing(1, 2, False)
+        await asyncio.sleep(0.12)
+        await coalescer.stop()
+        return hub.published
+
+    published = asyncio.run(scenario())
+    assert [payload["is_typing"] for _, payload in published] == [True, False]
+    assert all(user_id == 2 and payload["sender_id"] == 1 for user_id, payload in published)
+
+
+def test_read_receipts_collapse_to_high_water_mark():
+    async def scenario():
+        hub = RecordingHub()
+        coalescer = SignalCoalescer(hub, interval_ms=20)
+        for message_id in [3, 1, 40, 12]:
+            coalescer.read_receipt(reader_id=2, sender_id=1, message_id=message_id)
+        coalescer.read_receipt(reader_id=3, sender_id=1, message_id=5)
+        await asyncio.sleep(0.05)
+        await coalescer.stop()
+        return hub.published
+
+    assert sorted(asyncio.run(scenario()), key=lambda item: item[1]["reader_id"]) == [
+        (1, {"type": "message_read", "reader_id": 2, "message_id": 40}),
+        (1, {"type": "message_read", "reader_id": 3, "message_id": 5}),
+    ]
+
+
+def test_abandoned_typing_state_expires_and_ends_on_disconnect():
+    async def scenario():
+        hub = RecordingHub()
+        coalescer = SignalCoalescer(hub, interval_ms=10, typing_refresh=0.05)
+        # Client coupé pendant la saisie: aucun "is_typing: false" ne viendra
+        await coalescer.typing(1, 2, True)
+        await asyncio.sleep(0.1)
+        expired = list(hub.published)
+        assert coalescer._typing == {}
+
+        # Déconnexion de l'expéditeur: fin immédiate de ses saisies
+        await coalescer.typing(1, 3, True)
+        await coalescer.typing(4, 3, True)
+        await coalescer.disconnect(1)
+        assert list(coalescer._typing) == [(4, 3)]
+        await coalescer.stop()
+        return expired, hub.published[len(expired):]
+
+    expired, disconnected = asyncio.run(scenario())
+    assert [(user_id, payload["is_typing"]) for user_id, payload in expired] == [(2, True), (2, False)]
+    assert [(user_id, payload["sender_id"], payload["is_typing"]) for user_id, payload in disconnected] == [
+        (3, 1, True), (3, 4, True), (3, 1, False)
+    ]
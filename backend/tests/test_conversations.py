@@ -0,0 +1,158 @@
+"""Pagination par curseur des messages d'une conversation et marquage « lu » groupé"""
+from sqlalchemy import event
+from app import models
+from app.auth import create_access_token
+
+
+def test_conversation_messages_are_paginated_newest_first(client, seed, auth_headers, session_factory):
+    db = session_factory()
+    carol = models.User(unique_id="SP-10003", email="carol@poro.ci", first_name="Carol", last_name="Yéo",
+                         district="Ferkessédougou")
+    db.add(carol)
+    db.flush()
+    # Message d'une autre conversation: ne doit jamais apparaître
+    db.add(models.Message(content="Hors sujet", sender_id=carol.id, receiver_id=seed["alice_id"]))
+    db.add_all([
+        models.Message(content=f"Message {i}", sender_id=seed["bob_id"], receiver_id=seed["alice_id"],
+                       conversation_id=seed["conversation_id"])
+        for i in range(5)
+    ])
+    db.commit()
+    db.close()
+
+    path = f"/api/v1/events/conversations/{seed['conversation_id']}"
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "before": cursor}
+        page = client.get(path, params=params, headers=auth_headers).json()
+        seen.extend(message["content"] for message in page["messages"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    # Seed: "Bonjour", puis Message 0..4
+    assert seen == ["Message 4", "Message 3", "Message 2", "Message 1", "Message 0", "Bonjour"]
+
+
+def test_opening_a_page_marks_received_messages_read(client, seed, auth_headers, session_factory):
+    path = f"/api/v1/events/conversations/{seed['conversation_id']}"
+
+    # Bob ouvre la conversation: le message qu'il a envoyé reste non lu
+    bob = {"Authorization": f"Bearer {create_access_token(data={'sub': seed['bob_id']})}"}
+    assert client.get(path, headers=bob).json()["messages"][0]["is_read"] is False
+
+    page = client.get(path, headers=auth_headers).json()
+    assert page["messages"][0]["is_read"] is True
+
+    db = session_factory()
+    assert db.query(models.Message).filter(models.Message.is_read == False).count() == 0
+    db.close()
+
+
+def inbox_query_count(response) -> int:
+    # Server-Timing: db;dur=1.2;desc="N queries"
+    return int(response.headers["server-timing"].split('desc="')[1].split()[0])
+
+
+def test_inbox_unread_counts_in_constant_queries(client, seed, auth_headers, session_factory):
+    small = client.get("/api/v1/events/conversations", headers=auth_headers)
+    assert small.status_code == 200, small.text
+    assert small.json()[0]["unread_count"] == 1
+
+    db = session_factory()
+    for i in range(30):
+        agent = models.User(unique_id=f"SP-3{i:04d}", email=f"inbox{i}@poro.ci", first_name="Agent",
+                            last_name=str(i), district="Korhogo")
+        db.add(agent)
+        db.flush()
+        conversation = models.Conversation(user1_id=seed["alice_id"], user2_id=agent.id)
+        db.add(conversation)
+        db.flush()
+        messages = [
+            models.Message(content=f"Alerte {j}", sender_id=agent.id, receiver_id=seed["alice_id"],
+                           conversation_id=conversation.id)
+            for j in range(i % 3)
+        ]
+        db.add_all(messages)
+        db.flush()
+        if messages:
+            conversation.last_message_id = messages[-1].id
+    db.commit()
+    db.close()
+
+    large = client.get("/api/v1/events/conversations", headers=auth_headers)
+    inbox = large.json()
+    assert len(inbox) == 31
+    assert sum(conversation["unread_count"] for conversation in inbox) == 1 + sum(i % 3 for i in range(30))
+    assert inbox_query_count(large) == inbox_query_count(small)
+
+
+def count_commits(async_engine):
+    commits = []
+    event.listen(async_engine.sync_engine, "commit", lambda conn: commits.append(conn))
+    return commits
+
+
+def test_send_message_is_a_single_transaction(client, seed, auth_headers, session_factory, async_engine):
+    db = session_factory()
+    carol = models.User(unique_id="SP-10003", email="carol@poro.ci", first_name="Carol", last_name="Yéo",
+                        district="Korhogo")
+    db.add(carol)
+    db.commit()
+    carol_id = carol.id
+    db.close()
+
+    commits = count_commits(async_engine)
+    response = client.post("/api/v1/events/messages", headers=auth_headers,
+                           json={"receiver_id": carol_id, "content": "Première prise de contact"})
+    assert response.status_code == 200, response.text
+    assert len(commits) == 1
+
+    db = session_factory()
+    conversation = db.query(models.Conversation).filter(models.Conversation.user2_id == carol_id).one()
+    assert conversation.last_message_id == response.json()["id"]
+    assert db.get(models.Message, response.json()["id"]).conversation_id == conversation.id
+    db.close()
+
+
+def test_batch_send_to_district(client, seed, auth_headers, session_factory, async_engine):
+    db = session_factory()
+    agents = [
+        models.User(unique_id=f"SP-4{i:04d}", email=f"korhogo{i}@poro.ci", first_name="Agent",
+                    last_name=str(i), district="Korhogo")
+        for i in range(8)
+    ]
+    db.add_all(agents)
+    db.flush()
+    # Une conversation existe déjà avec le premier agent
+    existing = models.Conversation(user1_id=seed["alice_id"], user2_id=agents[0].id)
+    db.add(existing)
+    db.commit()
+    agent_ids = sorted(agent.id for agent in agents)
+    existing_id = existing.id
+    db.close()
+
+    commits = count_commits(async_engine)
+    response = client.post("/api/v1/events/messages/batch", headers=auth_headers,
+                           json={"district": "Korhogo", "content": "Journée de vaccination samedi"})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"sent_count": 8, "receiver_ids": agent_ids}
+    assert len(commits) == 1
+
+    db = session_factory()
+    conversations = db.query(models.Conversation).filter(models.Conversation.user2_id.in_(agent_ids)).all()
+    assert len(conversations) == 8
+    assert existing_id in {conversation.id for conversation in conversations}
+    for conversation in conversations:
+        last = db.get(models.Message, conversation.last_message_id)
+        assert last.content == "Journée de vaccination samedi"
+        assert last.conversation_id == conversation.id
+    db.close()
+
+
+def test_batch_send_requires_supervisor(client, seed):
+    bob = {"Authorization": f"Bearer {create_access_token(data={'sub': seed['bob_id']})}"}
+    response = client.post("/api/v1/events/messages/batch", headers=bob,
+                           json={"receiver_ids": [seed["alice_id"]], "content": "Test"})
+    assert response.status_code == 403
@@ -0,0 +1,71 @@
+import asyncio
+from sqlalchemy import text, update
+from sqlalchemy.orm import sessionmaker
+from app.database import Base, make_engine, make_async_engine, make_async_session_factory, SerializedWriter
+from app import models
+
+
+def make_session_factory(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'profile.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    writer = SerializedWriter()
+    writer.install(factory)
+    return engine, factory, writer
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    engine, _, _ = make_session_factory(tmp_path)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+
+
+def test_write_lock_held_until_commit(tmp_path):
+    _, factory, writer = make_session_factory(tmp_path)
+    db = factory()
+    db.add(models.User(unique_id="SP-00001", first_name="A", last_name="B", district="Korhogo"))
+    db.flush()
+    assert db.info["holds_write_lock"]
+    assert writer._lock.locked()
+
+    db.commit()
+    assert "holds_write_lock" not in db.info
+    assert not writer._lock.locked()
+    db.close()
+
+
+def test_write_lock_released_on_close(tmp_path):
+    _, factory, writer = make_session_factory(tmp_path)
+    db = factory()
+    db.query(models.User).filter(models.User.id == 1).update({"bio": "x"})
+    assert writer._lock.locked()
+    db.close()
+    assert not writer._lock.locked()
+
+
+def test_async_writes_wait_for_the_sync_writer(tmp_path):
+    engine, factory, writer = make_session_factory(tmp_path)
+    async_factory = make_async_session_factory(make_async_engine(f"sqlite:///{tmp_path / 'profile.db'}"), writer)
+    sync_db = factory()
+    sync_db.add(models.User(unique_id="SP-00001", first_name="A", last_name="B", district="Korhogo"))
+    sync_db.flush()
+
+    async def scenario():
+        async with async_factory() as db:
+            write = asyncio.create_task(db.execute(update(models.User).values(bio="async")))
+            await asyncio.sleep(0.05)
+            # Le verrou est attendu sans bloquer la boucle
+            assert not write.done()
+            sync_db.commit()
+            await write
+            assert db.sync_session.info["holds_write_lock"]
+            await db.commit()
+        assert not writer._lock.locked()
+
+    asyncio.run(scenario())
+    sync_db.close()
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT bio FROM users")).scalar() == "async"
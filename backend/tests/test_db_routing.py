@@ -0,0 +1,104 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import sessionmaker
+from app import database, models
+from app.auth import create_access_token
+from app.main import app
+
+
+class RecordingFactory:
+    """Fabrique de sessions qui note chaque utilisation"""
+
+    def __init__(self, name, factory, calls):
+        self.name, self.factory, self.calls = name, factory, calls
+
+    def __call__(self):
+        self.calls.append(self.name)
+        return self.factory()
+
+
+@pytest.fixture
+def routed(engine, async_engine, seed, monkeypatch):
+    read_url = database.make_read_only_url(str(engine.url))
+    read_engine = database.make_engine(read_url, pragmas=database.SQLITE_READ_ONLY_PRAGMAS)
+    async_read_engine = database.make_async_engine(read_url, pragmas=database.SQLITE_READ_ONLY_PRAGMAS)
+
+    calls = []
+    tracker = database.ReadYourWrites(window_seconds=60)
+    sync_router = database.SessionRouter(
+        RecordingFactory("primary", sessionmaker(bind=engine), calls),
+        RecordingFactory("read", sessionmaker(bind=read_engine), calls),
+        tracker,
+    )
+    async_router = database.SessionRouter(
+        RecordingFactory("primary", async_sessionmaker(async_engine, expire_on_commit=False), calls),
+        RecordingFactory("read", async_sessionmaker(async_read_engine, expire_on_commit=False), calls),
+        tracker,
+    )
+    monkeypatch.setattr(database, "session_router", sync_router)
+    monkeypatch.setattr(database, "async_session_router", async_router)
+    monkeypatch.setattr(app, "dependency_overrides", {})
+
+    yield TestClient(app), calls, read_engine
+    read_engine.dispose()
+    async_read_engine.sync_engine.dispose()
+
+
+def headers_for(user_id):
+    return {"Authorization": f"Bearer {create_access_token(data={'sub': user_id})}"}
+
+
+def test_read_only_engine_rejects_writes(routed):
+    _, _, read_engine = routed
+    db = sessionmaker(bind=read_engine)()
+    db.add(models.EmergencyContact(name="Pompiers", phone="180", type="fire", district="Korhogo"))
+    with pytest.raises(OperationalError):
+        db.commit()
+    db.close()
+
+
+def test_get_uses_read_session(routed, seed):
+    client, calls, _ = routed
+    assert client.get("/api/v1/posts/", headers=headers_for(seed["alice_id"])).status_code == 200
+    assert client.get("/api/v1/users/", headers=headers_for(seed["alice_id"])).status_code == 200
+    assert calls == ["read", "read"]
+
+
+def test_read_your_writes(routed, seed):
+    client, calls, _ = routed
+    alice, bob = headers_for(seed["alice_id"]), headers_for(seed["bob_id"])
+
+    response = client.post("/api/v1/posts/", json={"content": "Nouveau cas suspect"}, headers=alice)
+    assert response.status_code == 200
+    calls.clear()
+
+    # L'auteur relit sur le primaire et voit son post; les autres lisent sur la réplique
+    feed = client.get("/api/v1/posts/", headers=alice).json()
+    assert feed[0]["content"] == "Nouveau cas suspect"
+    client.get("/api/v1/posts/", headers=bob)
+    assert calls == ["primary", "read"]
+
+
+def test_get_that_writes_uses_primary(routed, seed):
+    client, calls, _ = routed
+    path = f"/api/v1/events/conversations/{seed['conversation_id']}"
+    assert client.get(path, headers=headers_for(seed["alice_id"])).status_code == 200
+    assert calls == ["primary"]
+
+
+def test_read_your_writes_tracker_stays_bounded(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(database.time, "monotonic", lambda: clock[0])
+    tracker = database.ReadYourWrites(window_seconds=5, max_keys=3)
+    for i in range(5):
+        tracker.mark_write(f"client:{i}")
+    # Au plus max_keys auteurs, les plus récents
+    assert list(tracker._last_write) == ["client:2", "client:3", "client:4"]
+
+    clock[0] += 10
+    tracker.mark_write("user:1")
+    # Les écritures sorties de la fenêtre sont purgées à l'écriture suivante
+    assert list(tracker._last_write) == ["user:1"]
+    assert tracker.is_recent("user:1") and not tracker.is_recent("client:4")
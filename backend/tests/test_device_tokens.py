@@ -0,0 +1,42 @@
+"""Registre des appareils: plusieurs jetons par utilisateur, un seul propriétaire par jeton"""
+from app import models
+from app.auth import create_access_token
+from app.services.push import PushDispatcher, FakePushTransport
+
+DEVICES = "/api/v1/notifications/devices"
+
+
+def test_register_unregister_and_multi_device_push(client, seed, auth_headers, session_factory):
+    bob_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': seed['bob_id']})}"}
+    assert client.post(DEVICES, headers=bob_headers, json={"token": "bob-phone", "platform": "android"}).status_code == 200
+    assert client.post(DEVICES, headers=bob_headers, json={"token": "bob-tablet", "platform": "android"}).status_code == 200
+    # Réenregistrement: rafraîchit la ligne existante
+    assert client.post(DEVICES, headers=bob_headers, json={"token": "bob-phone"}).json()["platform"] == "android"
+    assert client.post(DEVICES, headers=auth_headers, json={"token": "x", "platform": "fax"}).status_code == 422
+
+    dispatcher = PushDispatcher(session_factory, FakePushTransport(invalid_tokens={"bob-tablet"}))
+    db = session_factory()
+    assert dispatcher.enqueue(db, [seed["bob_id"]], "Garde", "Ce soir") == 1
+    db.close()
+    dispatcher.drain()
+    assert sorted(dispatcher.transport.sent[0]["tokens"]) == ["bob-phone", "bob-tablet"]
+
+    # Jeton désinscrit chez FCM: supprimé automatiquement
+    db = session_factory()
+    assert [d.token for d in db.query(models.DeviceToken).all()] == ["bob-phone"]
+    db.close()
+
+    # Seul le propriétaire peut retirer son appareil
+    assert client.delete(f"{DEVICES}/bob-phone", headers=auth_headers).status_code == 404
+    assert client.delete(f"{DEVICES}/bob-phone", headers=bob_headers).status_code == 200
+
+
+def test_device_changing_hands_moves_the_token(client, seed, auth_headers, session_factory):
+    bob_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': seed['bob_id']})}"}
+    client.post(DEVICES, headers=bob_headers, json={"token": "shared-tablet"})
+    client.post(DEVICES, headers=auth_headers, json={"token": "shared-tablet"})
+
+    db = session_factory()
+    device = db.query(models.DeviceToken).one()
+    assert device.user_id == seed["alice_id"]
+    db.close()
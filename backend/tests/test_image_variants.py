@@ -0,0 +1,134 @@
+"""Variantes d'images: décodage unique, EXIF supprimé, WebP et JPEG, remplissage asynchrone"""
+import asyncio
+import io
+import os
+import time
+from PIL import Image
+from app import main, models
+from app.routers import posts, upload
+from app.services.images import ImagePipeline, image_pipeline
+
+
+def camera_photo(path, size=(3000, 2000)):
+    """JPEG « portrait » enregistré couché, avec orientation et position GPS dans l'EXIF"""
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotation de 90° à l'affichage
+    exif[0x8825] = {2: (9.0, 27.0, 0.0)}  # latitude GPS
+    Image.new("RGB", size, (200, 30, 30)).save(path, "JPEG", exif=exif)
+
+
+def test_variants_are_rendered_in_the_process_pool(seed, session_factory, tmp_path):
+    source = tmp_path / "photo.jpg"
+    camera_photo(source)
+    db = session_factory()
+    pipeline = ImagePipeline(session_factory, workers=1)
+    pipeline.register(db, "/posts/photo.jpg")
+    db.add(models.Post(content="Séance de vaccination", image_url="/posts/photo.jpg", author_id=seed["alice_id"]))
+    db.commit()
+    db.close()
+
+    async def scenario():
+        await pipeline.process("/posts/photo.jpg", str(source))
+        await pipeline.stop()
+    asyncio.run(scenario())
+
+    db = session_factory()
+    asset = db.query(models.ImageAsset).filter(models.ImageAsset.path == "/posts/photo.jpg").one()
+    assert (asset.status, asset.width, asset.height) == ("ready", 2000, 3000)
+    assert {name: (variant["width"], variant["height"]) for name, variant in asset.variants.items()} == {
+        "full": (1365, 2048), "medium": (640, 960), "thumbnail": (213, 320)
+    }
+    post = db.query(models.Post).filter(models.Post.image_url == "/posts/photo.jpg").one()
+    assert post.image_variants == asset.variants
+    db.close()
+
+    for variant in asset.variants.values():
+        for format, key in (("WEBP", "webp"), ("JPEG", "jpeg")):
+            with Image.open(tmp_path / os.path.basename(variant[key])) as rendered:
+                assert rendered.format == format
+                assert rendered.size == (variant["width"], variant["height"])
+                assert not rendered.getexif()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+
+
+def test_upload_returns_immediately_and_variants_fill_in(client, seed, auth_headers, session_factory, tmp_path,
+                                                         monkeypatch):
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    logo = io.BytesIO()
+    Image.new("RGBA", (800, 400), (0, 120, 60, 128)).save(logo, "PNG")
+
+    with client:
+        response = client.post("/api/v1/upload/avatar", files={"file": ("logo.png", logo.getvalue(), "image/png")},
+                               headers=auth_headers)
+        assert response.status_code == 201
+        assert response.json()["variants_status"] == "pending"
+        avatar_url = response.json()["avatar_url"]
+
+        db = session_factory()
+        deadline = time.monotonic() + 10
+        while db.query(models.ImageAsset.status).filter(models.ImageAsset.path == avatar_url).scalar() == "pending":
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+            db.rollback()
+        db.close()
+
+        # Image déjà traitée: la publication reprend ses variantes à la création
+        response = client.post("/api/v1/posts/", json={"content": "Nouvelle équipe", "image_url": avatar_url},
+                               headers=auth_headers)
+        assert response.json()["image_variants"]["thumbnail"]["width"] == 320
+
+    db = session_factory()
+    alice = db.get(models.User, seed["alice_id"])
+    assert alice.avatar_variants["medium"]["jpeg"].endswith("_medium.jpg")
+    assert alice.avatar_variants["full"]["width"] == 800
+    db.close()
+
+
+def test_upload_database_work_runs_off_the_event_loop(client, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "process_variants", lambda stored: None)
+    loops = []
+    register = upload.image_pipeline.register
+
+    def recording_register(db, path):
+        try:
+            loops.append(asyncio.get_running_loop())
+        except RuntimeError:
+            loops.append(None)
+        register(db, path)
+    monkeypatch.setattr(upload.image_pipeline, "register", recording_register)
+
+    for route in ("image", "avatar", "event"):
+        response = client.post(f"/api/v1/upload/{route}", files={"file": ("photo.png", b"png", "image/png")},
+                               headers=auth_headers)
+        assert response.status_code == 201
+    # Session synchrone: déclaration et commit dans le threadpool, jamais dans la boucle
+    assert loops == [None, None, None]
+
+
+def test_variants_finished_while_a_post_is_written_are_not_lost(client, seed, auth_headers, session_factory,
+                                                                 monkeypatch):
+    db = session_factory()
+    image_pipeline.register(db, "/posts/terrain.jpg")
+    db.commit()
+    db.close()
+    variants = {"thumbnail": {"webp": "/posts/terrain_thumbnail.webp", "jpeg": "/posts/terrain_thumbnail.jpg",
+                              "width": 320, "height": 240}}
+    lookup = posts.variants_for
+
+    async def variants_then_processing_ends(db, url, for_update=False):
+        # La publication lit "pending", puis le traitement se termine (et recopie) avant son commit
+        found = await lookup(db, url, for_update)
+        image_pipeline._record(url, {"variants": variants, "width": 640, "height": 480}, None)
+        return found
+    monkeypatch.setattr(posts, "variants_for", variants_then_processing_ends)
+
+    response = client.post("/api/v1/posts/", json={"content": "Photo du site", "image_url": "/posts/terrain.jpg"},
+                           headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["image_variants"] == variants
+
+    db = session_factory()
+    assert db.get(models.Post, response.json()["id"]).image_variants == variants
+    db.close()
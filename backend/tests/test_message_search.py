@@ -0,0 +1,66 @@
+"""Recherche plein texte dans les messages privés (FTS5)"""
+from app import models
+
+
+def add_messages(session_factory, seed):
+    db = session_factory()
+    carol = models.User(unique_id="SP-10003", email="carol@poro.ci", first_name="Carol", last_name="Yéo",
+                        district="Korhogo")
+    db.add(carol)
+    db.flush()
+    alice_id, bob_id = seed["alice_id"], seed["bob_id"]
+    messages = [
+        models.Message(content="Paracétamol 500 mg, trois fois par jour", sender_id=bob_id, receiver_id=alice_id),
+        models.Message(content="Paracétamol: paracétamol sirop pour l'enfant", sender_id=alice_id,
+                       receiver_id=bob_id),
+        models.Message(content="Appelez le 07 08 09 10 pour le paracétamol", sender_id=carol.id,
+                       receiver_id=bob_id),
+    ]
+    db.add_all(messages)
+    db.commit()
+    ids = [message.id for message in messages]
+    db.close()
+    return ids
+
+
+def test_search_is_ranked_and_scoped_to_the_user(client, seed, auth_headers, session_factory):
+    dosage_id, syrup_id, _ = add_messages(session_factory, seed)
+
+    # Sans accent, en préfixe, et jamais les messages entre d'autres utilisateurs
+    response = client.get("/api/v1/events/messages/search", params={"q": "paracetam"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [result["id"] for result in results] == [syrup_id, dosage_id]
+    assert "<mark>Paracétamol</mark>" in results[1]["snippet"]
+
+    page = client.get("/api/v1/events/messages/search", params={"q": "paracetamol", "skip": 1, "limit": 1},
+                      headers=auth_headers).json()
+    assert [result["id"] for result in page] == [dosage_id]
+
+
+def test_search_index_follows_updates_and_deletes(client, seed, auth_headers, session_factory):
+    dosage_id, _, _ = add_messages(session_factory, seed)
+    db = session_factory()
+    db.get(models.Message, dosage_id).content = "Amoxicilline 250 mg"
+    db.commit()
+    db.close()
+
+    search = lambda q: [r["id"] for r in client.get("/api/v1/events/messages/search", params={"q": q},
+                                                    headers=auth_headers).json()]
+    assert search("amoxicilline") == [dosage_id]
+    assert dosage_id not in search("paracetamol")
+
+    db = session_factory()
+    db.delete(db.get(models.Message, dosage_id))
+    db.commit()
+    db.close()
+    assert search("amoxicilline") == []
+
+
+def test_search_rejects_queries_without_terms(client, seed, auth_headers):
+    # Les opérateurs FTS5 ne sont jamais interprétés
+    response = client.get("/api/v1/events/messages/search", params={"q": '" * ( )'}, headers=auth_headers)
+    assert response.status_code == 400
+    response = client.get("/api/v1/events/messages/search", params={"q": "NEAR(a b) OR participants"},
+                          headers=auth_headers)
+    assert response.status_code == 200
@@ -0,0 +1,21 @@
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from app.database import Base, make_engine
+from app.migrations import upgrade_database, include_name
+
+
+def test_migrations_match_models(engine):
+    """Les modèles ne doivent pas diverger du schéma produit par les migrations"""
+    with engine.connect() as conn:
+        diff = compare_metadata(MigrationContext.configure(conn, opts={"include_name": include_name}), Base.metadata)
+    assert diff == []
+
+
+def test_legacy_database_is_adopted(tmp_path):
+    """Une base créée par create_all (avant Alembic) est migrée sans erreur"""
+    legacy = make_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=legacy)
+    upgrade_database(legacy)
+    with legacy.connect() as conn:
+        assert conn.exec_driver_sql("SELECT version_num FROM alembic_version").scalar()
+    legacy.dispose()
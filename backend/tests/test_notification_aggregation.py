@@ -0,0 +1,98 @@
+"""Regroupement des notifications: une ligne par type et cible, mise à jour sur place"""
+from datetime import datetime, timedelta
+from app import models
+from app.services.notifications import NotificationService
+
+
+def like(db, actor_id: int, actor_name: str, post_id: int = 1, user_id: int = 1):
+    return NotificationService.create_aggregated_notification(
+        db, user_id, "like", "post", post_id, actor_id, actor_name
+    )
+
+
+def test_likes_on_a_post_collapse_into_one_row(seed, session_factory):
+    db = session_factory()
+    for actor_id in range(100, 120):
+        like(db, actor_id, f"Agent {actor_id}")
+    # Même acteur (dans l'échantillon): pas recompté
+    like(db, 119, "Agent 119")
+    like(db, 200, "Agent 200", post_id=2)
+
+    rows = db.query(models.Notification).filter(models.Notification.type == "like").order_by(
+        models.Notification.id).all()
+    assert len(rows) == 2
+    assert rows[0].actor_count == 20
+    assert [actor["id"] for actor in rows[0].data["actors"]] == [119, 118, 117]
+    assert rows[0].message == "Agent 119, Agent 118 et 18 autres ont aimé votre publication"
+    assert rows[1].message == "Agent 200 a aimé votre publication"
+
+    entries = NotificationService.get_user_notifications(db, 1)
+    assert entries[0]["actor_count"] == 1 and entries[1]["actor_count"] == 20
+    db.close()
+
+
+def test_read_or_stale_group_starts_a_new_row(seed, session_factory):
+    db = session_factory()
+    first = like(db, 100, "Agent 100")
+    assert like(db, 1, "Alice") is None
+
+    NotificationService.mark_notification_as_read(db, first.id, 1)
+    second = like(db, 101, "Agent 101")
+    assert second.id != first.id and second.actor_count == 1
+
+    # Groupe inactif depuis plus longtemps que la fenêtre
+    second.created_at = datetime.utcnow() - timedelta(days=2)
+    db.commit()
+    third = like(db, 102, "Agent 102")
+    assert third.id != second.id
+    assert NotificationService.get_unread_notifications_count(db, 1) == 3
+    db.close()
+
+
+def test_concurrent_first_actions_share_the_group_row(seed, session_factory, monkeypatch):
+    db = session_factory()
+    first = like(db, 100, "Agent 100")
+
+    # Autre transaction: sa lecture a précédé le commit de la première ligne
+    lookup = NotificationService._unread_group
+    calls = []
+
+    def racing_lookup(db, user_id, group_key):
+        calls.append(group_key)
+        return None if len(calls) == 1 else lookup(db, user_id, group_key)
+    monkeypatch.setattr(NotificationService, "_unread_group", staticmethod(racing_lookup))
+
+    other = session_factory()
+    second = like(other, 101, "Agent 101")
+    assert second.id == first.id and second.actor_count == 2
+    assert other.query(models.Notification).filter(models.Notification.group_key == "like:post:1").count() == 1
+    other.close()
+    db.close()
+
+
+def test_group_read_during_the_race_gets_a_new_row(seed, session_factory, monkeypatch):
+    db = session_factory()
+    first = like(db, 100, "Agent 100")
+    first_id = first.id
+
+    # La ligne gagnante est lue par l'utilisateur entre le conflit et la relecture
+    lookup = NotificationService._unread_group
+    calls = []
+
+    def racing_lookup(db, user_id, group_key):
+        calls.append(group_key)
+        if len(calls) == 1:
+            return None
+        if len(calls) == 2:
+            reader = session_factory()
+            NotificationService.mark_notification_as_read(reader, first_id, 1)
+            reader.close()
+        return lookup(db, user_id, group_key)
+    monkeypatch.setattr(NotificationService, "_unread_group", staticmethod(racing_lookup))
+
+    other = session_factory()
+    second = like(other, 101, "Agent 101")
+    assert second.id != first_id and second.actor_count == 1
+    assert len(calls) == 2
+    other.close()
+    db.close()
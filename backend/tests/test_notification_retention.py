@@ -0,0 +1,58 @@
+"""Rétention des notifications: purge par lots, archivage NDJSON compressé et métriques"""
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app import models
+from app.services.retention import NotificationRetention, notifications_purged, notifications_table_rows
+
+
+def add_notifications(session_factory, user_id: int, age_days: int, is_read: bool, count: int):
+    db = session_factory()
+    created_at = datetime.utcnow() - timedelta(days=age_days)
+    db.add_all([
+        models.Notification(user_id=user_id, title="Rappel", message=f"Rappel {i}", type="info",
+                            is_read=is_read, created_at=created_at)
+        for i in range(count)
+    ])
+    db.commit()
+    db.close()
+
+
+def test_expired_notifications_are_purged_in_batches(seed, engine, session_factory):
+    alice = seed["alice_id"]
+    add_notifications(session_factory, alice, age_days=40, is_read=True, count=7)     # expirées
+    add_notifications(session_factory, alice, age_days=10, is_read=True, count=2)     # conservées
+    add_notifications(session_factory, alice, age_days=200, is_read=False, count=3)   # expirées
+    add_notifications(session_factory, alice, age_days=40, is_read=False, count=4)    # conservées
+    read_before = notifications_purged.value(state="read")
+    deletes = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: deletes.append(statement)
+                 if statement.startswith("DELETE") else None)
+
+    retention = NotificationRetention(session_factory, read_ttl_days=30, unread_ttl_days=180,
+                                      batch_size=3, pause_ms=0, archive_dir="")
+    assert retention.purge() == 10
+
+    # 7 lues en lots de 3, puis 3 non lues en un lot
+    assert len(deletes) == 4
+    assert notifications_purged.value(state="read") - read_before == 7
+    # Bienvenue (seed) + 2 lues récentes + 4 non lues récentes
+    assert notifications_table_rows.value() == 7
+    assert retention.purge() == 0
+
+
+def test_purged_notifications_are_archived(seed, session_factory, tmp_path):
+    add_notifications(session_factory, seed["alice_id"], age_days=40, is_read=True, count=5)
+    archive_dir = tmp_path / "archives"
+    retention = NotificationRetention(session_factory, batch_size=2, pause_ms=0, archive_dir=str(archive_dir))
+    assert retention.purge() == 5
+
+    (archive,) = os.listdir(archive_dir)
+    assert archive.endswith(".ndjson.gz")
+    with gzip.open(archive_dir / archive, "rt", encoding="utf-8") as lines:
+        records = [json.loads(line) for line in lines]
+    assert [record["message"] for record in records] == [f"Rappel {i}" for i in range(5)]
+    assert all(record["is_read"] and record["user_id"] == seed["alice_id"] for record in records)
@@ -0,0 +1,114 @@
+"""Outbox des actions sociales: écriture avec l'action, livraison au moins une fois, ordre par agrégat"""
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import models
+from app.auth import create_access_token
+from app.services.activity import notify_owner, ACTIVITY_NOTIFICATIONS
+from app.services import outbox
+from app.services.outbox import OutboxDispatcher, record_event, outbox_pending, outbox_backoff
+
+
+def test_social_actions_are_recorded_and_notified(client, seed, session_factory):
+    db = session_factory()
+    carol = models.User(unique_id="SP-10003", email="carol@poro.ci", first_name="Carol", last_name="Yeo",
+                        district="Korhogo")
+    db.add(carol)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': carol.id})}"}
+    db.close()
+
+    assert client.post(f"/api/v1/posts/{seed['post_id']}/like", headers=headers).status_code == 200
+    assert client.post(f"/api/v1/posts/{seed['post_id']}/comments", json={"content": "Bravo"},
+                       headers=headers).status_code == 200
+    assert client.post(f"/api/v1/follows/{seed['alice_id']}", headers=headers).status_code == 200
+
+    db = session_factory()
+    events = db.query(models.OutboxEvent).order_by(models.OutboxEvent.id).all()
+    assert [(event.event_type, event.aggregate_type, event.status) for event in events] == [
+        ("post.liked", "post", "pending"),
+        ("post.commented", "post", "pending"),
+        ("user.followed", "user", "pending"),
+    ]
+    assert events[0].payload == {"owner_id": seed["alice_id"], "actor_id": carol.id, "actor_name": "Carol Yeo"}
+    db.close()
+
+    dispatcher = OutboxDispatcher(session_factory)
+    dispatcher.register("notifications", notify_owner, ACTIVITY_NOTIFICATIONS)
+    assert asyncio.run(dispatcher.drain()) == 3
+
+    db = session_factory()
+    messages = sorted(n.message for n in db.query(models.Notification).filter(models.Notification.group_key != None))
+    assert messages == [
+        "Carol Yeo a aimé votre publication",
+        "Carol Yeo a commencé à vous suivre",
+        "Carol Yeo a commenté votre publication",
+    ]
+    assert {event.status for event in db.query(models.OutboxEvent).all()} == {"done"}
+    db.close()
+
+
+def test_failed_consumer_is_retried_alone_and_blocks_its_aggregate(seed, session_factory):
+    db = session_factory()
+    for aggregate_id, name in ((1, "e1"), (1, "e2"), (2, "e3")):
+        record_event(db, "post", aggregate_id, "post.liked", {"name": name})
+    db.commit()
+    db.close()
+
+    recorded, pushed, failures = [], [], {"e1": 1}
+
+    def record(db, event):
+        recorded.append(event["payload"]["name"])
+
+    async def push(event):
+        name = event["payload"]["name"]
+        if failures.get(name):
+            failures[name] -= 1
+            raise RuntimeError("indisponible")
+        pushed.append(name)
+
+    dispatcher = OutboxDispatcher(session_factory, batch_size=10)
+    dispatcher.register("record", record)
+    dispatcher.register("push", push)
+
+    # e1 échoue chez "push": e2 (même publication) attend, e3 passe
+    assert asyncio.run(dispatcher.drain()) == 2
+    assert recorded == ["e1", "e3"] and pushed == ["e3"]
+    assert outbox_pending.value() == 2
+
+    # Nouvelle tentative due: seul "push" est rappelé pour e1, puis e2 dans l'ordre
+    db = session_factory()
+    db.execute(update(models.OutboxEvent).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.commit()
+    db.close()
+    asyncio.run(dispatcher.drain())
+    assert recorded == ["e1", "e3", "e2"] and pushed == ["e3", "e1", "e2"]
+
+    db = session_factory()
+    first = db.query(models.OutboxEvent).order_by(models.OutboxEvent.id).first()
+    assert (first.status, first.attempts, first.delivered) == ("done", 2, ["record", "push"])
+    db.close()
+
+
+def test_events_waiting_for_a_retry_do_not_starve_due_events(seed, session_factory, monkeypatch):
+    db = session_factory()
+    for aggregate_id in (1, 2, 3):
+        record_event(db, "post", aggregate_id, "post.liked", {"name": f"retry{aggregate_id}"})
+    db.commit()
+    # Lot complet d'événements en attente de nouvelle tentative
+    db.execute(update(models.OutboxEvent).values(attempts=1, next_attempt_at=datetime.utcnow() + timedelta(hours=1)))
+    record_event(db, "post", 1, "post.liked", {"name": "after-retry1"})
+    record_event(db, "post", 9, "post.liked", {"name": "fresh"})
+    db.commit()
+    db.close()
+
+    delivered = []
+    dispatcher = OutboxDispatcher(session_factory, batch_size=3)
+    dispatcher.register("record", lambda db, event: delivered.append(event["payload"]["name"]))
+    assert asyncio.run(dispatcher.drain()) == 1
+    # "after-retry1" reste derrière l'événement antérieur de la publication 1
+    assert delivered == ["fresh"]
+
+    monkeypatch.setattr(outbox, "OUTBOX_BACKOFF_SECONDS", 5)
+    monkeypatch.setattr(outbox, "OUTBOX_BACKOFF_MAX_SECONDS", 30)
+    assert [outbox_backoff(attempts) for attempts in (1, 2, 3, 4)] == [5, 10, 20, 30]
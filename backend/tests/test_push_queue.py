@@ -0,0 +1,103 @@
+"""File d'envoi push: lots de 500 jetons, tentatives avec délai exponentiel, jetons invalides supprimés"""
+from datetime import datetime
+import pytest
+from app import models
+from app.services import push
+from app.services.push import PushDispatcher, PushTransport, FakePushTransport, backoff_delay
+
+
+def add_devices(session_factory, count: int):
+    db = session_factory()
+    users = [
+        models.User(unique_id=f"SP-3{i:04d}", email=f"device{i}@poro.ci", first_name="Agent", last_name=str(i),
+                    district="Korhogo")
+        for i in range(count)
+    ]
+    db.add_all(users)
+    db.flush()
+    db.add_all([models.DeviceToken(user_id=user.id, token=f"token-{i}") for i, user in enumerate(users)])
+    db.commit()
+    db.close()
+
+
+def make_dispatcher(session_factory, **transport_options):
+    return PushDispatcher(session_factory, FakePushTransport(**transport_options), workers=1)
+
+
+def test_broadcast_push_is_sent_in_500_token_multicasts(seed, session_factory):
+    add_devices(session_factory, 1200)
+    dispatcher = make_dispatcher(session_factory)
+
+    db = session_factory()
+    assert dispatcher.enqueue(db, None, "Alerte", "Rupture de stock") == 3
+    db.close()
+
+    assert dispatcher.drain() == 3
+    assert [len(call["tokens"]) for call in dispatcher.transport.sent] == [500, 500, 200]
+    db = session_factory()
+    assert {job.status for job in db.query(models.PushJob).all()} == {"done"}
+    db.close()
+
+
+def test_invalid_tokens_are_pruned_and_failures_retried_with_backoff(seed, session_factory):
+    add_devices(session_factory, 3)
+    dispatcher = make_dispatcher(session_factory, invalid_tokens={"token-0"}, failures={"token-1": 1})
+    db = session_factory()
+    dispatcher.enqueue(db, None, "Rappel", "Réunion lundi")
+    db.close()
+
+    dispatcher.drain()
+    db = session_factory()
+    job = db.query(models.PushJob).one()
+    assert (job.status, job.tokens, job.attempts) == ("pending", ["token-1"], 1)
+    assert job.next_attempt_at > datetime.utcnow()
+    assert db.query(models.DeviceToken).filter(models.DeviceToken.token == "token-0").count() == 0
+    db.close()
+
+    # Le lot n'est pas repris avant son délai; puis il aboutit
+    assert dispatcher.drain() == 0
+    db = session_factory()
+    db.query(models.PushJob).update({"next_attempt_at": datetime.utcnow()})
+    db.commit()
+    db.close()
+    assert dispatcher.drain() == 1
+    assert dispatcher.transport.sent[-1]["tokens"] == ["token-1"]
+
+
+def test_job_fails_after_max_attempts(seed, session_factory, monkeypatch):
+    monkeypatch.setattr(push, "PUSH_BACKOFF_SECONDS", 0)
+    add_devices(session_factory, 1)
+    dispatcher = PushDispatcher(session_factory, FakePushTransport(failures={"token-0": 10}), max_attempts=3)
+    db = session_factory()
+    dispatcher.enqueue(db, None, "Rappel", "...")
+    db.close()
+
+    assert dispatcher.drain() == 3
+    db = session_factory()
+    assert db.query(models.PushJob).one().status == "failed"
+    db.close()
+
+
+def test_backoff_is_exponential_and_capped():
+    assert [backoff_delay(n, base=2, maximum=20) for n in range(1, 6)] == [2, 4, 8, 16, 20]
+
+
+def test_admin_send_enqueues_instead_of_calling_firebase(client, seed, auth_headers, session_factory):
+    db = session_factory()
+    db.add(models.DeviceToken(user_id=seed["bob_id"], token="bob-phone"))
+    db.commit()
+    db.close()
+
+    response = client.post("/api/v1/notifications/admin/send/", headers=auth_headers, json={
+        "user_id": seed["bob_id"], "title": "Garde", "message": "Vous êtes de garde ce soir",
+    })
+    assert response.status_code == 200, response.text
+    db = session_factory()
+    job = db.query(models.PushJob).one()
+    assert (job.tokens, job.status) == (["bob-phone"], "pending")
+    db.close()
+
+
+def test_transport_interface_requires_send_multicast():
+    with pytest.raises(TypeError):
+        PushTransport()
@@ -0,0 +1,113 @@
+"""
+Budget SQL par route: sur un jeu de données dense, aucun endpoint GET ne doit
+émettre plus de requêtes que son budget, ni répéter la même forme d'instruction
+(boucle N+1). Le mode strict est activé pour toute la suite (voir conftest).
+"""
+import pytest
+from app import models, instrumentation
+from app.metrics import registry
+from .test_query_plans import GET_ENDPOINTS
+
+ADMIN_GET_ENDPOINTS = [
+    "/api/v1/admin/health-articles/",
+    "/api/v1/admin/emergency-contacts/",
+    "/api/v1/admin/polls/",
+    "/api/v1/admin/users/",
+    "/api/v1/admin/stats/",
+    "/api/v1/admin/events/",
+]
+
+ROWS = 12  # > SQL_REPEAT_LIMIT: une boucle par ligne est forcément détectée
+
+
+@pytest.fixture
+def dense_seed(seed, session_factory):
+    """Ajoute ROWS lignes par table listée, chacune avec ses relations"""
+    db = session_factory()
+    alice_id, bob_id = seed["alice_id"], seed["bob_id"]
+    users = [
+        models.User(unique_id=f"SP-2{i:04d}", email=f"agent{i}@poro.ci", first_name=f"Agent{i}",
+                    last_name="Poro", district="Korhogo")
+        for i in range(ROWS)
+    ]
+    db.add_all(users)
+    db.flush()
+
+    for i, user in enumerate(users):
+        post = models.Post(content=f"Post {i}", author_id=user.id)
+        poll = models.Poll(question=f"Question {i} ?", author_id=user.id)
+        article = models.HealthArticle(title=f"Article {i}", summary="Résumé", content="Contenu",
+                                       category="prevention", author_id=user.id)
+        event = models.Event(title=f"Événement {i}", description="Description", category="formation",
+                             date="2026-12-01", time="09:00", location="Korhogo", district="Korhogo",
+                             organizer="DDS", author_id=user.id)
+        protocol = models.HealthProtocol(title=f"Protocole {i}", content="Étapes", category="treatment",
+                                         author_id=user.id, is_public=True)
+        db.add_all([post, poll, article, event, protocol])
+        db.flush()
+        option = models.PollOption(poll_id=poll.id, text="Oui", votes=1)
+        message = models.Message(content=f"Message {i}", sender_id=user.id, receiver_id=alice_id)
+        db.add_all([option, message])
+        db.flush()
+        conversation = models.Conversation(user1_id=alice_id, user2_id=user.id, last_message_id=message.id)
+        db.add(conversation)
+        db.flush()
+        message.conversation_id = conversation.id
+        db.add_all([
+            models.PollVote(poll_id=poll.id, option_id=option.id, user_id=bob_id),
+            models.Like(post_id=post.id, user_id=bob_id),
+            models.Comment(content="Merci", post_id=post.id, author_id=user.id),
+            models.Follow(follower_id=user.id, following_id=alice_id),
+            models.Follow(follower_id=bob_id, following_id=user.id),
+            models.EventRegistration(event_id=event.id, user_id=user.id),
+            models.HealthArticleLike(article_id=article.id, user_id=user.id),
+            models.HealthArticleBookmark(article_id=article.id, user_id=alice_id),
+            models.Message(content=f"Réponse {i}", sender_id=bob_id, receiver_id=alice_id,
+                           conversation_id=seed["conversation_id"]),
+            models.Notification(user_id=alice_id, title=f"Notification {i}", message="Contenu"),
+        ])
+    db.commit()
+    db.close()
+    return seed
+
+
+@pytest.mark.parametrize("path", GET_ENDPOINTS + ADMIN_GET_ENDPOINTS)
+def test_get_endpoints_stay_within_query_budget(path, client, dense_seed, auth_headers):
+    response = client.get(path.format(**dense_seed), headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.headers["server-timing"].startswith("db;dur=")
+
+
+def test_repeated_statement_shape_is_reported():
+    stats = instrumentation.QueryStats()
+    for _ in range(10):
+        stats.record("SELECT * FROM likes WHERE post_id = ?", 0.001)
+    stats.record("SELECT * FROM posts WHERE id IN (?, ?, ?)", 0.001)
+    stats.record("SELECT * FROM posts WHERE id IN (?, ?)", 0.001)
+
+    problems = stats.violations(budget=20, repeat_limit=5)
+    assert len(problems) == 1
+    assert "10 exécutions" in problems[0]
+    # Les listes IN de tailles différentes partagent la même forme
+    assert stats.shapes["SELECT * FROM posts WHERE id IN (?)"] == 2
+
+
+def test_budget_violation_fails_the_request(client, seed, auth_headers, monkeypatch):
+    monkeypatch.setattr(instrumentation, "SQL_QUERY_BUDGET", 0)
+    with pytest.raises(instrumentation.QueryBudgetExceeded):
+        client.get("/api/v1/posts/", headers=auth_headers)
+
+
+def test_query_counts_are_exported_as_metrics(client, seed, auth_headers):
+    client.get("/api/v1/posts/{post_id}".format(**seed), headers=auth_headers)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    # Libellé de route sans identifiant: une seule série par endpoint
+    assert 'http_db_queries_total{route="GET /posts/{post_id}"}' in response.text
+
+
+def test_admin_stats_count_posts_per_day(client, dense_seed, auth_headers):
+    activity = client.get("/api/v1/admin/stats/", headers=auth_headers).json()["activity"]
+    # Publications du jeu de données (toutes du jour), retrouvées par date quel que soit le type renvoyé par date()
+    assert sum(day["count"] for day in activity) == ROWS + 1
@@ -0,0 +1,84 @@
+"""
+Vérification CI: chaque requête filtrée émise par les routers doit utiliser un index.
+
+Les endpoints GET sont appelés sur une base migrée par Alembic; chaque SELECT
+comportant une clause WHERE est rejoué avec EXPLAIN QUERY PLAN et ne doit pas
+produire de parcours complet de table ("SCAN <table>" sans index).
+"""
+import re
+import pytest
+from sqlalchemy import event, text
+
+# Recherches textuelles LIKE '%...%': aucun index B-tree ne peut les servir
+UNINDEXABLE = ("LIKE",)
+
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)(\w+)\b(?! USING)")
+HAS_WHERE = re.compile(r"\bWHERE\b", re.IGNORECASE)
+
+GET_ENDPOINTS = [
+    "/api/v1/auth/me",
+    "/api/v1/users/",
+    "/api/v1/users/district/Korhogo",
+    "/api/v1/users/{alice_id}",
+    "/api/v1/posts/",
+    "/api/v1/posts/user/{alice_id}/",
+    "/api/v1/posts/{post_id}",
+    "/api/v1/follows/followers",
+    "/api/v1/follows/following",
+    "/api/v1/follows/followers/{bob_id}",
+    "/api/v1/follows/following/{bob_id}",
+    "/api/v1/polls/",
+    "/api/v1/health-articles/",
+    "/api/v1/health-articles/?category=prevention",
+    "/api/v1/health-articles/{article_id}",
+    "/api/v1/health-articles/bookmarked/",
+    "/api/v1/emergency/",
+    "/api/v1/emergency/?district=Korhogo",
+    "/api/v1/emergency/{contact_id}",
+    "/api/v1/protocols/",
+    "/api/v1/protocols/{protocol_id}",
+    "/api/v1/events/",
+    "/api/v1/events/?district=Korhogo",
+    "/api/v1/events/?category=formation",
+    "/api/v1/events/{event_id}",
+    "/api/v1/events/{event_id}/registrations",
+    "/api/v1/events/conversations",
+    "/api/v1/events/conversations/{conversation_id}",
+    "/api/v1/notifications/",
+    "/api/v1/notifications/unread-count",
+]
+
+
+@pytest.fixture
+def captured_statements(engine, async_engine):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and HAS_WHERE.search(statement):
+            statements.append((statement, parameters))
+
+    # Routers synchrones et asynchrones
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", capture)
+    yield statements
+    for target in (engine, async_engine.sync_engine):
+        event.remove(target, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("path", GET_ENDPOINTS)
+def test_router_queries_use_indexes(path, client, seed, auth_headers, engine, captured_statements):
+    response = client.get(path.format(**seed), headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert captured_statements, f"aucune requête filtrée capturée pour {path}"
+
+    offenders = []
+    with engine.connect() as conn:
+        for statement, parameters in captured_statements:
+            if any(token in statement.upper() for token in UNINDEXABLE):
+                continue
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            for row in plan:
+                if FULL_SCAN.match(row[-1]):
+                    offenders.append(f"{row[-1]}\n    {statement}")
+
+    assert not offenders, f"{path}: parcours complet de table\n" + "\n".join(offenders)
@@ -0,0 +1,137 @@
+"""Hub WebSocket: connexions multiples, files bornées, éviction et battements de cœur"""
+import asyncio
+import json
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from app import main
+from app.auth import create_access_token
+from app.services.realtime import ConnectionHub, CLOSE_POLICY_VIOLATION, CLOSE_TRY_AGAIN_LATER, CLOSE_GOING_AWAY, ws_frames_dropped
+
+
+def ws_url(user_id: int, query: str = "") -> str:
+    """URL WebSocket authentifiée par jeton en paramètre"""
+    return f"/ws/{user_id}?token={create_access_token(data={'sub': user_id})}{query}"
+
+
+class FakeWebSocket:
+    """WebSocket minimal; `blocked` simule un client qui ne lit plus"""
+
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.blocked = blocked
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        if self.blocked:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(frame))
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.closed_with = code
+
+
+def test_every_device_of_a_user_receives_frames(client, monkeypatch):
+    # `with client`: toutes les sessions partagent la boucle d'événements de l'application
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    with client, client.websocket_connect(ws_url(1)) as phone, client.websocket_connect(ws_url(1)) as web, \
+            client.websocket_connect(ws_url(2)) as sender:
+        # Premier frame de chaque connexion: le compteur de notifications non lues
+        for socket in (phone, web, sender):
+            assert socket.receive_json() == {"type": "unread_count", "count": 0}
+        sender.send_text(json.dumps({"type": "typing", "recipient_id": 1, "is_typing": True}))
+        assert phone.receive_json()["type"] == "typing_status"
+        assert web.receive_json()["sender_id"] == 2
+
+        # Fermer un appareil ne coupe pas l'autre (et ne lève pas de KeyError)
+        phone.close()
+        sender.send_text(json.dumps({"type": "read_receipt", "sender_id": 1, "message_id": 7}))
+        assert web.receive_json() == {"type": "message_read", "reader_id": 2, "message_id": 7}
+
+
+def test_socket_requires_the_owner_token_and_survives_bad_frames(client, monkeypatch):
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    with client:
+        # Jeton absent, invalide ou d'un autre utilisateur: fermeture (1008) avant tout envoi
+        for url in ("/ws/1?token=invalide", ws_url(2).replace("/ws/2", "/ws/1")):
+            with pytest.raises(WebSocketDisconnect) as refused:
+                with client.websocket_connect(url) as socket:
+                    socket.receive_json()
+            assert refused.value.code == CLOSE_POLICY_VIOLATION
+        with client.websocket_connect("/ws/1") as socket:
+            socket.send_text(json.dumps({"type": "message", "recipient_id": 2, "data": {"content": "x"}}))
+            with pytest.raises(WebSocketDisconnect) as refused:
+                socket.receive_json()
+            assert refused.value.code == CLOSE_POLICY_VIOLATION
+
+        # Jeton dans le premier frame; frames illisibles signalés sans fermer la connexion
+        with client.websocket_connect("/ws/1") as socket:
+            socket.send_text(json.dumps({"type": "auth", "token": create_access_token(data={"sub": 1})}))
+            assert socket.receive_json() == {"type": "unread_count", "count": 0}
+            socket.send_text("{pas du json")
+            assert socket.receive_json() == {"type": "error", "detail": "Frame invalide"}
+            socket.send_text(json.dumps({"recipient_id": 2}))
+            assert socket.receive_json() == {"type": "error", "detail": "Frame invalide"}
+            socket.send_text(json.dumps({"type": "message", "recipient_id": "2", "data": {"content": "Bonjour"}}))
+            assert socket.receive_json()["detail"] == "Destinataire invalide"
+            socket.send_text(json.dumps({"type": "typing", "is_typing": True}))
+            assert socket.receive_json()["type"] == "error"
+            socket.send_text(json.dumps({"type": "pong"}))
+            socket.send_text(json.dumps({"type": "message", "recipient_id": 2, "data": {"content": " "}}))
+            assert socket.receive_json()["detail"] == "Message vide"
+
+
+def test_slow_consumer_is_evicted_without_blocking_sender():
+    async def scenario():
+        hub = ConnectionHub(queue_size=2, evict_after_drops=3, send_timeout=60, ping_interval=60)
+        slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+        await hub.connect(slow, user_id=1)
+        await hub.connect(fast, user_id=2)
+        dropped_before = ws_frames_dropped.value()
+
+        for i in range(10):
+            hub.send_to_user(1, {"n": i})
+            hub.send_to_user(2, {"n": i})
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+
+        assert slow.closed_with == CLOSE_TRY_AGAIN_LATER
+        assert not hub.is_connected(1)
+        assert [frame["n"] for frame in fast.sent] == list(range(10))
+        assert ws_frames_dropped.value() - dropped_before >= 3
+        await hub.close_all()
+
+    asyncio.run(scenario())
+
+
+def test_blocked_send_times_out():
+    async def scenario():
+        hub = ConnectionHub(queue_size=10, send_timeout=0.02, ping_interval=60)
+        stuck = FakeWebSocket(blocked=True)
+        await hub.connect(stuck, user_id=1)
+        hub.send_to_user(1, {"type": "new_message"})
+        await asyncio.sleep(0.1)
+        assert stuck.closed_with == CLOSE_TRY_AGAIN_LATER
+        assert hub.connection_count() == 0
+
+    asyncio.run(scenario())
+
+
+def test_missing_pong_closes_connection():
+    async def scenario():
+        hub = ConnectionHub(ping_interval=0.01, ping_timeout=0.05)
+        silent, alive = FakeWebSocket(), FakeWebSocket()
+        await hub.connect(silent, user_id=1)
+        alive_connection = await hub.connect(alive, user_id=2)
+        for _ in range(15):
+            await asyncio.sleep(0.01)
+            hub.handle_pong(alive_connection)
+
+        assert {"type": "ping"} in silent.sent
+        assert silent.closed_with == CLOSE_GOING_AWAY
+        assert hub.connected_users() == {2}
+        await hub.close_all()
+
+    asyncio.run(scenario())
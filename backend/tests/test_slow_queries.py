@@ -0,0 +1,59 @@
+import json
+import pytest
+from sqlalchemy import event
+from app.slow_queries import SlowQueryLog, parameter_shape
+from app.routers import admin
+
+
+@pytest.fixture
+def slow_log(tmp_path, engine, async_engine, monkeypatch):
+    """Journal au seuil nul (tout est « lent ») branché sur les moteurs de test"""
+    log = SlowQueryLog(threshold_ms=0, log_file=str(tmp_path / "logs" / "slow.log"))
+    for target in (engine, async_engine.sync_engine):
+        log.install(target)
+    monkeypatch.setattr(admin, "slow_query_log", log)
+    yield log
+    for target in (engine, async_engine.sync_engine):
+        event.remove(target, "before_cursor_execute", log._before_cursor_execute)
+        event.remove(target, "after_cursor_execute", log._after_cursor_execute)
+
+
+def test_parameter_shape_keeps_types_not_values():
+    assert parameter_shape((3, "alice@poro.ci")) == ["int", "str"]
+    assert parameter_shape({"email": "alice@poro.ci"}) == {"email": "str"}
+
+
+def test_slow_queries_are_logged_with_route_and_plan(client, seed, auth_headers, slow_log):
+    response = client.get(f"/api/v1/events/{seed['event_id']}", headers=auth_headers)
+    assert response.status_code == 200
+
+    lines = [json.loads(line) for line in open(slow_log.log_file, encoding="utf-8")]
+    event_lookups = [entry for entry in lines if "FROM events" in entry["statement"] and "WHERE" in entry["statement"]]
+    assert event_lookups
+    entry = event_lookups[0]
+    assert entry["route"] == "GET /events/{event_id}"
+    assert entry["parameters"][0] == "int"
+    assert any("events" in step for step in entry["plan"])
+
+
+def test_admin_lists_top_offenders_by_total_time(client, seed, auth_headers, slow_log):
+    slow_log.record("SELECT * FROM posts WHERE id = ?", (1,), 5.0, "GET /posts/{post_id}")
+    slow_log.record("SELECT * FROM posts WHERE id = ?", (2,), 5.0, "GET /posts/{post_id}")
+    slow_log.record("SELECT * FROM users WHERE id IN (?, ?)", (1, 2), 8.0, "GET /users/")
+    slow_log.record("SELECT * FROM users WHERE id IN (?, ?, ?)", (1, 2, 3), 4.0, "GET /users/")
+
+    response = client.get("/api/v1/admin/slow-queries/?limit=100", headers=auth_headers)
+    assert response.status_code == 200
+    offenders = {o["statement"]: o for o in response.json()}
+    users = offenders["SELECT * FROM users WHERE id IN (?)"]
+    assert users["count"] == 2 and users["total_ms"] >= 12.0 and users["max_ms"] >= 8.0
+    totals = [o["total_ms"] for o in response.json()]
+    assert totals == sorted(totals, reverse=True)
+
+
+def test_offender_aggregation_is_bounded():
+    log = SlowQueryLog(threshold_ms=0, log_file=None, max_shapes=2)
+    log.record("SELECT * FROM posts", (), 50.0)
+    log.record("SELECT * FROM users", (), 1.0)
+    log.record("SELECT * FROM events", (), 10.0)
+    assert [o["statement"] for o in log.top_offenders()] == ["SELECT * FROM posts", "SELECT * FROM events"]
@@ -0,0 +1,66 @@
+"""
+Démarrage rapide et sans effet de bord: l'import de app.main ne doit ni
+charger les intégrations lourdes (Firebase, Alembic) ni dépasser son budget.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from fastapi.testclient import TestClient
+from app import main
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Temps d'import cumulé des modules de l'application (hors dépendances tierces)
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1000"))
+LAZY_MODULES = ("firebase_admin", "alembic", "websockets")
+
+
+def import_app_in_subprocess():
+    probe = (
+        "import sys, json; import app.main; "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    app_self_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if name.strip().split(".")[0] == "app" and self_us.strip().isdigit():
+            app_self_us += int(self_us)
+    return json.loads(result.stdout.strip().splitlines()[-1]), app_self_us / 1000
+
+
+def test_import_is_side_effect_free_and_within_budget():
+    loaded, app_import_ms = import_app_in_subprocess()
+    assert loaded == [], f"modules lourds chargés à l'import: {loaded}"
+    assert app_import_ms < IMPORT_TIME_BUDGET_MS, (
+        f"import de app.*: {app_import_ms:.0f} ms (budget: {IMPORT_TIME_BUDGET_MS:.0f} ms)"
+    )
+
+
+def test_readiness_is_reported_separately_from_liveness(async_engine, monkeypatch):
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    monkeypatch.setattr(main, "async_engine", async_engine)
+    monkeypatch.setitem(main.startup_state, "migrated", False)
+    monkeypatch.setitem(main.startup_state, "warmed_up", False)
+
+    # Avant le démarrage: vivant mais pas prêt
+    client = TestClient(main.app)
+    assert client.get("/health").status_code == 200
+    assert client.get("/ready").status_code == 503
+
+    with TestClient(main.app) as started:
+        deadline = time.monotonic() + 5
+        response = started.get("/ready")
+        while response.status_code != 200 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = started.get("/ready")
+        assert response.status_code == 200, response.json()
+        assert response.json()["checks"]["database"] is True
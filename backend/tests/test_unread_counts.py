@@ -0,0 +1,78 @@
+"""Compteurs de non-lus en mémoire, mis à jour par NotificationService et poussés par WebSocket"""
+from sqlalchemy import event
+from app import main
+from app.services.unread import UnreadCounter
+from tests.test_realtime import ws_url
+
+NOTIFICATIONS = "/api/v1/notifications"
+
+
+def test_unread_count_is_served_from_memory(client, seed, auth_headers, engine, async_engine):
+    assert client.get(f"{NOTIFICATIONS}/unread-count", headers=auth_headers).json() == {"unread_count": 1}
+
+    counts = []
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: counts.append(statement) if "count(" in statement else None)
+    for _ in range(5):
+        assert client.get(f"{NOTIFICATIONS}/unread-count", headers=auth_headers).json() == {"unread_count": 1}
+    assert counts == []
+
+
+def test_count_changes_are_pushed_over_the_socket(client, seed, auth_headers, monkeypatch):
+    monkeypatch.setattr(main, "MIGRATE_ON_STARTUP", False)
+    alice_id = seed["alice_id"]
+    notification_id = client.get(f"{NOTIFICATIONS}/", headers=auth_headers).json()[0]["id"]
+
+    with client, client.websocket_connect(ws_url(alice_id)) as alice:
+        assert alice.receive_json() == {"type": "unread_count", "count": 1}
+        assert alice.receive_json()["type"] == "new_message"  # message non lu du jeu de données
+
+        client.post(f"{NOTIFICATIONS}/admin/send/", headers=auth_headers,
+                    json={"user_id": alice_id, "title": "Stock", "message": "Livraison d'ACT"})
+        assert alice.receive_json() == {"type": "unread_count", "count": 2}
+
+        client.post(f"{NOTIFICATIONS}/mark-read/{notification_id}", headers=auth_headers)
+        assert alice.receive_json() == {"type": "unread_count", "count": 1}
+
+        client.post(f"{NOTIFICATIONS}/admin/send-all/", headers=auth_headers,
+                    json={"user_id": alice_id, "title": "Annonce", "message": "..."})
+        assert alice.receive_json() == {"type": "unread_count", "count": 2}
+
+        client.post(f"{NOTIFICATIONS}/mark-all-read", headers=auth_headers)
+        assert alice.receive_json() == {"type": "unread_count", "count": 0}
+
+    assert client.get(f"{NOTIFICATIONS}/unread-count", headers=auth_headers).json() == {"unread_count": 0}
+
+
+def test_expired_and_evicted_entries_are_reloaded():
+    loads = []
+
+    def load():
+        loads.append(1)
+        return 3
+
+    counter = UnreadCounter(ttl=0, max_users=1)
+    assert counter.get(1, load) == 3
+    assert counter.get(1, load) == 3
+    assert len(loads) == 2
+
+    counter = UnreadCounter(ttl=60, max_users=1)
+    counter.get(1, load)
+    counter.get(2, load)
+    counter.adjust([1, 2], +1)
+    assert counter.get(2, load) == 4
+    assert counter.get(1, load) == 3
+
+
+def test_adjust_during_a_database_count_is_not_overwritten():
+    counter = UnreadCounter(ttl=60)
+
+    def load_then_notified():
+        # Le COUNT a lu 3, puis une notification est créée avant que la valeur soit mise en mémoire
+        counter.adjust([7], +1)
+        return 3
+
+    assert counter.get(7, load_then_notified) == 3
+    assert counter.get(7, lambda: 4) == 4
+    assert counter.get(7, lambda: 0) == 4
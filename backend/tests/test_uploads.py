@@ -0,0 +1,63 @@
+"""Uploads: écriture par morceaux, limite de taille appliquée en cours d'écriture, renommage atomique"""
+import hashlib
+import os
+from app.routers import upload
+
+
+def test_image_is_streamed_to_disk_with_its_digest(client, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "UPLOAD_CHUNK_SIZE", 1000)
+    content = os.urandom(25_000)
+
+    response = client.post("/api/v1/upload/image", files={"file": ("photo.jpg", content, "image/jpeg")},
+                           headers=auth_headers)
+    assert response.status_code == 201
+    body = response.json()
+    assert body["size"] == len(content)
+    assert body["sha256"] == hashlib.sha256(content).hexdigest()
+
+    # Seul le fichier final est visible (pas de fichier temporaire restant)
+    assert os.listdir(tmp_path / "posts") == [os.path.basename(body["image_url"])]
+    assert (tmp_path / "posts" / os.path.basename(body["image_url"])).read_bytes() == content
+
+
+def test_oversized_upload_is_rejected_without_leftovers(client, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "UPLOAD_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(upload, "MAX_FILE_SIZE", 10_000)
+
+    response = client.post("/api/v1/upload/event", files={"file": ("affiche.png", b"x" * 10_001, "image/png")},
+                           headers=auth_headers)
+    assert response.status_code == 400
+    assert "trop volumineux" in response.json()["detail"]
+    assert os.listdir(tmp_path / "events") == []
+
+    response = client.post("/api/v1/upload/image", files={"file": ("script.sh", b"echo", "text/plain")},
+                           headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_oversized_body_is_refused_before_it_is_buffered(client, auth_headers, tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(upload, "MAX_FILE_SIZE", 10_000)
+    monkeypatch.setattr(upload, "UPLOAD_FORM_OVERHEAD", 1_000)
+    boundary = "limite"
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"photo.jpg\"\r\n"
+            "Content-Type: image/jpeg\r\n\r\n").encode()
+    headers = {**auth_headers, "Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+    # Content-Length annoncé trop grand: refus sans lire le corps
+    response = client.post("/api/v1/upload/image", content=head + b"x" * 20_000 + f"\r\n--{boundary}--\r\n".encode(),
+                           headers=headers)
+    assert response.status_code == 413
+
+    # Corps envoyé par morceaux, sans Content-Length: arrêt dès la limite dépassée
+    def chunks():
+        yield head
+        for _ in range(100):
+            yield b"x" * 1_000
+
+    response = client.post("/api/v1/upload/image", content=chunks(), headers=headers)
+    assert response.status_code == 413
+    assert "trop volumineux" in response.json()["detail"]
+    assert not os.path.exists(tmp_path / "posts") or os.listdir(tmp_path / "posts") == []